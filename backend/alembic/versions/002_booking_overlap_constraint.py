@@ -0,0 +1,34 @@
+"""Exclusion constraint against overlapping active bookings
+
+Revision ID: 002
+Revises: 001
+Create Date: 2025-01-15 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # btree_gist нужен для оператора = по uuid внутри gist-индекса
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+
+    # Активные записи одного мастера не могут пересекаться по времени.
+    # Если в данных уже есть пересечения, их нужно разрешить до миграции.
+    op.execute("""
+        ALTER TABLE bookings
+        ADD CONSTRAINT ex_bookings_master_time_overlap
+        EXCLUDE USING gist (
+            master_id WITH =,
+            tsrange(date, end_time) WITH &&
+        )
+        WHERE (status IN ('PENDING', 'CONFIRMED'))
+    """)
+
+def downgrade() -> None:
+    op.execute('ALTER TABLE bookings DROP CONSTRAINT IF EXISTS ex_bookings_master_time_overlap')
@@ -0,0 +1,71 @@
+"""Composite and partial indexes for booking hot paths
+
+Revision ID: 003
+Revises: 002
+Create Date: 2025-01-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Доступность мастера, записи мастера на день, статистика мастера
+    op.create_index('ix_bookings_master_id_date', 'bookings', ['master_id', 'date'])
+    # Дашборд и список записей салона за период
+    op.create_index('ix_bookings_tenant_id_date', 'bookings', ['tenant_id', 'date'])
+    # Выборки по статусу за период (выручка, отчеты)
+    op.create_index('ix_bookings_status_date', 'bookings', ['status', 'date'])
+    # История клиента
+    op.create_index('ix_bookings_client_id_date', 'bookings', ['client_id', 'date'])
+
+    # Напоминания: сканируются только подтвержденные записи по дате
+    op.create_index(
+        'ix_bookings_confirmed_date', 'bookings', ['date'],
+        postgresql_where=sa.text("status = 'CONFIRMED'")
+    )
+    # Очистка неподтвержденных записей по времени создания
+    op.create_index(
+        'ix_bookings_pending_created_at', 'bookings', ['created_at'],
+        postgresql_where=sa.text("status = 'PENDING'")
+    )
+
+    # Одноколоночные индексы покрываются составными по тем же ведущим колонкам
+    op.drop_index('ix_bookings_master_id', table_name='bookings')
+    op.drop_index('ix_bookings_tenant_id', table_name='bookings')
+
+    # Блокировки мастера за период
+    op.create_index('ix_block_times_master_id_start_time', 'block_times', ['master_id', 'start_time'])
+    op.drop_index('ix_block_times_master_id', table_name='block_times')
+
+    # Расписание мастера на день недели
+    op.create_index('ix_master_schedules_master_id_day', 'master_schedules', ['master_id', 'day_of_week'])
+
+    # Профиль мастера ищется по user_id почти в каждом запросе кабинета
+    op.create_index('ix_masters_user_id', 'masters', ['user_id'])
+
+    # Статистика запросов разрешений по салону
+    op.create_index('ix_permission_requests_tenant_id_status', 'permission_requests', ['tenant_id', 'status'])
+
+def downgrade() -> None:
+    op.drop_index('ix_permission_requests_tenant_id_status', table_name='permission_requests')
+    op.drop_index('ix_masters_user_id', table_name='masters')
+    op.drop_index('ix_master_schedules_master_id_day', table_name='master_schedules')
+
+    op.create_index('ix_block_times_master_id', 'block_times', ['master_id'])
+    op.drop_index('ix_block_times_master_id_start_time', table_name='block_times')
+
+    op.create_index('ix_bookings_tenant_id', 'bookings', ['tenant_id'])
+    op.create_index('ix_bookings_master_id', 'bookings', ['master_id'])
+
+    op.drop_index('ix_bookings_pending_created_at', table_name='bookings')
+    op.drop_index('ix_bookings_confirmed_date', table_name='bookings')
+    op.drop_index('ix_bookings_client_id_date', table_name='bookings')
+    op.drop_index('ix_bookings_status_date', table_name='bookings')
+    op.drop_index('ix_bookings_tenant_id_date', table_name='bookings')
+    op.drop_index('ix_bookings_master_id_date', table_name='bookings')
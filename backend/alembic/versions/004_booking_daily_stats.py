@@ -0,0 +1,68 @@
+"""Daily booking rollup for dashboard and master analytics
+
+Revision ID: 004
+Revises: 003
+Create Date: 2025-01-25 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'booking_daily_stats',
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('tenants.id'), nullable=False),
+        sa.Column('master_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('masters.id'), nullable=False),
+        sa.Column('service_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('services.id'), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('total_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('pending_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('confirmed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cancelled_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('no_show_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('revenue', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('client_sketch', postgresql.BIT(4096), nullable=False, server_default=sa.text("B'0'::bit(4096)")),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('tenant_id', 'master_id', 'service_id', 'day', name='pk_booking_daily_stats')
+    )
+    op.create_index('ix_booking_daily_stats_tenant_id_day', 'booking_daily_stats', ['tenant_id', 'day'])
+    op.create_index('ix_booking_daily_stats_master_id_day', 'booking_daily_stats', ['master_id', 'day'])
+
+    # Заполнение по существующим записям; формула карты клиентов совпадает
+    # с client_sketch_bit в app/services/booking_stats.py
+    op.execute("""
+        INSERT INTO booking_daily_stats (
+            tenant_id, master_id, service_id, day,
+            total_count, pending_count, confirmed_count, completed_count, cancelled_count, no_show_count,
+            revenue, client_sketch, updated_at
+        )
+        SELECT
+            tenant_id, master_id, service_id, date(date),
+            count(*),
+            count(*) FILTER (WHERE status = 'PENDING'),
+            count(*) FILTER (WHERE status = 'CONFIRMED'),
+            count(*) FILTER (WHERE status = 'COMPLETED'),
+            count(*) FILTER (WHERE status = 'CANCELLED'),
+            count(*) FILTER (WHERE status = 'NO_SHOW'),
+            coalesce(sum(price) FILTER (WHERE status = 'COMPLETED'), 0),
+            bit_or(
+                CAST('1' AS bit(4096))
+                >> CAST(CAST('x' || substr(md5(CAST(client_id AS varchar)), 1, 3) AS bit(12)) AS integer)
+            ),
+            now() AT TIME ZONE 'utc'
+        FROM bookings
+        GROUP BY tenant_id, master_id, service_id, date(date)
+    """)
+
+def downgrade() -> None:
+    op.drop_index('ix_booking_daily_stats_master_id_day', table_name='booking_daily_stats')
+    op.drop_index('ix_booking_daily_stats_tenant_id_day', table_name='booking_daily_stats')
+    op.drop_table('booking_daily_stats')
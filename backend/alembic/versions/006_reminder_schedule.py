@@ -0,0 +1,46 @@
+"""Reminder schedule queue
+
+Revision ID: 006
+Revises: 005
+Create Date: 2025-02-01 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'reminder_schedule',
+        sa.Column('booking_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('bookings.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('hours_before', sa.Integer(), nullable=False),
+        sa.Column('due_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('booking_id', 'hours_before', name='pk_reminder_schedule')
+    )
+    # Очередь напоминаний: только неотправленные, по времени
+    op.create_index(
+        'ix_reminder_schedule_due_at', 'reminder_schedule', ['due_at'],
+        postgresql_where=sa.text('sent_at IS NULL')
+    )
+
+    # Напоминания для уже подтвержденных будущих записей (смещения - REMINDER_HOURS_BEFORE)
+    op.execute("""
+        INSERT INTO reminder_schedule (booking_id, hours_before, due_at, created_at)
+        SELECT b.id, o.hours_before, b.date - make_interval(hours => o.hours_before), now() AT TIME ZONE 'utc'
+        FROM bookings b
+        CROSS JOIN (VALUES (24), (2)) AS o(hours_before)
+        WHERE b.status = 'CONFIRMED'
+          AND b.date - make_interval(hours => o.hours_before) > now() AT TIME ZONE 'utc'
+    """)
+
+def downgrade() -> None:
+    op.drop_index('ix_reminder_schedule_due_at', table_name='reminder_schedule')
+    op.drop_table('reminder_schedule')
@@ -0,0 +1,25 @@
+"""Keyset pagination index for client lists
+
+Revision ID: 007
+Revises: 006
+Create Date: 2025-02-05 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    # Список клиентов салона страницами по (created_at, id), новые первыми
+    op.create_index('ix_clients_tenant_id_created_at_id', 'clients', ['tenant_id', 'created_at', 'id'])
+    # Покрывается составным индексом по той же ведущей колонке
+    op.drop_index('ix_clients_tenant_id', table_name='clients')
+
+def downgrade() -> None:
+    op.create_index('ix_clients_tenant_id', 'clients', ['tenant_id'])
+    op.drop_index('ix_clients_tenant_id_created_at_id', table_name='clients')
@@ -0,0 +1,47 @@
+"""Trigram client search
+
+Revision ID: 008
+Revises: 007
+Create Date: 2025-02-08 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # btree_gin нужен для tenant_id (uuid) внутри gin-индекса
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gin')
+
+    # Нормализованные поля поиска вычисляет сама база (таблица перезаписывается один раз)
+    op.add_column('clients', sa.Column(
+        'search_text', sa.Text(),
+        sa.Computed("lower(first_name || coalesce(' ' || last_name, '') || ' ' || email)", persisted=True)
+    ))
+    op.add_column('clients', sa.Column(
+        'phone_digits', sa.String(20),
+        sa.Computed("regexp_replace(phone, '[^0-9]', '', 'g')", persisted=True)
+    ))
+
+    op.create_index(
+        'ix_clients_search_text_trgm', 'clients', ['tenant_id', 'search_text'],
+        postgresql_using='gin',
+        postgresql_ops={'search_text': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'ix_clients_phone_digits_trgm', 'clients', ['tenant_id', 'phone_digits'],
+        postgresql_using='gin',
+        postgresql_ops={'phone_digits': 'gin_trgm_ops'}
+    )
+
+def downgrade() -> None:
+    op.drop_index('ix_clients_phone_digits_trgm', table_name='clients')
+    op.drop_index('ix_clients_search_text_trgm', table_name='clients')
+    op.drop_column('clients', 'phone_digits')
+    op.drop_column('clients', 'search_text')
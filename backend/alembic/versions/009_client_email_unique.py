@@ -0,0 +1,86 @@
+"""Unique client email per tenant
+
+Revision ID: 009
+Revises: 008
+Create Date: 2025-02-10 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+# Дубли клиентов (один email в салоне): остается самый ранний, записи переносятся на него
+DUPLICATE_CLIENTS = """
+    SELECT id, keep_id FROM (
+        SELECT
+            id,
+            first_value(id) OVER (
+                PARTITION BY tenant_id, lower(email)
+                ORDER BY created_at NULLS LAST, id
+            ) AS keep_id
+        FROM clients
+    ) ranked
+    WHERE id <> keep_id
+"""
+
+# Поля дублей переносятся на оставшегося клиента до удаления: флаги - через
+# OR, заметки склеиваются, пустые поля берутся из первого дубля, где они есть
+MERGE_DUPLICATES = f"""
+    UPDATE clients SET
+        is_vip = coalesce(clients.is_vip, false) OR coalesce(merged.is_vip, false),
+        is_blacklisted = coalesce(clients.is_blacklisted, false) OR coalesce(merged.is_blacklisted, false),
+        notes = nullif(concat_ws(E'\\n', clients.notes, merged.notes), ''),
+        birth_date = coalesce(clients.birth_date, merged.birth_date),
+        last_name = coalesce(nullif(clients.last_name, ''), merged.last_name),
+        phone = coalesce(nullif(clients.phone, ''), merged.phone, clients.phone),
+        preferences = CASE
+            WHEN clients.preferences IS NULL OR clients.preferences::text IN ('{{}}', 'null')
+            THEN coalesce(merged.preferences, clients.preferences)
+            ELSE clients.preferences
+        END
+    FROM (
+        SELECT
+            duplicates.keep_id,
+            bool_or(c.is_vip) AS is_vip,
+            bool_or(c.is_blacklisted) AS is_blacklisted,
+            string_agg(c.notes, E'\\n' ORDER BY c.created_at, c.id) AS notes,
+            (array_agg(c.birth_date ORDER BY c.created_at, c.id)
+                FILTER (WHERE c.birth_date IS NOT NULL))[1] AS birth_date,
+            (array_agg(c.last_name ORDER BY c.created_at, c.id)
+                FILTER (WHERE nullif(c.last_name, '') IS NOT NULL))[1] AS last_name,
+            (array_agg(c.phone ORDER BY c.created_at, c.id)
+                FILTER (WHERE nullif(c.phone, '') IS NOT NULL))[1] AS phone,
+            (array_agg(c.preferences ORDER BY c.created_at, c.id)
+                FILTER (WHERE c.preferences IS NOT NULL AND c.preferences::text NOT IN ('{{}}', 'null')))[1] AS preferences
+        FROM ({DUPLICATE_CLIENTS}) duplicates
+        JOIN clients c ON c.id = duplicates.id
+        GROUP BY duplicates.keep_id
+    ) merged
+    WHERE clients.id = merged.keep_id
+"""
+
+def upgrade() -> None:
+    op.execute(MERGE_DUPLICATES)
+    op.execute(f"""
+        UPDATE bookings SET client_id = duplicates.keep_id
+        FROM ({DUPLICATE_CLIENTS}) duplicates
+        WHERE bookings.client_id = duplicates.id
+    """)
+    op.execute(f"DELETE FROM clients WHERE id IN (SELECT id FROM ({DUPLICATE_CLIENTS}) duplicates)")
+
+    op.create_index(
+        'uq_clients_tenant_id_lower_email', 'clients',
+        ['tenant_id', sa.text('lower(email)')],
+        unique=True
+    )
+    # Поиск клиента по email идет через lower(email) - старый индекс не нужен
+    op.drop_index('ix_clients_email', table_name='clients')
+
+def downgrade() -> None:
+    op.create_index('ix_clients_email', 'clients', ['email'])
+    op.drop_index('uq_clients_tenant_id_lower_email', table_name='clients')
@@ -0,0 +1,78 @@
+"""Incremental client lifetime stats and per-master client stats
+
+Revision ID: 010
+Revises: 009
+Create Date: 2025-02-12 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        'master_client_stats',
+        sa.Column('master_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('masters.id'), nullable=False),
+        sa.Column('client_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('clients.id'), nullable=False),
+        sa.Column('tenant_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('tenants.id'), nullable=False),
+        sa.Column('total_bookings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_bookings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('cancelled_bookings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('no_show_bookings', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_spent', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('last_visit', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('master_id', 'client_id', name='pk_master_client_stats')
+    )
+    op.create_index('ix_master_client_stats_master_id_total', 'master_client_stats', ['master_id', 'total_bookings'])
+    op.create_index('ix_master_client_stats_client_id', 'master_client_stats', ['client_id'])
+
+    # Заполнение по существующим записям
+    op.execute("""
+        INSERT INTO master_client_stats (
+            master_id, client_id, tenant_id,
+            total_bookings, completed_bookings, cancelled_bookings, no_show_bookings,
+            total_spent, last_visit, updated_at
+        )
+        SELECT
+            master_id, client_id, tenant_id,
+            count(*),
+            count(*) FILTER (WHERE status = 'COMPLETED'),
+            count(*) FILTER (WHERE status = 'CANCELLED'),
+            count(*) FILTER (WHERE status = 'NO_SHOW'),
+            coalesce(sum(price) FILTER (WHERE status = 'COMPLETED'), 0),
+            max(date) FILTER (WHERE status = 'COMPLETED'),
+            now() AT TIME ZONE 'utc'
+        FROM bookings
+        GROUP BY tenant_id, master_id, client_id
+    """)
+
+    # Счетчики клиента раньше пересчитывались только при просмотре истории
+    op.execute("""
+        UPDATE clients SET
+            total_visits = coalesce(stats.visits, 0),
+            total_spent = coalesce(stats.spent, 0),
+            last_visit = stats.last_visit
+        FROM (
+            SELECT
+                clients.id,
+                count(bookings.id) FILTER (WHERE bookings.status = 'COMPLETED') AS visits,
+                sum(bookings.price) FILTER (WHERE bookings.status = 'COMPLETED') AS spent,
+                max(bookings.date) FILTER (WHERE bookings.status = 'COMPLETED') AS last_visit
+            FROM clients
+            LEFT JOIN bookings ON bookings.client_id = clients.id
+            GROUP BY clients.id
+        ) stats
+        WHERE clients.id = stats.id
+    """)
+
+def downgrade() -> None:
+    op.drop_index('ix_master_client_stats_client_id', table_name='master_client_stats')
+    op.drop_index('ix_master_client_stats_master_id_total', table_name='master_client_stats')
+    op.drop_table('master_client_stats')
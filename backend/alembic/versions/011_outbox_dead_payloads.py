@@ -0,0 +1,28 @@
+"""Clear secrets from dead-lettered sensitive notifications
+
+Revision ID: 011
+Revises: 010
+Create Date: 2025-02-13 00:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+# Как SENSITIVE_EMAIL_KINDS в app/services/outbox.py на момент миграции
+SENSITIVE_KINDS = ("verification_email", "password_reset", "master_welcome", "booking_verification_code")
+
+def upgrade() -> None:
+    # Временные пароли, токены сброса и коды в DEAD хранились бессрочно
+    op.execute(
+        "UPDATE notification_outbox SET payload = '{}' "
+        "WHERE status = 'DEAD' AND kind IN (%s)" % ", ".join(f"'{kind}'" for kind in SENSITIVE_KINDS)
+    )
+
+def downgrade() -> None:
+    # Удаленные данные не восстанавливаются
+    pass
@@ -10,6 +10,8 @@ from app.services.auth import AuthService
 from app.utils.security import get_current_user
 from app.config import settings
 from app.models.user import User
+from app.utils.principal_cache import bump_principal
+from app.utils.tenant_resolver import request_subdomain
 
 router = APIRouter()
 
@@ -28,8 +30,11 @@ async def change_password(
     """Change user password"""
     auth_service = AuthService(db)
     
+    # current_user - снимок из кэша без пароля, загружаем строку пользователя
+    user = await db.get(User, current_user.id)
+    
     # Verify current password
-    if not auth_service.verify_password(password_data.current_password, current_user.hashed_password):
+    if not auth_service.verify_password(password_data.current_password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -43,8 +48,9 @@ async def change_password(
         )
     
     # Update password
-    current_user.hashed_password = auth_service.get_password_hash(password_data.new_password)
+    user.hashed_password = auth_service.get_password_hash(password_data.new_password)
     await db.commit()
+    await bump_principal(user.id)
     
     return {"message": "Password changed successfully"}
 
@@ -57,7 +63,7 @@ async def register(
 ):
     """Register new user"""
     # Extract subdomain from request
-    subdomain = request.headers.get("X-Tenant-Subdomain")
+    subdomain = request_subdomain(request)
     
     auth_service = AuthService(db)
     user = await auth_service.register_user(user_data, subdomain)
@@ -227,5 +233,6 @@ async def set_initial_password(
     user.is_verified = True  # Mark as verified since they're setting password
     
     await db.commit()
+    await bump_principal(user.id)
     
     return {"message": "Password set successfully"}
\ No newline at end of file
@@ -1,42 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, case, and_, or_
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime, date, timedelta
 from uuid import UUID
 import secrets
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.schemas.booking import BookingCreate, BookingUpdate, BookingResponse
 from app.services.booking import BookingService
-from app.services.notification import NotificationService
+from app.services.client import ClientService
+from app.services.booking_stats import BookingStatsService, booking_facts
+from app.utils import availability_cache
+from app.utils.pagination import page_params, paginate, set_page_headers
+from app.utils.export import export_response
+from app.utils.tenant_resolver import get_request_tenant_id, get_tenant_by_id, get_tenant_by_subdomain, request_subdomain
+from app.services.outbox import OutboxService
+from app.services.reminders import ReminderService
 from app.utils.security import get_current_user
 from app.models.booking import Booking, BookingStatus
 from app.models.client import Client
 from app.models.user import User, UserRole
 from app.models.master import Master
-from app.models.tenant import Tenant
 from app.utils.security import require_role
 from app.models.service import Service
 
 router = APIRouter()
 
-# --- Get tenant ID from headers for public access ---
-async def get_tenant_id_from_header(request: Request) -> Optional[UUID]:
-    """Получает tenant_id из заголовка X-Tenant-ID"""
-    tenant_id_str = request.headers.get("X-Tenant-ID")
-    if tenant_id_str:
-        try:
-            return UUID(tenant_id_str)
-        except ValueError:
-            return None
-    return None
+# Ограничения календаря доступности
+CALENDAR_DEFAULT_DAYS = 14
+CALENDAR_MAX_DAYS = 31
 
 # --- Email Verification for Booking ---
 @router.post("/verify-email")
 async def verify_booking_email(
     request: Request,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
     """Send email verification for booking"""
@@ -50,7 +48,7 @@ async def verify_booking_email(
             detail="Email is required"
         )
     
-    tenant_id = await get_tenant_id_from_header(request)
+    tenant_id = await get_request_tenant_id(request)
     
     if not tenant_id:
         raise HTTPException(
@@ -65,13 +63,8 @@ async def verify_booking_email(
     # For now, we'll return it directly
     # In production, send email with verification link
     
-    from app.utils.email import EmailService
-    email_service = EmailService()
-    
     # Get tenant info
-    from app.models.tenant import Tenant
-    result = await db.execute(select(Tenant).where(Tenant.id == tenant_id))
-    tenant = result.scalar_one_or_none()
+    tenant = await get_tenant_by_id(tenant_id, db)
     
     if not tenant:
         raise HTTPException(status_code=404, detail="Tenant not found")
@@ -86,19 +79,18 @@ async def verify_booking_email(
     # Store token in session or Redis with expiry
     # For demo, we'll return the token
     
-    # Actually send the email
-    email_sent = await email_service.send_booking_verification_email(
-        to_email=email,
-        user_name=email.split('@')[0],  # Use email prefix as name
-        verification_code=verification_code,
-        barbershop_name=tenant.name
+    # Письмо уходит через outbox после коммита запроса
+    OutboxService(db).enqueue(
+        "booking_verification_code",
+        {
+            "to_email": email,
+            "user_name": email.split('@')[0],  # Use email prefix as name
+            "verification_code": verification_code,
+            "barbershop_name": tenant.name
+        },
+        tenant_id=tenant.id
     )
-    
-    if not email_sent:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send verification email"
-        )
+    await db.commit()
     
     return {
         "message": "Verification email sent",
@@ -110,15 +102,13 @@ async def verify_booking_email(
 @router.post("/create", response_model=BookingResponse)
 async def create_booking_with_verification(
     booking_data: dict,
-    background_tasks: BackgroundTasks,
     request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """Create new booking after email verification"""
     service = BookingService(db)
-    notification_service = NotificationService(db)
     
-    tenant_id = await get_tenant_id_from_header(request)
+    tenant_id = await get_request_tenant_id(request)
     
     if not tenant_id:
         raise HTTPException(
@@ -136,27 +126,13 @@ async def create_booking_with_verification(
     
     # TODO: Verify token from Redis/DB
     
-    # Check or create client
-    result = await db.execute(
-        select(Client).where(
-            and_(
-                Client.email == booking_data["client_email"],
-                Client.tenant_id == tenant_id
-            )
-        )
+    # Клиент находится или создается в той же транзакции, что и запись
+    client_id = await ClientService(db).resolve_client(
+        tenant_id,
+        booking_data["client_email"],
+        booking_data.get("client_phone"),
+        booking_data["client_name"]
     )
-    client = result.scalar_one_or_none()
-    
-    if not client:
-        client = Client(
-            tenant_id=tenant_id,
-            first_name=booking_data["client_name"].split()[0],
-            last_name=" ".join(booking_data["client_name"].split()[1:]) if len(booking_data["client_name"].split()) > 1 else "",
-            email=booking_data["client_email"],
-            phone=booking_data.get("client_phone")
-        )
-        db.add(client)
-        await db.flush()
     
     # Check availability
     if not await service.check_availability(
@@ -170,13 +146,22 @@ async def create_booking_with_verification(
             detail="Time slot not available"
         )
     
+    booked_service = await db.get(Service, UUID(booking_data["service_id"]))
+    if not booked_service:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Service not found"
+        )
+    
     # Create booking
+    booking_date = datetime.fromisoformat(booking_data["date"])
     booking = Booking(
         tenant_id=tenant_id,
         master_id=UUID(booking_data["master_id"]),
-        service_id=UUID(booking_data["service_id"]),
-        client_id=client.id,
-        date=datetime.fromisoformat(booking_data["date"]),
+        service_id=booked_service.id,
+        client_id=client_id,
+        date=booking_date,
+        end_time=booking_date + timedelta(minutes=booked_service.duration),
         price=booking_data.get("price", 0),
         status=BookingStatus.CONFIRMED,  # Auto-confirm after email verification
         email_verified=True,
@@ -184,15 +169,10 @@ async def create_booking_with_verification(
         cancellation_token=secrets.token_urlsafe(32)
     )
     
-    db.add(booking)
-    await db.commit()
-    await db.refresh(booking)
+    # Пересечение с другой записью отклонит сам INSERT
+    await service.add_booking(booking)
     
-    # Send confirmation email in background
-    background_tasks.add_task(
-        notification_service.send_booking_confirmation,
-        booking.id
-    )
+    await availability_cache.invalidate_booking(booking)
     
     return booking
 
@@ -201,10 +181,11 @@ async def create_booking_with_verification(
 async def get_client_bookings(
     email: str = Query(...),
     request: Request = None,
+    page_query: dict = Depends(page_params),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get client's booking history by email"""
-    tenant_id = await get_tenant_id_from_header(request)
+    """Get client's booking history by email (страницами: next_cursor -> cursor)"""
+    tenant_id = await get_request_tenant_id(request)
     
     if not tenant_id:
         return {"bookings": []}
@@ -213,8 +194,8 @@ async def get_client_bookings(
     result = await db.execute(
         select(Client).where(
             and_(
-                Client.email == email,
-                Client.tenant_id == tenant_id
+                Client.tenant_id == tenant_id,
+                func.lower(Client.email) == email.strip().lower()
             )
         )
     )
@@ -224,16 +205,22 @@ async def get_client_bookings(
         return {"bookings": []}
     
     # Get bookings
-    bookings_result = await db.execute(
+    page = await paginate(
+        db,
         select(Booking, Master, Service)
         .join(Master, Booking.master_id == Master.id)
         .join(Service, Booking.service_id == Service.id)
-        .where(Booking.client_id == client.id)
-        .order_by(Booking.date.desc())
+        .where(Booking.client_id == client.id),
+        Booking.date,
+        Booking.id,
+        key=lambda row: (row.Booking.date, row.Booking.id),
+        descending=True,
+        scalars=False,
+        **page_query
     )
     
     bookings = []
-    for booking, master, service in bookings_result:
+    for booking, master, service in page.items:
         bookings.append({
             "id": str(booking.id),
             "date": booking.date.isoformat(),
@@ -245,7 +232,7 @@ async def get_client_bookings(
             "cancellation_token": booking.cancellation_token if booking.status == BookingStatus.CONFIRMED else None
         })
     
-    return {"bookings": bookings}
+    return {"bookings": bookings, "next_cursor": page.next_cursor, "total": page.total}
 
 # --- Optional current user for public endpoints ---
 async def get_current_user_optional(
@@ -272,21 +259,19 @@ async def get_current_user_optional(
 @router.post("/", response_model=BookingResponse)
 async def create_booking(
     booking_data: BookingCreate,
-    background_tasks: BackgroundTasks,
     request: Request,
     current_user: Optional[User] = Depends(get_current_user_optional),
     db: AsyncSession = Depends(get_db)
 ):
     """Create new booking - публичный endpoint для клиентов"""
     service = BookingService(db)
-    notification_service = NotificationService(db)
     
     # Получаем tenant_id
     if current_user:
         tenant_id = current_user.tenant_id
     else:
         # Get tenant_id from subdomain header
-        subdomain = request.headers.get("X-Tenant-Subdomain")
+        subdomain = request_subdomain(request)
         if not subdomain:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -294,10 +279,7 @@ async def create_booking(
             )
         
         # Get tenant by subdomain
-        tenant_result = await db.execute(
-            select(Tenant).where(Tenant.subdomain == subdomain)
-        )
-        tenant = tenant_result.scalar_one_or_none()
+        tenant = await get_tenant_by_subdomain(subdomain, db)
         
         if not tenant:
             raise HTTPException(
@@ -319,21 +301,15 @@ async def create_booking(
             detail="Time slot not available"
         )
     
-    # Create booking
+    # Create booking (письмо-подтверждение пишется в outbox той же транзакцией)
     booking = await service.create_booking(tenant_id, booking_data)
     
-    # Send confirmation email in background
-    background_tasks.add_task(
-        notification_service.send_booking_confirmation,
-        booking.id
-    )
-    
     return booking
 
 @router.get("/master/stats")
 async def get_master_booking_stats(
     current_user: User = Depends(require_role(UserRole.MASTER)),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get booking statistics for current master"""
     # Найти профиль мастера
@@ -380,7 +356,7 @@ async def check_availability(
     service_id: UUID,
     request: Request,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Check if time slot is available - публичный endpoint"""
     service = BookingService(db)
@@ -389,7 +365,7 @@ async def check_availability(
     if current_user:
         tenant_id = current_user.tenant_id
     else:
-        tenant_id = await get_tenant_id_from_header(request)
+        tenant_id = await get_request_tenant_id(request)
     
     if not tenant_id:
         return {"available": False, "error": "Tenant ID is required"}
@@ -411,7 +387,7 @@ async def get_available_slots(
     service_id: UUID = Query(...),
     request: Request = None,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get available time slots for a day - публичный endpoint"""
     service = BookingService(db)
@@ -420,7 +396,7 @@ async def get_available_slots(
     if current_user:
         tenant_id = current_user.tenant_id
     else:
-        tenant_id = await get_tenant_id_from_header(request)
+        tenant_id = await get_request_tenant_id(request)
     
     if not tenant_id:
         return {"slots": [], "error": "Tenant ID is required"}
@@ -434,6 +410,59 @@ async def get_available_slots(
     
     return {"slots": slots}
 
+# --- Public endpoint for availability calendar (many masters, many days) ---
+@router.get("/availability/calendar")
+async def get_availability_calendar(
+    service_id: UUID = Query(...),
+    date_from: date = Query(...),
+    date_to: Optional[date] = Query(None),
+    master_ids: Optional[List[UUID]] = Query(None),
+    request: Request = None,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get available slots for several masters and days at once - публичный endpoint"""
+    service = BookingService(db)
+    
+    # Получаем tenant_id
+    if current_user:
+        tenant_id = current_user.tenant_id
+    else:
+        tenant_id = await get_request_tenant_id(request)
+    
+    if not tenant_id:
+        return {"masters": {}, "error": "Tenant ID is required"}
+    
+    if not date_to:
+        date_to = date_from + timedelta(days=CALENDAR_DEFAULT_DAYS - 1)
+    
+    if date_to < date_from or (date_to - date_from).days >= CALENDAR_MAX_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Date range must be between 1 and {CALENDAR_MAX_DAYS} days"
+        )
+    
+    availability = await service.get_available_slots_range(
+        tenant_id,
+        service_id,
+        date_from,
+        date_to,
+        master_ids
+    )
+    
+    return {
+        "service_id": str(service_id),
+        "date_from": date_from.isoformat(),
+        "date_to": date_to.isoformat(),
+        "masters": {
+            str(master_id): {
+                day.isoformat(): slots
+                for day, slots in days.items()
+            }
+            for master_id, days in availability.items()
+        }
+    }
+
 # --- Protected endpoints (требуют авторизации) ---
 @router.get("/")
 async def get_bookings(
@@ -441,23 +470,28 @@ async def get_bookings(
     date_to: Optional[date] = Query(None),
     master_id: Optional[UUID] = Query(None),
     status: Optional[BookingStatus] = Query(None),
+    request: Request = None,
+    response: Response = None,
+    page_query: dict = Depends(page_params),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get bookings with filters - требует авторизации"""
+    """Get bookings with filters - требует авторизации (страницами, см. X-Next-Cursor)"""
     service = BookingService(db)
     
-    bookings = await service.get_bookings(
+    page = await service.get_bookings(
         tenant_id=current_user.tenant_id,
         date_from=date_from,
         date_to=date_to,
         master_id=master_id,
-        status=status
+        status=status,
+        **page_query
     )
+    set_page_headers(response, request, page)
     
     # Convert to response format with client and service names
     result = []
-    for booking in bookings:
+    for booking in page.items:
         result.append({
             "id": str(booking.id),
             "tenant_id": str(booking.tenant_id),
@@ -483,6 +517,27 @@ async def get_bookings(
     
     return result
 
+# --- Streaming export (CSV/NDJSON), same filters as the list ---
+@router.get("/export")
+async def export_bookings(
+    date_from: Optional[date] = Query(None),
+    date_to: Optional[date] = Query(None),
+    master_id: Optional[UUID] = Query(None),
+    status: Optional[BookingStatus] = Query(None),
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    current_user: User = Depends(require_role([UserRole.OWNER, UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Выгрузка всех записей салона потоком, без загрузки в память"""
+    query = BookingService(db).export_bookings_query(
+        tenant_id=current_user.tenant_id,
+        date_from=date_from,
+        date_to=date_to,
+        master_id=master_id,
+        status=status
+    )
+    return export_response(db, query, format, f"bookings-{datetime.utcnow():%Y%m%d}")
+
 @router.get("/{booking_id}", response_model=BookingResponse)
 async def get_booking(
     booking_id: UUID,
@@ -508,10 +563,12 @@ async def get_public_bookings(
     master_id: Optional[UUID] = Query(None),
     status: Optional[BookingStatus] = Query(None),
     request: Request = None,
+    response: Response = None,
+    page_query: dict = Depends(page_params),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get bookings with filters - public endpoint"""
+    """Get bookings with filters - public endpoint (страницами, см. X-Next-Cursor)"""
     service = BookingService(db)
     
     # Get tenant_id
@@ -519,7 +576,7 @@ async def get_public_bookings(
         tenant_id = current_user.tenant_id
     else:
         # Get tenant_id from subdomain header
-        subdomain = request.headers.get("X-Tenant-Subdomain")
+        subdomain = request_subdomain(request)
         if not subdomain:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -527,10 +584,7 @@ async def get_public_bookings(
             )
         
         # Get tenant by subdomain
-        tenant_result = await db.execute(
-            select(Tenant).where(Tenant.subdomain == subdomain)
-        )
-        tenant = tenant_result.scalar_one_or_none()
+        tenant = await get_tenant_by_subdomain(subdomain, db)
         
         if not tenant:
             raise HTTPException(
@@ -540,17 +594,19 @@ async def get_public_bookings(
         
         tenant_id = tenant.id
     
-    bookings = await service.get_bookings(
+    page = await service.get_bookings(
         tenant_id=tenant_id,
         date_from=date_from,
         date_to=date_to,
         master_id=master_id,
-        status=status
+        status=status,
+        **page_query
     )
+    set_page_headers(response, request, page)
     
     # Convert to response format with client and service names
     result = []
-    for booking in bookings:
+    for booking in page.items:
         result.append({
             "id": str(booking.id),
             "tenant_id": str(booking.tenant_id),
@@ -581,13 +637,12 @@ async def get_public_bookings(
 async def confirm_booking(
     booking_id: UUID,
     token: str = Query(...),
-    background_tasks: BackgroundTasks = None,
     db: AsyncSession = Depends(get_db)
 ):
     """Confirm booking with token - публичный endpoint"""
     service = BookingService(db)
-    notification_service = NotificationService(db)
     
+    # Напоминания планируются в той же транзакции (reminder_schedule)
     booking = await service.confirm_booking(booking_id, token)
     
     if not booking:
@@ -596,13 +651,6 @@ async def confirm_booking(
             detail="Invalid confirmation token"
         )
     
-    # Send reminder in background
-    if background_tasks:
-        background_tasks.add_task(
-            notification_service.schedule_reminder,
-            booking.id
-        )
-    
     return {"message": "Booking confirmed successfully"}
 
 @router.post("/{booking_id}/cancel")
@@ -663,7 +711,6 @@ async def cancel_client_booking(
     booking_id: UUID,
     cancellation_token: str = Query(...),
     reason: Optional[str] = None,
-    background_tasks: BackgroundTasks = None,
     db: AsyncSession = Depends(get_db)
 ):
     """Cancel booking with cancellation token"""
@@ -691,19 +738,17 @@ async def cancel_client_booking(
             detail="Cannot cancel booking less than 2 hours before appointment"
         )
     
+    before = booking_facts(booking)
     booking.status = BookingStatus.CANCELLED
     booking.cancelled_at = datetime.utcnow()
     booking.cancellation_reason = reason
+    await BookingStatsService(db).record_change(before, booking)
+    await ReminderService(db).sync(booking)
+    # Send cancellation email
+    OutboxService(db).enqueue_booking_email("booking_cancellation", booking)
     
     await db.commit()
     
-    # Send cancellation email
-    if background_tasks:
-        from app.services.notification import NotificationService
-        notification_service = NotificationService(db)
-        background_tasks.add_task(
-            notification_service.send_booking_cancellation,
-            booking.id
-        )
+    await availability_cache.invalidate_booking(booking)
     
     return {"message": "Booking cancelled successfully"}
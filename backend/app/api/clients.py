@@ -1,13 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import List, Literal, Optional
+from datetime import datetime
 from uuid import UUID
 
-from app.database import get_db
-from app.schemas.client import ClientCreate, ClientUpdate, ClientResponse
-from app.services.client import ClientService
+from app.database import get_db, get_read_db
+from app.schemas.client import ClientCreate, ClientUpdate, ClientResponse, ClientSearchResult
+from app.services.client import ClientService, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
 from app.utils.security import get_current_user, require_role, get_current_tenant
 from app.models.user import UserRole
+from app.utils.pagination import page_params, set_page_headers
+from app.utils.export import export_response
 
 router = APIRouter()
 
@@ -33,20 +36,52 @@ async def get_clients(
     request: Request,
     search: Optional[str] = Query(None),
     is_vip: Optional[bool] = Query(None),
+    response: Response = None,
+    page_query: dict = Depends(page_params),
     current_user = Depends(require_role([UserRole.OWNER, UserRole.MASTER])),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get all clients for tenant"""
+    """Get clients for tenant (страницами, см. X-Next-Cursor)"""
     tenant_id = await get_current_tenant(request, db)
     service = ClientService(db)
     
-    clients = await service.get_clients(
+    page = await service.get_clients(
         tenant_id=tenant_id,
         search=search,
-        is_vip=is_vip
+        is_vip=is_vip,
+        **page_query
     )
+    set_page_headers(response, request, page)
+    
+    return page.items
+
+@router.get("/search", response_model=List[ClientSearchResult])
+async def search_clients(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+    current_user = Depends(require_role([UserRole.OWNER, UserRole.MASTER])),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Подсказки поиска клиентов: имя, фамилия, email или телефон"""
+    service = ClientService(db)
     
-    return clients
+    return await service.search_clients(current_user.tenant_id, q, limit)
+
+@router.get("/export")
+async def export_clients(
+    search: Optional[str] = Query(None),
+    is_vip: Optional[bool] = Query(None),
+    format: Literal["csv", "ndjson"] = Query("csv"),
+    current_user = Depends(require_role([UserRole.OWNER, UserRole.ADMIN])),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Выгрузка клиентской базы потоком (CSV/NDJSON), без загрузки в память"""
+    query = ClientService(db).export_clients_query(
+        tenant_id=current_user.tenant_id,
+        search=search,
+        is_vip=is_vip
+    )
+    return export_response(db, query, format, f"clients-{datetime.utcnow():%Y%m%d}")
 
 @router.get("/{client_id}", response_model=ClientResponse)
 async def get_client(
@@ -89,15 +124,19 @@ async def update_client(
 @router.get("/{client_id}/history")
 async def get_client_history(
     client_id: UUID,
+    request: Request,
+    response: Response,
+    page_query: dict = Depends(page_params),
     current_user = Depends(require_role([UserRole.OWNER, UserRole.MASTER])),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get client's booking history"""
+    """Get client's booking history (страницами, см. X-Next-Cursor)"""
     service = ClientService(db)
     
-    history = await service.get_client_history(client_id)
+    page = await service.get_client_history(client_id, **page_query)
+    set_page_headers(response, request, page)
     
-    return history
+    return page.items
 
 @router.post("/{client_id}/notes")
 async def add_client_note(
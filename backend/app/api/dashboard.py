@@ -1,3 +1,4 @@
+import logging
 from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, extract
@@ -5,7 +6,7 @@ from datetime import date, datetime, timedelta
 from typing import Optional, List, Dict, Any
 from uuid import UUID
 
-from app.database import get_db
+from app.database import get_read_db
 from app.services.dashboard import DashboardService
 from app.utils.security import get_current_user, require_role, get_current_tenant
 from app.models.user import UserRole
@@ -15,6 +16,8 @@ from app.models.master import Master
 from app.models.service import Service
 from app.models.tenant import Tenant
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.get("/stats")
@@ -23,7 +26,7 @@ async def get_dashboard_stats(
     date_from: Optional[date] = Query(None),
     date_to: Optional[date] = Query(None),
     current_user = Depends(require_role([UserRole.OWNER, UserRole.MASTER])),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get dashboard statistics"""
     service = DashboardService(db)
@@ -67,7 +70,7 @@ async def get_dashboard_stats(
 async def get_today_overview(
     request: Request,
     current_user = Depends(require_role([UserRole.OWNER, UserRole.MASTER])),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get today's overview"""
     tenant_id = current_user.tenant_id
@@ -101,7 +104,7 @@ async def get_revenue_report(
     period: str = Query("day", description="Period: day, week, month, year"),
     request: Request = None,
     current_user = Depends(require_role([UserRole.OWNER, UserRole.MASTER])),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get revenue report"""
     tenant_id = current_user.tenant_id
@@ -138,7 +141,7 @@ async def get_popular_services(
     limit: int = Query(default=5, le=20),
     request: Request = None,
     current_user = Depends(require_role([UserRole.OWNER, UserRole.MASTER])),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get most popular services"""
     tenant_id = current_user.tenant_id
@@ -188,7 +191,7 @@ async def get_popular_services(
             for service in services
         ]
     except Exception as e:
-        print(f"Error in get_popular_services: {e}")
+        logger.error("Error in get_popular_services: %s", e)
         return []
 
 @router.get("/masters/performance")
@@ -196,7 +199,7 @@ async def get_masters_performance(
     limit: int = Query(default=5, le=20),
     request: Request = None,
     current_user = Depends(require_role([UserRole.OWNER, UserRole.ADMIN])),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get masters performance"""
     tenant_id = current_user.tenant_id
@@ -248,14 +251,14 @@ async def get_masters_performance(
             for master in masters
         ]
     except Exception as e:
-        print(f"Error in get_masters_performance: {e}")
+        logger.error("Error in get_masters_performance: %s", e)
         return []
 
 @router.get("/clients/top")
 async def get_top_clients(
     limit: int = Query(10, ge=1, le=50),
     current_user = Depends(require_role(UserRole.OWNER)),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get top clients by revenue"""
     service = DashboardService(db)
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status, Query, File, UploadFile
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Query, File, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, case, delete
 from typing import List, Optional
@@ -10,12 +11,14 @@ from app.services.auth import AuthService
 import secrets
 import string
 from app.api.services import get_current_user_optional
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.user import User, UserRole
 from app.models.master import Master, MasterSchedule
 from app.models.booking import Booking, BookingStatus
-from app.models.tenant import Tenant
 from app.utils.email import EmailService
+from app.utils import availability_cache
+from app.utils.tenant_resolver import get_tenant_by_subdomain, request_subdomain
+from app.utils.pagination import page_params, paginate, set_page_headers
 from app.schemas.master import (
     MasterUpdate, MasterResponse, MasterPermissionsUpdate, MasterCreate,
     MasterStatsResponse, TodayBookingsResponse
@@ -23,23 +26,21 @@ from app.schemas.master import (
 from app.models.permission_request import PermissionRequestType
 from app.models.master import MasterSchedule
 from app.services.master import MasterService
+from app.services.booking_stats import BookingStatsService, master_summary_columns, master_summary_from_row
+from app.models.booking_stats import BookingDailyStats
 from app.services.file_upload import FileUploadService
 from app.services.permission_request import PermissionRequestService
-from app.utils.security import get_current_master, get_current_user, require_role, get_current_tenant
+from app.utils.security import (
+    get_current_master, get_current_master_principal, get_current_user, require_role, get_current_tenant
+)
+from app.utils.principal_cache import Principal, bump_principal, bump_principals
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 # ---------------------- Utility functions ----------------------
-async def get_tenant_id_from_header(request: Request) -> Optional[UUID]:
-    tenant_id_str = request.headers.get("X-Tenant-ID")
-    if tenant_id_str:
-        try:
-            return UUID(tenant_id_str)
-        except ValueError:
-            return None
-    return None
-
 async def create_default_schedule(master_id: UUID, db: AsyncSession):
     """Создать расписание по умолчанию для мастера"""
     try:
@@ -80,10 +81,11 @@ async def create_default_schedule(master_id: UUID, db: AsyncSession):
             db.add(schedule)
         
         await db.commit()
-        print(f"✅ Created default schedule for master {master_id}")
+        await availability_cache.invalidate_master(master_id)
+        logger.debug("Created default schedule for master %s", master_id)
         
     except Exception as e:
-        print(f"❌ Error creating default schedule: {e}")
+        logger.error("Error creating default schedule: %s", e)
         # Не поднимаем исключение, чтобы не сломать создание мастера
 
 # ====================== ⭐ ВАЖНО: СПЕЦИФИЧНЫЕ РОУТЫ ИДУТ ПЕРВЫМИ! ======================
@@ -97,7 +99,7 @@ async def get_my_profile(
 ):
     """Получить свой профиль мастера"""
     try:
-        print(f"🔍 Getting profile for user: {current_user.email} (ID: {current_user.id})")
+        logger.debug("Getting profile for user: %s (ID: %s)", current_user.email, current_user.id)
         
         result = await db.execute(
             select(Master).where(Master.user_id == current_user.id)
@@ -105,7 +107,7 @@ async def get_my_profile(
         master = result.scalar_one_or_none()
         
         if not master:
-            print(f"⚠️ No master profile found for user {current_user.email}, creating one...")
+            logger.warning("No master profile found for user %s, creating one...", current_user.email)
             
             # Создаем профиль мастера если его нет
             display_name = f"{current_user.first_name or ''} {current_user.last_name or ''}".strip()
@@ -137,13 +139,14 @@ async def get_my_profile(
             db.add(master)
             await db.commit()
             await db.refresh(master)
+            await bump_principal(current_user.id)
             
             # Создаем расписание по умолчанию
             await create_default_schedule(master.id, db)
             
-            print(f"✅ Created master profile for user {current_user.email}")
+            logger.debug("Created master profile for user %s", current_user.email)
         else:
-            print(f"✅ Found existing master profile: {master.display_name}")
+            logger.debug("Found existing master profile: %s", master.display_name)
             
             # Проверяем и исправляем NULL временные метки
             if master.created_at is None:
@@ -160,15 +163,13 @@ async def get_my_profile(
             existing_schedules = schedule_result.scalars().all()
             
             if not existing_schedules:
-                print(f"⚠️ No schedule found for master {master.id}, creating default...")
+                logger.warning("No schedule found for master %s, creating default...", master.id)
                 await create_default_schedule(master.id, db)
         
         return master
         
-    except Exception as e:
-        print(f"❌ Error in get_my_profile: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error in get_my_profile")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get master profile"
@@ -206,45 +207,19 @@ async def get_permission_requests_stats(
     try:
         from app.models.permission_request import PermissionRequest, PermissionRequestStatus
         
-        # Считаем запросы по статусам для данного тенанта
-        total_result = await db.execute(
-            select(func.count()).select_from(PermissionRequest)
-            .where(PermissionRequest.tenant_id == current_user.tenant_id)
-        )
-        total = total_result.scalar() or 0
-        
-        pending_result = await db.execute(
-            select(func.count()).select_from(PermissionRequest)
-            .where(
-                and_(
-                    PermissionRequest.tenant_id == current_user.tenant_id,
-                    PermissionRequest.status == PermissionRequestStatus.PENDING
-                )
-            )
-        )
-        pending = pending_result.scalar() or 0
-        
-        approved_result = await db.execute(
-            select(func.count()).select_from(PermissionRequest)
-            .where(
-                and_(
-                    PermissionRequest.tenant_id == current_user.tenant_id,
-                    PermissionRequest.status == PermissionRequestStatus.APPROVED
-                )
-            )
-        )
-        approved = approved_result.scalar() or 0
-        
-        rejected_result = await db.execute(
-            select(func.count()).select_from(PermissionRequest)
-            .where(
-                and_(
-                    PermissionRequest.tenant_id == current_user.tenant_id,
-                    PermissionRequest.status == PermissionRequestStatus.REJECTED
-                )
+        # Все счетчики по статусам для данного тенанта одним запросом
+        result = await db.execute(
+            select(
+                func.count().label('total'),
+                func.count().filter(PermissionRequest.status == PermissionRequestStatus.PENDING).label('pending'),
+                func.count().filter(PermissionRequest.status == PermissionRequestStatus.APPROVED).label('approved'),
+                func.count().filter(PermissionRequest.status == PermissionRequestStatus.REJECTED).label('rejected')
             )
+            .select_from(PermissionRequest)
+            .where(PermissionRequest.tenant_id == current_user.tenant_id)
         )
-        rejected = rejected_result.scalar() or 0
+        row = result.one()
+        total, pending, approved, rejected = row.total, row.pending, row.approved, row.rejected
         
         return {
             "total": total,
@@ -254,7 +229,7 @@ async def get_permission_requests_stats(
         }
         
     except Exception as e:
-        print(f"Error in get_permission_requests_stats: {e}")
+        logger.error("Error in get_permission_requests_stats: %s", e)
         return {
             "total": 0,
             "pending": 0,
@@ -272,6 +247,7 @@ async def bulk_update_master_permissions(
     try:
         updates = updates_data.get("updates", [])
         updated_count = 0
+        updated_user_ids = []
         
         for update in updates:
             master_id = update.get("masterId")
@@ -299,8 +275,10 @@ async def bulk_update_master_permissions(
                 
                 master.updated_at = datetime.utcnow()
                 updated_count += 1
+                updated_user_ids.append(master.user_id)
         
         await db.commit()
+        await bump_principals(updated_user_ids)
         
         return {
             "message": f"Updated permissions for {updated_count} masters",
@@ -308,7 +286,7 @@ async def bulk_update_master_permissions(
         }
         
     except Exception as e:
-        print(f"Error in bulk_update_master_permissions: {e}")
+        logger.error("Error in bulk_update_master_permissions: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update master permissions"
@@ -350,97 +328,46 @@ async def update_my_profile(
 @router.get("/my-stats", response_model=MasterStatsResponse)
 async def get_my_stats(
     current_user: User = Depends(get_current_master),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получить статистику мастера"""
     try:
-        print(f"🔍 Getting stats for user: {current_user.email} (ID: {current_user.id})")
+        logger.debug("Getting stats for user: %s (ID: %s)", current_user.email, current_user.id)
         
-        # Находим профиль мастера
+        # Профиль мастера и его счетчики за один запрос
         result = await db.execute(
-            select(Master).where(Master.user_id == current_user.id)
+            select(
+                Master.id,
+                Master.display_name,
+                Master.can_view_analytics,
+                *master_summary_columns()
+            )
+            .outerjoin(BookingDailyStats, BookingDailyStats.master_id == Master.id)
+            .where(Master.user_id == current_user.id)
+            .group_by(Master.id)
         )
-        master = result.scalar_one_or_none()
+        master = result.first()
         
         if not master:
-            print(f"⚠️ No master profile found for user {current_user.email}")
+            logger.warning("No master profile found for user %s", current_user.email)
             return MasterStatsResponse()
         
-        print(f"✅ Found master profile: {master.display_name}")
+        logger.debug("Found master profile: %s", master.display_name)
         
         # Проверяем права доступа (более мягко)
         if not master.can_view_analytics:
-            print(f"⚠️ Master {master.display_name} has no analytics permission, returning empty stats")
+            logger.warning("Master %s has no analytics permission, returning empty stats", master.display_name)
             return MasterStatsResponse()
         
         try:
-            # Считаем статистику
-            now = datetime.utcnow()
-            week_start = now - timedelta(days=7)
-            month_start = now - timedelta(days=30)
-            
-            # Записи за неделю
-            week_bookings_result = await db.execute(
-                select(func.count()).select_from(Booking)
-                .where(
-                    and_(
-                        Booking.master_id == master.id,
-                        Booking.created_at >= week_start
-                    )
-                )
-            )
-            week_bookings = week_bookings_result.scalar() or 0
-            
-            # Всего клиентов (уникальные client_id)
-            total_clients_result = await db.execute(
-                select(func.count(func.distinct(Booking.client_id)))
-                .where(Booking.master_id == master.id)
-            )
-            total_clients = total_clients_result.scalar() or 0
-            
-            # Доход за месяц
-            month_revenue_result = await db.execute(
-                select(func.coalesce(func.sum(Booking.price), 0.0))
-                .where(
-                    and_(
-                        Booking.master_id == master.id,
-                        Booking.created_at >= month_start,
-                        Booking.status == BookingStatus.COMPLETED
-                    )
-                )
-            )
-            month_revenue = float(month_revenue_result.scalar() or 0.0)
-            
-            # Всего записей
-            total_bookings_result = await db.execute(
-                select(func.count()).select_from(Booking)
-                .where(Booking.master_id == master.id)
-            )
-            total_bookings = total_bookings_result.scalar() or 0
-            
-            # Завершенные записи
-            completed_bookings_result = await db.execute(
-                select(func.count()).select_from(Booking)
-                .where(
-                    and_(
-                        Booking.master_id == master.id,
-                        Booking.status == BookingStatus.COMPLETED
-                    )
-                )
-            )
-            completed_bookings = completed_bookings_result.scalar() or 0
+            stats = master_summary_from_row(master)
             
-            # Отмененные записи
-            cancelled_bookings_result = await db.execute(
-                select(func.count()).select_from(Booking)
-                .where(
-                    and_(
-                        Booking.master_id == master.id,
-                        Booking.status == BookingStatus.CANCELLED
-                    )
-                )
-            )
-            cancelled_bookings = cancelled_bookings_result.scalar() or 0
+            week_bookings = stats["week_bookings"]
+            total_clients = stats["total_clients"]
+            month_revenue = stats["month_revenue"]
+            total_bookings = stats["total_bookings"]
+            completed_bookings = stats["completed_bookings"]
+            cancelled_bookings = stats["cancelled_bookings"]
             
             # Процент отмен
             cancellation_rate = 0.0
@@ -458,36 +385,31 @@ async def get_my_stats(
             )
             
         except Exception as stats_error:
-            print(f"❌ Error calculating stats: {stats_error}")
+            logger.error("Error calculating stats: %s", stats_error)
             return MasterStatsResponse()
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"❌ Error in get_my_stats: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error in get_my_stats")
         return MasterStatsResponse()
 
 @router.get("/my-bookings/today", response_model=TodayBookingsResponse)
 async def get_my_bookings_today(
-    current_user: User = Depends(get_current_master),
+    principal: Principal = Depends(get_current_master_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить записи мастера на сегодня"""
     try:
-        # Находим профиль мастера
-        result = await db.execute(
-            select(Master).where(Master.user_id == current_user.id)
-        )
-        master = result.scalar_one_or_none()
+        # Профиль и права мастера - из кэша аутентификации
+        master = principal.master
         
         if not master:
             return TodayBookingsResponse(bookings=[], total_count=0)
         
         # Проверяем права доступа к записям
         if not master.can_manage_bookings:
-            print(f"⚠️ Master {master.display_name} has no booking management permission")
+            logger.warning("Master %s has no booking management permission", master.display_name)
             return TodayBookingsResponse(bookings=[], total_count=0)
         
         # Определяем начало и конец сегодняшнего дня
@@ -528,10 +450,8 @@ async def get_my_bookings_today(
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"❌ Error in get_my_bookings_today: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error in get_my_bookings_today")
         return TodayBookingsResponse(bookings=[], total_count=0)
 
 @router.post("/upload-photo")
@@ -577,7 +497,7 @@ async def upload_photo(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error uploading photo: {e}")
+        logger.error("Error uploading photo: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to upload photo"
@@ -586,7 +506,7 @@ async def upload_photo(
 @router.get("/my-analytics")
 async def get_my_analytics(
     current_user: User = Depends(get_current_master),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Получить свою аналитику"""
     try:
@@ -616,26 +536,16 @@ async def get_my_analytics(
         month_ago = now - timedelta(days=30)
         
         # Доходы за последние 30 дней
-        revenue_result = await db.execute(
-            select(
-                func.sum(Booking.price).label('revenue'),
-                func.date(Booking.date).label('booking_date')
-            )
-            .where(and_(
-                Booking.master_id == master.id,
-                Booking.status == BookingStatus.COMPLETED,
-                Booking.date >= month_ago
-            ))
-            .group_by(func.date(Booking.date))
-            .order_by(func.date(Booking.date))
+        revenue_by_day = await BookingStatsService(db).get_revenue_by_day(
+            month_ago.date(), now.date(), master_id=master.id
         )
         
         revenue_trend = [
             {
-                "date": row.booking_date.isoformat(),
-                "revenue": float(row.revenue or 0)
+                "date": row["day"].isoformat(),
+                "revenue": row["revenue"]
             }
-            for row in revenue_result.fetchall()
+            for row in revenue_by_day
         ]
         
         return {
@@ -648,7 +558,7 @@ async def get_my_analytics(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error getting analytics: {e}")
+        logger.error("Error getting analytics: %s", e)
         return {
             "revenue_trend": [],
             "popular_services": [],
@@ -659,16 +569,13 @@ async def get_my_analytics(
 @router.post("/request-permission")
 async def request_permission(
     permission_data: dict,
-    current_user: User = Depends(get_current_master),
+    principal: Principal = Depends(get_current_master_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Запросить разрешение у менеджера"""
     try:
-        # Находим мастера
-        result = await db.execute(
-            select(Master).where(Master.user_id == current_user.id)
-        )
-        master = result.scalar_one_or_none()
+        # Профиль и права мастера - из кэша аутентификации
+        master = principal.master
         
         if not master:
             raise HTTPException(status_code=404, detail="Master profile not found")
@@ -709,7 +616,7 @@ async def request_permission(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in request_permission: {e}")
+        logger.error("Error in request_permission: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create permission request"
@@ -717,16 +624,13 @@ async def request_permission(
 
 @router.get("/my-permission-requests")
 async def get_my_permission_requests(
-    current_user: User = Depends(get_current_master),
+    principal: Principal = Depends(get_current_master_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить свои запросы разрешений"""
     try:
-        # Находим мастера
-        result = await db.execute(
-            select(Master).where(Master.user_id == current_user.id)
-        )
-        master = result.scalar_one_or_none()
+        # Профиль и права мастера - из кэша аутентификации
+        master = principal.master
         
         if not master:
             return {"requests": []}
@@ -750,21 +654,19 @@ async def get_my_permission_requests(
         }
         
     except Exception as e:
-        print(f"Error in get_my_permission_requests: {e}")
+        logger.error("Error in get_my_permission_requests: %s", e)
         return {"requests": []}
 
 # ---------------------- Schedule management ----------------------
 @router.get("/my-schedule")
 async def get_my_schedule(
-    current_user: User = Depends(get_current_master),
+    principal: Principal = Depends(get_current_master_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Получить свое расписание"""
     try:
-        result = await db.execute(
-            select(Master).where(Master.user_id == current_user.id)
-        )
-        master = result.scalar_one_or_none()
+        # Профиль и права мастера - из кэша аутентификации
+        master = principal.master
         
         if not master:
             raise HTTPException(status_code=404, detail="Master profile not found")
@@ -776,7 +678,7 @@ async def get_my_schedule(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in get_my_schedule: {e}")
+        logger.error("Error in get_my_schedule: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to get schedule"
@@ -785,15 +687,13 @@ async def get_my_schedule(
 @router.post("/block-time")
 async def block_my_time(
     block_data: dict,
-    current_user: User = Depends(get_current_master),
+    principal: Principal = Depends(get_current_master_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Заблокировать время"""
     try:
-        result = await db.execute(
-            select(Master).where(Master.user_id == current_user.id)
-        )
-        master = result.scalar_one_or_none()
+        # Профиль и права мастера - из кэша аутентификации
+        master = principal.master
         
         if not master:
             raise HTTPException(status_code=404, detail="Master profile not found")
@@ -811,7 +711,7 @@ async def block_my_time(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in block_my_time: {e}")
+        logger.error("Error in block_my_time: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to block time"
@@ -820,15 +720,13 @@ async def block_my_time(
 @router.put("/my-schedule")
 async def update_my_schedule(
     schedule_data: dict,
-    current_user: User = Depends(get_current_master),
+    principal: Principal = Depends(get_current_master_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Обновить расписание мастера"""
     try:
-        result = await db.execute(
-            select(Master).where(Master.user_id == current_user.id)
-        )
-        master = result.scalar_one_or_none()
+        # Профиль и права мастера - из кэша аутентификации
+        master = principal.master
         
         if not master:
             raise HTTPException(status_code=404, detail="Master profile not found")
@@ -862,13 +760,14 @@ async def update_my_schedule(
             db.add(schedule)
         
         await db.commit()
+        await availability_cache.invalidate_master(master.id)
         
         return {"message": "Schedule updated successfully"}
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error in update_my_schedule: {e}")
+        logger.error("Error in update_my_schedule: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update schedule"
@@ -880,21 +779,30 @@ async def update_my_schedule(
 @router.get("/", response_model=List[dict], include_in_schema=False)
 async def get_masters_list(
     request: Request,
+    response: Response,
+    page_query: dict = Depends(page_params),
     current_user: User = Depends(require_role([UserRole.OWNER, UserRole.ADMIN])),
     db: AsyncSession = Depends(get_db)
 ):
-    """Получить список всех мастеров для администрирования"""
+    """Получить список мастеров для администрирования (страницами, см. X-Next-Cursor)"""
     tenant_id = current_user.tenant_id
     
     # Получаем мастеров с информацией о пользователях
-    result = await db.execute(
+    page = await paginate(
+        db,
         select(Master, User).join(User, Master.user_id == User.id)
-        .where(Master.tenant_id == tenant_id)
-        .order_by(Master.created_at.desc())
+        .where(Master.tenant_id == tenant_id),
+        Master.created_at,
+        Master.id,
+        key=lambda row: (row.Master.created_at, row.Master.id),
+        descending=True,
+        scalars=False,
+        **page_query
     )
+    set_page_headers(response, request, page)
     
     masters_data = []
-    for master, user in result.all():
+    for master, user in page.items:
         master_dict = {
             "id": str(master.id),
             "tenant_id": str(master.tenant_id),
@@ -1013,33 +921,30 @@ async def reject_permission_request(
 @router.get("/public-test")
 async def get_public_masters_test(request: Request):
     """Test endpoint for public masters"""
-    subdomain = request.headers.get("X-Tenant-Subdomain")
+    subdomain = request_subdomain(request)
     return {"subdomain": subdomain, "message": "Test endpoint working"}
 
 @router.get("/public/{master_id}", response_model=MasterResponse)
 async def get_public_master(
     master_id: UUID,
     request: Request,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get single master for public barbershop page (no auth required)"""
     try:
-        # Get tenant_id from X-Tenant-Subdomain header
-        subdomain = request.headers.get("X-Tenant-Subdomain")
-        print(f"🔍 [PUBLIC MASTER] Subdomain: {subdomain}, Master ID: {master_id}")
+        # Get tenant_id from X-Tenant-Subdomain header or host
+        subdomain = request_subdomain(request)
+        logger.debug("[PUBLIC MASTER] Subdomain: %s, Master ID: %s", subdomain, master_id)
         
         if not subdomain:
-            print("⚠️ [PUBLIC MASTER] No subdomain provided")
+            logger.debug("[PUBLIC MASTER] No subdomain provided")
             raise HTTPException(status_code=400, detail="Subdomain required")
         
         # Get tenant by subdomain
-        tenant_result = await db.execute(
-            select(Tenant).where(Tenant.subdomain == subdomain)
-        )
-        tenant = tenant_result.scalar_one_or_none()
+        tenant = await get_tenant_by_subdomain(subdomain, db)
         
         if not tenant:
-            print("⚠️ [PUBLIC MASTER] Tenant not found for subdomain:", subdomain)
+            logger.debug("[PUBLIC MASTER] Tenant not found for subdomain: %s", subdomain)
             raise HTTPException(status_code=404, detail="Tenant not found")
         
         # Get master by ID and tenant
@@ -1056,44 +961,41 @@ async def get_public_master(
         master = master_result.scalar_one_or_none()
         
         if not master:
-            print("⚠️ [PUBLIC MASTER] Master not found:", master_id)
+            logger.debug("[PUBLIC MASTER] Master not found: %s", master_id)
             raise HTTPException(status_code=404, detail="Master not found")
         
-        print(f"✅ [PUBLIC MASTER] Found master: {master.display_name}")
+        logger.debug("[PUBLIC MASTER] Found master: %s", master.display_name)
         return master
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ [PUBLIC MASTER] Error: {e}")
+        logger.error("[PUBLIC MASTER] Error: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/public", response_model=List[MasterResponse])
 async def get_public_masters(
     request: Request,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get masters for public barbershop page (no auth required)"""
     try:
-        # Get tenant_id from X-Tenant-Subdomain header
-        subdomain = request.headers.get("X-Tenant-Subdomain")
-        print(f"🔍 [PUBLIC MASTERS] Subdomain: {subdomain}")
+        # Get tenant_id from X-Tenant-Subdomain header or host
+        subdomain = request_subdomain(request)
+        logger.debug("[PUBLIC MASTERS] Subdomain: %s", subdomain)
         
         if not subdomain:
-            print("⚠️ [PUBLIC MASTERS] No subdomain provided")
+            logger.debug("[PUBLIC MASTERS] No subdomain provided")
             return []
         
         # Get tenant by subdomain
-        tenant_result = await db.execute(
-            select(Tenant).where(Tenant.subdomain == subdomain)
-        )
-        tenant = tenant_result.scalar_one_or_none()
+        tenant = await get_tenant_by_subdomain(subdomain, db)
         
         if not tenant:
-            print(f"⚠️ [PUBLIC MASTERS] No tenant found for subdomain: {subdomain}")
+            logger.debug("[PUBLIC MASTERS] No tenant found for subdomain: %s", subdomain)
             return []
         
-        print(f"✅ [PUBLIC MASTERS] Found tenant: {tenant.name} (ID: {tenant.id})")
+        logger.debug("[PUBLIC MASTERS] Found tenant: %s (ID: %s)", tenant.name, tenant.id)
         
         # Get visible masters for this tenant
         masters_result = await db.execute(
@@ -1106,7 +1008,7 @@ async def get_public_masters(
         )
         masters = masters_result.scalars().all()
         
-        print(f"🔍 [PUBLIC MASTERS] Found {len(masters)} masters")
+        logger.debug("[PUBLIC MASTERS] Found %s masters", len(masters))
         
         result = []
         for master in masters:
@@ -1136,16 +1038,14 @@ async def get_public_masters(
                 )
                 result.append(master_response)
             except Exception as e:
-                print(f"❌ [PUBLIC MASTERS] Error creating MasterResponse for master {master.id}: {e}")
+                logger.error("[PUBLIC MASTERS] Error creating MasterResponse for master %s: %s", master.id, e)
                 continue
         
-        print(f"✅ [PUBLIC MASTERS] Returning {len(result)} masters")
+        logger.debug("[PUBLIC MASTERS] Returning %s masters", len(result))
         return result
         
     except Exception as e:
-        print(f"❌ [PUBLIC MASTERS] Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[PUBLIC MASTERS] Error")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
@@ -1257,7 +1157,7 @@ async def upload_master_photo(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error uploading photo: {e}")
+        logger.error("Error uploading photo: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to upload photo"
@@ -1317,13 +1217,14 @@ async def update_master(
         master.updated_at = datetime.utcnow()
         await db.commit()
         await db.refresh(master)
+        await bump_principal(master.user_id)
         
         return master
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error updating master: {e}")
+        logger.error("Error updating master: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update master"
@@ -1354,15 +1255,17 @@ async def delete_master(
             )
         
         # Удаляем мастера
+        user_id = master.user_id
         await db.delete(master)
         await db.commit()
+        await bump_principal(user_id)
         
         return {"message": "Master deleted successfully"}
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error deleting master: {e}")
+        logger.error("Error deleting master: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete master"
@@ -1401,13 +1304,14 @@ async def update_master_permissions(
         master.updated_at = datetime.utcnow()
         await db.commit()
         await db.refresh(master)
+        await bump_principal(master.user_id)
         
         return master
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error updating master permissions: {e}")
+        logger.error("Error updating master permissions: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update master permissions"
@@ -1,16 +1,19 @@
+import logging
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from uuid import UUID
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.user import User, UserRole
-from app.models.tenant import Tenant
 from app.schemas.service import ServiceCreate, ServiceUpdate, ServiceResponse
 from app.services.service import ServiceService
 from app.utils.security import get_current_user, require_role
+from app.utils.tenant_resolver import get_request_tenant_id, get_tenant_by_subdomain, request_subdomain
 from sqlalchemy import select
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # ---------------------- Public API endpoints for barbershop pages ----------------------
@@ -20,19 +23,16 @@ async def get_public_services(
     request: Request,
     category_id: Optional[UUID] = Query(None),
     is_active: Optional[bool] = Query(True),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get services for public barbershop page (no auth required)"""
-    # Get tenant_id from X-Tenant-Subdomain header
-    subdomain = request.headers.get("X-Tenant-Subdomain")
+    # Get tenant_id from X-Tenant-Subdomain header or host
+    subdomain = request_subdomain(request)
     if not subdomain:
         return []
     
     # Get tenant by subdomain
-    tenant_result = await db.execute(
-        select(Tenant).where(Tenant.subdomain == subdomain)
-    )
-    tenant = tenant_result.scalar_one_or_none()
+    tenant = await get_tenant_by_subdomain(subdomain, db)
     
     if not tenant:
         return []
@@ -46,16 +46,6 @@ async def get_public_services(
     )
     return services
 
-async def get_tenant_id_from_header(request: Request) -> Optional[UUID]:
-    """Получает tenant_id из заголовка X-Tenant-ID"""
-    tenant_id_str = request.headers.get("X-Tenant-ID")
-    if tenant_id_str:
-        try:
-            return UUID(tenant_id_str)
-        except ValueError:
-            return None
-    return None
-
 # --- Optional current user for public endpoints ---
 async def get_current_user_optional(
     request: Request,
@@ -110,8 +100,8 @@ async def create_service(
                 detail="Access denied"
             )
         
-        print(f"🔧 Creating service for tenant: {tenant_id}")
-        print(f"🔧 Service data: {service_data.dict()}")
+        logger.debug("Creating service for tenant: %s", tenant_id)
+        logger.debug("Service data: %s", service_data.dict())
         
         service = ServiceService(db)
         created_service = await service.create_service(tenant_id, service_data)
@@ -133,10 +123,8 @@ async def create_service(
         
     except HTTPException:
         raise
-    except Exception as e:
-        print(f"❌ Error creating service: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error creating service")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create service"
@@ -166,7 +154,7 @@ async def get_services(
         tenant_id = current_user.tenant_id
     else:
         # Публичный доступ - берем из заголовка
-        tenant_id = await get_tenant_id_from_header(request)
+        tenant_id = await get_request_tenant_id(request)
     
     if not tenant_id:
         # Если нет tenant_id, возвращаем пустой список
@@ -230,7 +218,7 @@ async def create_category(
 async def get_categories(
     request: Request,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get categories - поддерживает публичный доступ"""
     service = ServiceService(db)
@@ -239,7 +227,7 @@ async def get_categories(
     if current_user:
         tenant_id = current_user.tenant_id
     else:
-        tenant_id = await get_tenant_id_from_header(request)
+        tenant_id = await get_request_tenant_id(request)
     
     if not tenant_id:
         return []
@@ -1,5 +1,7 @@
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
 from app.config import settings
+from app.worker import worker_runtime
 
 celery_app = Celery(
     "jazyl",
@@ -15,13 +17,42 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     beat_schedule={
+        "dispatch-notification-outbox": {
+            "task": "app.tasks.dispatch_notification_outbox",
+            "schedule": 10.0,  # Every 10 seconds
+        },
+        "purge-notification-outbox": {
+            "task": "app.tasks.purge_notification_outbox",
+            "schedule": 86400.0,  # Daily
+        },
         "send-reminders": {
             "task": "app.tasks.check_and_send_reminders",
-            "schedule": 300.0,  # Every 5 minutes
+            "schedule": 30.0,  # Every 30 seconds (only due reminders are read)
+        },
+        "booking-lifecycle": {
+            "task": "app.tasks.process_booking_lifecycle",
+            "schedule": 300.0,  # Every 5 minutes (expiry, no-shows, auto-complete)
+        },
+        "reconcile-booking-daily-stats": {
+            "task": "app.tasks.reconcile_booking_daily_stats",
+            "schedule": 3600.0,  # Hourly
         },
-        "cleanup-old-bookings": {
-            "task": "app.tasks.cleanup_old_bookings",
+        "reconcile-client-stats": {
+            "task": "app.tasks.reconcile_client_stats",
             "schedule": 86400.0,  # Daily
         },
     }
-)
\ No newline at end of file
+)
+
+
+# Цикл событий и пул БД создаются в каждом дочернем процессе prefork после fork.
+# Для пулов solo/threads цикл запускается при первой задаче (worker_runtime.run).
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    worker_runtime.start()
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    worker_runtime.stop()
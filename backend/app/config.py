@@ -21,10 +21,29 @@ class Settings(BaseSettings):
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
+    # Read replicas: comma-separated postgresql+asyncpg:// URLs, used by get_read_db
+    DB_REPLICA_URLS: str = os.getenv("DB_REPLICA_URLS", "")
+    DB_REPLICA_POOL_SIZE: int = int(os.getenv("DB_REPLICA_POOL_SIZE", "10"))  # per replica
+    DB_REPLICA_MAX_OVERFLOW: int = int(os.getenv("DB_REPLICA_MAX_OVERFLOW", "20"))
+    DB_REPLICA_MAX_LAG: float = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))  # seconds, otherwise primary
+    DB_REPLICA_CHECK_INTERVAL: float = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))  # seconds
+    AVAILABILITY_REPLICA_CACHE_TTL: int = int(os.getenv("AVAILABILITY_REPLICA_CACHE_TTL", "30"))  # seconds
+
+    @property
+    def DATABASE_REPLICA_URLS(self) -> List[str]:
+        return [url.strip() for url in self.DB_REPLICA_URLS.split(",") if url.strip()]
     
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://redis:6379/0")
     REDIS_PASSWORD: str | None = os.getenv("REDIS_PASSWORD")
+    AVAILABILITY_CACHE_TTL: int = int(os.getenv("AVAILABILITY_CACHE_TTL", "600"))  # seconds
+    TENANT_CACHE_TTL: int = int(os.getenv("TENANT_CACHE_TTL", "600"))  # seconds, Redis
+    TENANT_LOCAL_CACHE_TTL: int = int(os.getenv("TENANT_LOCAL_CACHE_TTL", "60"))  # seconds, in-process
+    TENANT_LOCAL_CACHE_SIZE: int = int(os.getenv("TENANT_LOCAL_CACHE_SIZE", "1024"))
+    TENANT_NEGATIVE_CACHE_TTL: int = int(os.getenv("TENANT_NEGATIVE_CACHE_TTL", "30"))  # seconds, unknown subdomains/ids
+    PRINCIPAL_CACHE_TTL: int = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))  # seconds
+    PRINCIPAL_LOCAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_LOCAL_CACHE_SIZE", "4096"))
     SSL_CERT_PATH: str | None = os.getenv("SSL_CERT_PATH")
     SSL_KEY_PATH: str | None = os.getenv("SSL_KEY_PATH")
 
@@ -42,6 +61,27 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD")
     SMTP_FROM_EMAIL: str = os.getenv("SMTP_FROM_EMAIL", "noreply@jazyl.tech")
     SMTP_FROM_NAME: str = os.getenv("SMTP_FROM_NAME", "Jazyl")
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", "4"))  # concurrent sends / open connections
+    SMTP_POOL_MAX_IDLE: int = int(os.getenv("SMTP_POOL_MAX_IDLE", "60"))  # seconds
+    SMTP_POOL_MAX_MESSAGES: int = int(os.getenv("SMTP_POOL_MAX_MESSAGES", "100"))  # per connection
+    SMTP_TIMEOUT: int = int(os.getenv("SMTP_TIMEOUT", "30"))  # seconds
+    SMTP_SEND_RETRIES: int = int(os.getenv("SMTP_SEND_RETRIES", "1"))
+
+    # Notification outbox
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_RETRY_DELAY: int = int(os.getenv("OUTBOX_RETRY_DELAY", "30"))  # seconds, doubles per attempt
+    OUTBOX_RETRY_MAX_DELAY: int = int(os.getenv("OUTBOX_RETRY_MAX_DELAY", "3600"))  # seconds
+    OUTBOX_LEASE: int = int(os.getenv("OUTBOX_LEASE", "300"))  # seconds a claimed batch stays locked
+    OUTBOX_DISPATCH_BUDGET: int = int(os.getenv("OUTBOX_DISPATCH_BUDGET", "50"))  # seconds per dispatcher run
+    OUTBOX_RETENTION_DAYS: int = int(os.getenv("OUTBOX_RETENTION_DAYS", "14"))
+    REMINDER_BATCH_SIZE: int = int(os.getenv("REMINDER_BATCH_SIZE", "200"))
+
+    # Booking lifecycle job
+    BOOKING_PENDING_TTL_HOURS: int = int(os.getenv("BOOKING_PENDING_TTL_HOURS", "24"))
+    BOOKING_AUTO_COMPLETE_DELAY_MINUTES: int = int(os.getenv("BOOKING_AUTO_COMPLETE_DELAY_MINUTES", "60"))
+    LIFECYCLE_BATCH_SIZE: int = int(os.getenv("LIFECYCLE_BATCH_SIZE", "1000"))
+    LIFECYCLE_RUN_BUDGET: int = int(os.getenv("LIFECYCLE_RUN_BUDGET", "240"))  # seconds per run
     
     # Domain
     DOMAIN: str = os.getenv("DOMAIN", "jazyl.tech")
@@ -64,6 +104,17 @@ class Settings(BaseSettings):
     # Celery
     CELERY_BROKER_URL: str = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
     CELERY_RESULT_BACKEND: str = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
+    WORKER_DB_POOL_SIZE: int = int(os.getenv("WORKER_DB_POOL_SIZE", "5"))  # per worker process
+    WORKER_DB_MAX_OVERFLOW: int = int(os.getenv("WORKER_DB_MAX_OVERFLOW", "5"))
+    
+    # Logging: записи уходят в очередь, JSON и запись в файл - в фоновом потоке
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "")  # empty - DEBUG when DEBUG, otherwise INFO
+    LOG_JSON: bool = os.getenv("LOG_JSON", "True").lower() == "true"
+    LOG_FILE: str = os.getenv("LOG_FILE", "/app/logs/jazyl.log")  # empty - stdout only
+    LOG_QUEUE_SIZE: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))  # records, overflow is dropped
+    # Access log sampling: default rate and "path-prefix=rate" overrides, comma-separated
+    LOG_ACCESS_SAMPLE_RATE: float = float(os.getenv("LOG_ACCESS_SAMPLE_RATE", "1"))
+    LOG_ACCESS_SAMPLING: str = os.getenv("LOG_ACCESS_SAMPLING", "/health=0.01,/api/bookings/availability=0.1")
     
     # File Upload
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
@@ -1,8 +1,11 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncEngine, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import MetaData
+from sqlalchemy import MetaData, text
+from typing import Dict, List, Optional
 from app.config import settings
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +28,106 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# Read replicas (may be empty - then reads go to the primary)
+replica_engines: List[AsyncEngine] = [
+    create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        pool_size=settings.DB_REPLICA_POOL_SIZE,
+        max_overflow=settings.DB_REPLICA_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+    )
+    for url in settings.DATABASE_REPLICA_URLS
+]
+
+# Sessions for read-only requests, engine is chosen per request
+ReadSessionLocal = async_sessionmaker(
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+)
+
+# Отставание реплики в секундах. Если реплика применила все полученные WAL,
+# она не отстает, даже когда на основной базе давно не было записей.
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+REPLICA_CHECK_TIMEOUT = 1.0  # seconds
+
+
+class ReplicaRouter:
+    """
+    Выбор базы для чтения: реплики по кругу, пропуская недоступные и
+    отстающие больше max_lag. Отставание проверяется не чаще раза в
+    check_interval на реплику; если подходящих реплик нет - основная база.
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: List[AsyncEngine], max_lag: float, check_interval: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag: Dict[int, Optional[float]] = {}
+        self._checked_at: Dict[int, float] = {}
+        self._locks = [asyncio.Lock() for _ in replicas]
+        self._next = 0
+
+    async def _measure(self, replica: AsyncEngine) -> Optional[float]:
+        async with replica.connect() as conn:
+            lag = (await conn.execute(REPLICA_LAG_QUERY)).scalar()
+        return float(lag) if lag is not None else None
+
+    async def _replica_lag(self, index: int) -> Optional[float]:
+        """Закэшированное отставание реплики; None - реплика недоступна"""
+        if time.monotonic() - self._checked_at.get(index, float("-inf")) < self.check_interval:
+            return self._lag.get(index)
+
+        async with self._locks[index]:
+            # Пока ждали блокировку, реплику мог проверить другой запрос
+            if time.monotonic() - self._checked_at.get(index, float("-inf")) < self.check_interval:
+                return self._lag.get(index)
+            try:
+                lag = await asyncio.wait_for(self._measure(self.replicas[index]), REPLICA_CHECK_TIMEOUT)
+            except Exception as e:
+                logger.warning("Replica %s is unavailable: %s", index, e)
+                lag = None
+            if lag is not None and lag > self.max_lag:
+                logger.warning("Replica %s lags %.1fs, reading from primary", index, lag)
+            self._lag[index] = lag
+            self._checked_at[index] = time.monotonic()
+            return lag
+
+    async def pick(self) -> AsyncEngine:
+        count = len(self.replicas)
+        start, self._next = self._next, (self._next + 1) % max(count, 1)
+        for offset in range(count):
+            index = (start + offset) % count
+            lag = await self._replica_lag(index)
+            if lag is not None and lag <= self.max_lag:
+                return self.replicas[index]
+        return self.primary
+
+
+replica_router = ReplicaRouter(
+    engine,
+    replica_engines,
+    max_lag=settings.DB_REPLICA_MAX_LAG,
+    check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+)
+
+
+def is_replica_session(session: AsyncSession) -> bool:
+    """Сессия читает с реплики (данные могут отставать на DB_REPLICA_MAX_LAG)"""
+    return session.info.get("replica", False)
+
+
 # Create base class for models
 metadata = MetaData(
     naming_convention={
@@ -51,3 +154,14 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             raise
         finally:
             await session.close()
+
+
+# Dependency for read-only endpoints: no COMMIT, READ ONLY transaction, replica if healthy
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    bind = await replica_router.pick()
+    async with ReadSessionLocal(bind=bind, info={"read_only": True, "replica": bind is not engine}) as session:
+        try:
+            await session.execute(text("SET TRANSACTION READ ONLY"))
+            yield session
+        finally:
+            await session.rollback()
@@ -10,11 +10,15 @@ from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
 from app.config import settings
-from app.database import engine, Base
+from app.database import engine, replica_engines, Base
 from app.api import auth, tenants, bookings, masters, services, clients, dashboard
-from app.utils.logger import setup_logging
+from app.utils.logger import setup_logging, shutdown_logging
 from app.utils.middleware import TenantMiddleware, LoggingMiddleware
+from app.utils.tenant_resolver import listen_for_invalidations
+from app.utils.smtp_pool import close_smtp_pool
+from app.utils.email_templates import email_templates
 from app.utils.exceptions import CustomException
+import asyncio
 import os
 
 # Setup logging
@@ -34,11 +38,22 @@ async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     
+    # Шаблоны писем компилируются один раз на процесс
+    logger.info("Precompiled %s email templates", email_templates.precompile())
+    
+    # Сброс локального кэша тенантов по событиям из других процессов
+    tenant_listener = asyncio.create_task(listen_for_invalidations())
+    
     yield
     
     # Shutdown
     logger.info("Shutting down Jazyl Backend...")
+    tenant_listener.cancel()
+    await close_smtp_pool()
     await engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+    shutdown_logging()
 
 # Create FastAPI app
 app = FastAPI(
@@ -6,8 +6,12 @@ from app.models.client import Client
 from app.models.permission_request import PermissionRequest, PermissionRequestStatus, PermissionRequestType
 from app.models.master import Master, MasterSchedule, MasterService
 from app.models.booking import Booking, BookingStatus
+from app.models.booking_stats import BookingDailyStats
+from app.models.client_stats import MasterClientStats
 from app.models.block_time import BlockTime
 from app.models.notification import Notification, NotificationTemplate
+from app.models.notification_outbox import NotificationOutbox, OutboxStatus
+from app.models.reminder import ReminderSchedule
 
 __all__ = [
     "Tenant",
@@ -24,7 +28,12 @@ __all__ = [
     "MasterService",
     "Booking",
     "BookingStatus",
+    "BookingDailyStats",
+    "MasterClientStats",
     "BlockTime",
     "Notification",
     "NotificationTemplate",
+    "NotificationOutbox",
+    "OutboxStatus",
+    "ReminderSchedule",
 ]
\ No newline at end of file
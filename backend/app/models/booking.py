@@ -1,6 +1,6 @@
 # backend/app/models/booking.py
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Enum as SqlEnum, Boolean
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Enum as SqlEnum, Boolean, DDL, event, func, text
+from sqlalchemy.dialects.postgresql import UUID, ExcludeConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
@@ -17,6 +17,12 @@ class BookingStatus(str, enum.Enum):
     NO_SHOW = "no_show"
 
 
+# Статусы, которые занимают время мастера
+ACTIVE_BOOKING_STATUSES = (BookingStatus.PENDING, BookingStatus.CONFIRMED)
+
+BOOKING_OVERLAP_CONSTRAINT = "ex_bookings_master_time_overlap"
+
+
 class Booking(Base):
     __tablename__ = "bookings"
     
@@ -52,4 +58,26 @@ class Booking(Base):
     tenant = relationship("Tenant", back_populates="bookings")
     master = relationship("Master", back_populates="bookings")
     client = relationship("Client", back_populates="bookings")
-    service = relationship("Service", back_populates="bookings")
\ No newline at end of file
+    service = relationship("Service", back_populates="bookings")
+
+
+# Активные записи одного мастера не могут пересекаться по времени.
+# Конфликт ловит сам INSERT/UPDATE, без блокировок и гонки "проверил-записал".
+Booking.__table__.append_constraint(
+    ExcludeConstraint(
+        (Booking.master_id, "="),
+        (func.tsrange(Booking.date, Booking.end_time), "&&"),
+        name=BOOKING_OVERLAP_CONSTRAINT,
+        using="gist",
+        where=text(
+            "status IN (%s)" % ", ".join(f"'{status.name}'" for status in ACTIVE_BOOKING_STATUSES)
+        )
+    )
+)
+
+# btree_gist нужен для сравнения uuid в gist-индексе
+event.listen(
+    Booking.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist")
+)
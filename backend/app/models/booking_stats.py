@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, Float, Date, DateTime, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import UUID, BIT
+from datetime import datetime
+
+from app.database import Base
+
+# Размер битовой карты клиентов (linear counting): оценка уникальных
+# клиентов остается точной в пределах нескольких процентов до ~20 тыс.
+CLIENT_SKETCH_BITS = 4096
+
+
+class BookingDailyStats(Base):
+    """Агрегаты записей по (салон, мастер, услуга, день записи)"""
+    __tablename__ = "booking_daily_stats"
+
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), primary_key=True)
+    master_id = Column(UUID(as_uuid=True), ForeignKey("masters.id"), primary_key=True)
+    service_id = Column(UUID(as_uuid=True), ForeignKey("services.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    total_count = Column(Integer, nullable=False, default=0)
+    pending_count = Column(Integer, nullable=False, default=0)
+    confirmed_count = Column(Integer, nullable=False, default=0)
+    completed_count = Column(Integer, nullable=False, default=0)
+    cancelled_count = Column(Integer, nullable=False, default=0)
+    no_show_count = Column(Integer, nullable=False, default=0)
+
+    # Выручка по завершенным записям
+    revenue = Column(Float, nullable=False, default=0)
+
+    # Битовая карта клиентов дня: объединяется через bit_or для любого периода
+    client_sketch = Column(
+        BIT(CLIENT_SKETCH_BITS),
+        nullable=False,
+        server_default=text(f"B'0'::bit({CLIENT_SKETCH_BITS})")
+    )
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Отчеты салона и кабинет мастера за период
+        Index("ix_booking_daily_stats_tenant_id_day", "tenant_id", "day"),
+        Index("ix_booking_daily_stats_master_id_day", "master_id", "day"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Float, JSON, Text, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Float, JSON, Text, Boolean, Computed, Index, DDL, event, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -6,13 +6,16 @@ import uuid
 
 from app.database import Base
 
+# Один клиент на email в салоне (без учета регистра)
+CLIENT_EMAIL_INDEX = "uq_clients_tenant_id_lower_email"
+
 class Client(Base):
     __tablename__ = "clients"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), nullable=False, index=True)
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), nullable=False)
     
-    email = Column(String(255), nullable=False, index=True)
+    email = Column(String(255), nullable=False)
     phone = Column(String(20), nullable=False)
     first_name = Column(String(100), nullable=False)
     last_name = Column(String(100))
@@ -26,6 +29,16 @@ class Client(Base):
     total_spent = Column(Float, default=0.0)
     last_visit = Column(DateTime)
     
+    # Поиск: имя и email в нижнем регистре, телефон - только цифры
+    search_text = Column(
+        Text,
+        Computed("lower(first_name || coalesce(' ' || last_name, '') || ' ' || email)", persisted=True)
+    )
+    phone_digits = Column(
+        String(20),
+        Computed("regexp_replace(phone, '[^0-9]', '', 'g')", persisted=True)
+    )
+    
     is_vip = Column(Boolean, default=False)
     is_blacklisted = Column(Boolean, default=False)
     
@@ -34,4 +47,26 @@ class Client(Base):
     
     # Relationships
     tenant = relationship("Tenant", back_populates="clients")
-    bookings = relationship("Booking", back_populates="client")
\ No newline at end of file
+    bookings = relationship("Booking", back_populates="client")
+
+
+Index(CLIENT_EMAIL_INDEX, Client.tenant_id, func.lower(Client.email), unique=True)
+
+# Триграммные индексы поиска в пределах салона (tenant_id в GIN - через btree_gin)
+Index(
+    "ix_clients_search_text_trgm",
+    Client.tenant_id,
+    Client.search_text,
+    postgresql_using="gin",
+    postgresql_ops={"search_text": "gin_trgm_ops"}
+)
+Index(
+    "ix_clients_phone_digits_trgm",
+    Client.tenant_id,
+    Client.phone_digits,
+    postgresql_using="gin",
+    postgresql_ops={"phone_digits": "gin_trgm_ops"}
+)
+
+event.listen(Client.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+event.listen(Client.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS btree_gin"))
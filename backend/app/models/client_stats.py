@@ -0,0 +1,32 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+
+from app.database import Base
+
+
+class MasterClientStats(Base):
+    """Записи клиента у мастера: счетчики по статусам и последний визит"""
+    __tablename__ = "master_client_stats"
+
+    master_id = Column(UUID(as_uuid=True), ForeignKey("masters.id"), primary_key=True)
+    client_id = Column(UUID(as_uuid=True), ForeignKey("clients.id"), primary_key=True)
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), nullable=False)
+
+    total_bookings = Column(Integer, nullable=False, default=0)
+    completed_bookings = Column(Integer, nullable=False, default=0)
+    cancelled_bookings = Column(Integer, nullable=False, default=0)
+    no_show_bookings = Column(Integer, nullable=False, default=0)
+
+    # По завершенным записям
+    total_spent = Column(Float, nullable=False, default=0)
+    last_visit = Column(DateTime)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Клиенты мастера по числу записей
+        Index("ix_master_client_stats_master_id_total", "master_id", "total_bookings"),
+        # Пересчет по клиентам
+        Index("ix_master_client_stats_client_id", "client_id"),
+    )
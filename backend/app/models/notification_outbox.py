@@ -0,0 +1,52 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Enum as SqlEnum, Index, JSON, Text, text
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+import uuid
+import enum
+
+from app.database import Base
+
+
+class OutboxStatus(str, enum.Enum):
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+
+
+# Статусы, которые забирает диспетчер (SENDING - после истечения аренды)
+DISPATCHABLE_OUTBOX_STATUSES = (OutboxStatus.PENDING, OutboxStatus.SENDING)
+
+
+class NotificationOutbox(Base):
+    """
+    Письма к отправке. Строка пишется в той же транзакции, что и изменение,
+    которое ее вызвало; отправляет ее диспетчер (app/services/outbox.py).
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    tenant_id = Column(UUID(as_uuid=True), ForeignKey("tenants.id"))
+
+    kind = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False, default=dict)
+
+    status = Column(SqlEnum(OutboxStatus), nullable=False, default=OutboxStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Время следующей попытки; для SENDING - конец аренды диспетчером
+    available_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(Text)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+
+    __table_args__ = (
+        # Очередь диспетчера: только неотправленные строки
+        Index(
+            "ix_notification_outbox_due",
+            "available_at",
+            postgresql_where=text(
+                "status IN (%s)" % ", ".join(f"'{status.name}'" for status in DISPATCHABLE_OUTBOX_STATUSES)
+            )
+        ),
+    )
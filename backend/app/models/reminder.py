@@ -0,0 +1,26 @@
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, text
+from sqlalchemy.dialects.postgresql import UUID
+from datetime import datetime
+
+from app.database import Base
+
+
+class ReminderSchedule(Base):
+    """
+    Запланированные напоминания о записи: по строке на (запись, за сколько часов).
+    sent_at - метка идемпотентности: напоминание передано на отправку ровно один раз.
+    """
+    __tablename__ = "reminder_schedule"
+
+    booking_id = Column(UUID(as_uuid=True), ForeignKey("bookings.id", ondelete="CASCADE"), primary_key=True)
+    hours_before = Column(Integer, primary_key=True)
+
+    due_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Очередь напоминаний: только неотправленные, по времени
+        Index("ix_reminder_schedule_due_at", "due_at", postgresql_where=text("sent_at IS NULL")),
+    )
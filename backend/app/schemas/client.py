@@ -37,4 +37,16 @@ class ClientResponse(ClientBase):
     updated_at: datetime
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+class ClientSearchResult(BaseModel):
+    id: UUID
+    first_name: str
+    last_name: Optional[str]
+    email: str
+    phone: str
+    is_vip: bool
+    total_visits: int
+    last_visit: Optional[datetime]
+    
+    class Config:
+        from_attributes = True
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+"""
+Microbenchmark of the request middleware stack: requests/sec on a trivial
+/health endpoint with the former BaseHTTPMiddleware implementations of
+LoggingMiddleware/TenantMiddleware versus the pure ASGI ones.
+
+Requests are driven in-process straight through the ASGI interface (no
+sockets, no server), so the numbers reflect middleware overhead only.
+The default host is the API domain, as for real API calls: the former
+TenantMiddleware looked up its "api" subdomain (Redis, then the DB) on
+every request, the current one does not resolve the tenant at all.
+Run it where Redis and Postgres are reachable to see the former cost.
+
+Usage: python app/scripts/bench_middleware.py [--requests 20000] [--concurrency 50] [--host api.jazyl.tech]
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.utils.middleware import LoggingMiddleware, TenantMiddleware
+from app.utils.tenant_resolver import get_tenant_by_subdomain
+
+logger = logging.getLogger("bench")
+
+
+# Прежние реализации (до перехода на чистый ASGI) - для сравнения
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request_id = str(uuid.uuid4())
+        start_time = time.time()
+        logger.info(f"Request {request_id}: {request.method} {request.url.path}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        logger.info(f"Response {request_id}: {response.status_code} in {process_time:.3f}s")
+        return response
+
+
+class LegacyTenantMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        host = request.headers.get("host", "")
+        if ".jazyl.tech" in host:
+            subdomain = host.split(".jazyl.tech")[0]
+            if subdomain.startswith("admin."):
+                subdomain = subdomain[6:]
+                request.headers.__dict__["_list"].append((b"x-admin-access", b"true"))
+            if subdomain and subdomain not in ["www", "jazyl"]:
+                request.headers.__dict__["_list"].append((b"x-tenant-subdomain", subdomain.encode()))
+        try:
+            # Прежний разбор host не исключал api/www - поиск шел на каждый запрос
+            subdomain = request.headers.get("X-Tenant-Subdomain")
+            if not subdomain and ".jazyl.tech" in host:
+                subdomain = host.split(".jazyl.tech")[0].removeprefix("admin.") or None
+            request.state.tenant = await get_tenant_by_subdomain(subdomain) if subdomain else None
+        except Exception as e:
+            logger.warning(f"Tenant resolution failed: {e}")
+        return await call_next(request)
+
+
+def build_app(logging_middleware=None, tenant_middleware=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health_check():
+        return {"status": "healthy", "version": "1.0.0", "service": "jazyl-backend"}
+
+    # Тот же порядок, что в app.main
+    if logging_middleware:
+        app.add_middleware(logging_middleware)
+    if tenant_middleware:
+        app.add_middleware(tenant_middleware)
+    return app
+
+
+HOST = b"api.jazyl.tech"
+
+
+async def call(app) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/health",
+        "raw_path": b"/health",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", HOST), (b"accept", b"application/json")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    status_code = 0
+    body_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive():
+        # Как сервер: тело один раз, дальше ожидание разрыва соединения
+        nonlocal body_sent
+        if not body_sent:
+            body_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    disconnected.set()
+    return status_code
+
+
+async def measure(app, requests: int, concurrency: int) -> float:
+    # Прогрев: построение стека middleware и роутов при первом запросе
+    await asyncio.gather(*(call(app) for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    done = 0
+    while done < requests:
+        batch = min(concurrency, requests - done)
+        statuses = await asyncio.gather(*(call(app) for _ in range(batch)))
+        assert all(code == 200 for code in statuses), statuses
+        done += batch
+    return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int, concurrency: int) -> None:
+    variants = [
+        ("no middleware", build_app()),
+        ("BaseHTTPMiddleware (before)", build_app(LegacyLoggingMiddleware, LegacyTenantMiddleware)),
+        ("pure ASGI (after)", build_app(LoggingMiddleware, TenantMiddleware)),
+    ]
+    print(f"GET /health (Host: {HOST.decode()}) x {requests}, concurrency {concurrency}")
+    for name, app in variants:
+        rps = await measure(app, requests, concurrency)
+        print(f"  {name:<30} {rps:>10.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--host", default=HOST.decode())
+    parser.add_argument("--log", action="store_true", help="emit the INFO access log lines to stderr")
+    args = parser.parse_args()
+    HOST = args.host.encode()
+
+    # По умолчанию логи выключены - измеряется сама обвязка, а не вывод
+    logging.basicConfig(level=logging.INFO if args.log else logging.WARNING)
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+"""
+Index advisor: runs the queries of BookingService, DashboardService and
+the Celery tasks against a database, EXPLAINs every captured statement and
+flags sequential scans.
+
+By default the planner runs with enable_seqscan=off, so any Seq Scan that
+remains means there is no usable index for that query at all, regardless
+of how much data the database holds. Use --real-costs to see the plans the
+planner would actually pick.
+
+Everything runs inside one transaction that is rolled back at the end,
+including the optional synthetic data from --seed.
+
+Usage: python app/scripts/explain_queries.py [--seed 5000] [--real-costs]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.database import engine
+from app import tasks
+from app.models import (
+    Tenant, User, UserRole, Service, Client, Master, MasterSchedule, Booking, BookingStatus
+)
+from app.services.booking import BookingService
+from app.services.booking_lifecycle import BookingLifecycleService
+from app.services.client import ClientService
+from app.services.dashboard import DashboardService
+from app.services.outbox import OutboxService
+from app.services.reminders import ReminderService
+
+EXPLAINED_PREFIXES = ("SELECT", "WITH", "UPDATE", "DELETE")
+
+
+@dataclass
+class Context:
+    tenant_id: uuid.UUID
+    master_id: uuid.UUID
+    service_id: uuid.UUID
+    day: date
+
+
+@dataclass
+class CapturedQuery:
+    probe: str
+    statement: str
+    parameters: Any
+    seq_scans: List[str] = field(default_factory=list)
+    total_cost: float = 0.0
+    error: str = ""
+
+
+Probe = Callable[[AsyncSession, Context], Awaitable[Any]]
+
+PROBES: List[Tuple[str, Probe]] = [
+    ("BookingService.get_bookings", lambda db, ctx: BookingService(db).get_bookings(
+        ctx.tenant_id, date_from=ctx.day - timedelta(days=30), date_to=ctx.day
+    )),
+    ("BookingService.get_bookings[master]", lambda db, ctx: BookingService(db).get_bookings(
+        ctx.tenant_id, master_id=ctx.master_id, status=BookingStatus.CONFIRMED
+    )),
+    ("BookingService.check_availability", lambda db, ctx: BookingService(db).check_availability(
+        ctx.tenant_id, ctx.master_id, datetime.combine(ctx.day, datetime.min.time()) + timedelta(hours=10),
+        ctx.service_id
+    )),
+    ("BookingService.get_available_slots", lambda db, ctx: BookingService(db).get_available_slots(
+        ctx.tenant_id, ctx.master_id, ctx.day, ctx.service_id
+    )),
+    ("BookingService.get_available_slots_range", lambda db, ctx: BookingService(db).get_available_slots_range(
+        ctx.tenant_id, ctx.service_id, ctx.day, ctx.day + timedelta(days=13)
+    )),
+    ("DashboardService.get_stats", lambda db, ctx: DashboardService(db).get_stats(ctx.tenant_id)),
+    ("DashboardService.get_today_overview", lambda db, ctx: DashboardService(db).get_today_overview(ctx.tenant_id)),
+    ("DashboardService.get_revenue_report", lambda db, ctx: DashboardService(db).get_revenue_report(
+        ctx.tenant_id, period="month"
+    )),
+    ("DashboardService.get_masters_performance", lambda db, ctx: DashboardService(db).get_masters_performance(
+        ctx.tenant_id
+    )),
+    ("DashboardService.get_popular_services", lambda db, ctx: DashboardService(db).get_popular_services(
+        ctx.tenant_id
+    )),
+    ("DashboardService.get_top_clients", lambda db, ctx: DashboardService(db).get_top_clients(ctx.tenant_id)),
+    ("ClientService.search_clients", lambda db, ctx: ClientService(db).search_clients(ctx.tenant_id, "ivan")),
+    ("OutboxService.claim_batch", lambda db, ctx: OutboxService(db).claim_batch(50)),
+    ("ReminderService.dispatch_due", lambda db, ctx: ReminderService(db).dispatch_due(200)),
+    ("tasks._check_and_send_reminders", lambda db, ctx: tasks._check_and_send_reminders()),
+    ("BookingLifecycleService.expire_pending", lambda db, ctx: BookingLifecycleService(db).expire_pending()),
+    ("BookingLifecycleService.mark_no_shows", lambda db, ctx: BookingLifecycleService(db).mark_no_shows()),
+    ("BookingLifecycleService.complete_past", lambda db, ctx: BookingLifecycleService(db).complete_past()),
+]
+
+
+async def seed(db: AsyncSession, bookings_count: int) -> uuid.UUID:
+    """Синтетический салон: мастера, услуги, клиенты и непересекающиеся записи"""
+    tenant = Tenant(subdomain=f"explain-{uuid.uuid4().hex[:8]}", name="Explain", email="explain@jazyl.tech")
+    db.add(tenant)
+    await db.flush()
+
+    masters, services, clients = [], [], []
+    for i in range(10):
+        user = User(
+            tenant_id=tenant.id,
+            email=f"master-{uuid.uuid4().hex[:12]}@jazyl.tech",
+            hashed_password="-",
+            role=UserRole.MASTER
+        )
+        db.add(user)
+        await db.flush()
+        master = Master(tenant_id=tenant.id, user_id=user.id, display_name=f"Master {i}")
+        db.add(master)
+        masters.append(master)
+    for i in range(8):
+        service = Service(tenant_id=tenant.id, name=f"Service {i}", price=10.0 + i, duration=30 + 15 * (i % 3))
+        db.add(service)
+        services.append(service)
+    for i in range(max(50, bookings_count // 10)):
+        client = Client(
+            tenant_id=tenant.id,
+            email=f"client-{i}@example.com",
+            phone=f"+7700{i:07d}",
+            first_name=f"Client{i}"
+        )
+        db.add(client)
+        clients.append(client)
+    await db.flush()
+
+    for master in masters:
+        for day in range(7):
+            db.add(MasterSchedule(master_id=master.id, day_of_week=day, start_time="09:00", end_time="21:00"))
+
+    # Записи мастера идут подряд, поэтому не пересекаются
+    start = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(days=365)
+    cursors = {master.id: start for master in masters}
+    statuses = list(BookingStatus)
+    for _ in range(bookings_count):
+        master = random.choice(masters)
+        service = random.choice(services)
+        booking_start = cursors[master.id]
+        booking_end = booking_start + timedelta(minutes=service.duration)
+        cursors[master.id] = booking_end + timedelta(minutes=random.choice([0, 30, 90, 600]))
+        db.add(Booking(
+            tenant_id=tenant.id,
+            master_id=master.id,
+            service_id=service.id,
+            client_id=random.choice(clients).id,
+            date=booking_start,
+            end_time=booking_end,
+            price=service.price,
+            status=random.choice(statuses),
+            created_at=booking_start - timedelta(days=random.randint(0, 14))
+        ))
+    await db.flush()
+
+    return tenant.id
+
+
+def find_seq_scans(plan: dict) -> List[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found.extend(find_seq_scans(child))
+    return found
+
+
+async def run(bookings_count: int, real_costs: bool) -> int:
+    captured: List[CapturedQuery] = []
+    current = {"probe": None}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if current["probe"] and statement.lstrip().upper().startswith(EXPLAINED_PREFIXES):
+            captured.append(CapturedQuery(current["probe"], statement, parameters))
+
+    async with engine.connect() as conn:
+        outer = await conn.begin()
+        session_factory = async_sessionmaker(
+            bind=conn,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint"
+        )
+
+        # Задачи Celery открывают свои сессии - направляем их в ту же транзакцию
+        original_session = tasks.AsyncSessionLocal
+        tasks.AsyncSessionLocal = session_factory
+
+        try:
+            async with session_factory() as db:
+                tenant_id: Optional[uuid.UUID] = None
+                if bookings_count:
+                    tenant_id = await seed(db, bookings_count)
+                    await db.commit()
+                    await conn.exec_driver_sql("ANALYZE")
+
+                query = select(Booking.tenant_id, Booking.master_id, Booking.service_id).limit(1)
+                if tenant_id:
+                    query = query.where(Booking.tenant_id == tenant_id)
+                row = (await db.execute(query)).first()
+                if not row:
+                    print("Database has no bookings, run with --seed N")
+                    return 2
+                ctx = Context(row.tenant_id, row.master_id, row.service_id, date.today())
+
+            event.listen(engine.sync_engine, "before_cursor_execute", capture)
+            try:
+                for name, probe in PROBES:
+                    current["probe"] = name
+                    async with session_factory() as db:
+                        try:
+                            await probe(db, ctx)
+                        except Exception as e:
+                            print(f"⚠️ {name} failed: {e}")
+                current["probe"] = None
+            finally:
+                event.remove(engine.sync_engine, "before_cursor_execute", capture)
+
+            if not real_costs:
+                await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+
+            for query in captured:
+                nested = await conn.begin_nested()
+                try:
+                    result = await conn.exec_driver_sql(
+                        "EXPLAIN (FORMAT JSON) " + query.statement, query.parameters
+                    )
+                    plan = result.scalar()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    query.seq_scans = find_seq_scans(plan[0]["Plan"])
+                    query.total_cost = plan[0]["Plan"].get("Total Cost", 0.0)
+                    await nested.commit()
+                except Exception as e:
+                    query.error = str(e).splitlines()[0]
+                    await nested.rollback()
+        finally:
+            tasks.AsyncSessionLocal = original_session
+            await outer.rollback()
+
+    flagged = 0
+    for query in captured:
+        if query.error:
+            status = f"ERROR {query.error}"
+        elif query.seq_scans:
+            flagged += 1
+            status = "SEQ SCAN on " + ", ".join(sorted(set(query.seq_scans)))
+        else:
+            status = "ok"
+        sql = " ".join(query.statement.split())
+        print(f"[{query.probe}] cost={query.total_cost:.0f} {status}")
+        print(f"    {sql[:160]}{'...' if len(sql) > 160 else ''}")
+
+    print(f"\n{len(captured)} queries explained, {flagged} with sequential scans")
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="EXPLAIN hot-path queries and flag sequential scans")
+    parser.add_argument("--seed", type=int, default=0, help="insert N synthetic bookings (rolled back)")
+    parser.add_argument("--real-costs", action="store_true", help="keep enable_seqscan on")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.seed, args.real_costs)))
@@ -7,18 +7,19 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 
 from app.models.user import User, UserRole
-from app.models.tenant import Tenant
 from app.schemas.user import UserCreate
 from app.config import settings
-from app.utils.email import EmailService
+from app.services.outbox import OutboxService
 from app.utils.redis_client import redis_client
+from app.utils.tenant_resolver import get_tenant_by_subdomain
+from app.utils.principal_cache import bump_principal
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class AuthService:
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.email_service = EmailService()
+        self.outbox = OutboxService(db)
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         return pwd_context.verify(plain_password, hashed_password)
@@ -37,10 +38,7 @@ class AuthService:
         # Get tenant if subdomain provided
         tenant_id = None
         if subdomain:
-            tenant_result = await self.db.execute(
-                select(Tenant).where(Tenant.subdomain == subdomain)
-            )
-            tenant = tenant_result.scalar_one_or_none()
+            tenant = await get_tenant_by_subdomain(subdomain, self.db)
             if tenant:
                 tenant_id = tenant.id
         
@@ -57,16 +55,21 @@ class AuthService:
         )
         
         self.db.add(user)
-        await self.db.commit()
-        await self.db.refresh(user)
         
         # Send verification email
-        await self.email_service.send_verification_email(
-            user.email,
-            user.first_name,
-            user.verification_token
+        self.outbox.enqueue(
+            "verification_email",
+            {
+                "to_email": user.email,
+                "user_name": user.first_name,
+                "verification_token": user.verification_token
+            },
+            tenant_id=user.tenant_id
         )
         
+        await self.db.commit()
+        await self.db.refresh(user)
+        
         return user
     
     async def authenticate_user(self, email: str, password: str) -> Optional[User]:
@@ -84,6 +87,7 @@ class AuthService:
         # Update last login
         user.last_login = datetime.utcnow()
         await self.db.commit()
+        await bump_principal(user.id)
         
         return user
     
@@ -141,6 +145,7 @@ class AuthService:
         user.is_verified = True
         user.verification_token = None
         await self.db.commit()
+        await bump_principal(user.id)
         
         return True
     
@@ -152,13 +157,16 @@ class AuthService:
         
         if user:
             user.reset_token = secrets.token_urlsafe(32)
-            await self.db.commit()
-            
-            await self.email_service.send_password_reset(
-                user.email,
-                user.first_name,
-                user.reset_token
+            self.outbox.enqueue(
+                "password_reset",
+                {
+                    "to_email": user.email,
+                    "user_name": user.first_name,
+                    "reset_token": user.reset_token
+                },
+                tenant_id=user.tenant_id
             )
+            await self.db.commit()
     
     async def reset_password(self, token: str, new_password: str) -> bool:
         result = await self.db.execute(
@@ -172,6 +180,7 @@ class AuthService:
         user.hashed_password = self.get_password_hash(new_password)
         user.reset_token = None
         await self.db.commit()
+        await bump_principal(user.id)
         
         return True
     
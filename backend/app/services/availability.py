@@ -0,0 +1,114 @@
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+# Шаг сетки слотов в минутах
+SLOT_STEP_MINUTES = 30
+MINUTES_PER_DAY = 24 * 60
+
+Interval = Tuple[int, int]
+
+
+def parse_hhmm(value: str) -> int:
+    """Перевести строку HH:MM в минуты от начала дня"""
+    hours, minutes = value.split(":", 1)
+    return int(hours) * 60 + int(minutes)
+
+
+def format_hhmm(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+
+def build_busy_intervals(
+    day: date,
+    spans: Iterable[Tuple[datetime, datetime]]
+) -> List[Interval]:
+    """
+    Собрать отсортированный список непересекающихся занятых интервалов
+    (в минутах от начала дня) из записей и блокировок.
+    Интервалы обрезаются границами дня, начало округляется вниз, конец - вверх.
+    """
+    origin = day_start(day)
+    intervals = []
+
+    for start, end in spans:
+        start_offset = (start - origin).total_seconds()
+        end_offset = (end - origin).total_seconds()
+
+        if end_offset <= 0 or start_offset >= MINUTES_PER_DAY * 60:
+            continue
+
+        start_minute = max(0, int(start_offset // 60))
+        end_minute = min(MINUTES_PER_DAY, -int(-end_offset // 60))
+
+        if end_minute > start_minute:
+            intervals.append((start_minute, end_minute))
+
+    intervals.sort()
+
+    merged: List[Interval] = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def find_free_slots(
+    work_start: int,
+    work_end: int,
+    busy: List[Interval],
+    duration: int,
+    step: int = SLOT_STEP_MINUTES
+) -> List[int]:
+    """
+    Найти начала свободных слотов одним линейным проходом.
+    busy должен быть результатом build_busy_intervals (отсортирован и слит).
+    """
+    slots = []
+    index = 0
+    busy_count = len(busy)
+    slot_start = work_start
+
+    while slot_start + duration <= work_end:
+        slot_end = slot_start + duration
+
+        # Пропускаем интервалы, которые закончились до начала слота
+        while index < busy_count and busy[index][1] <= slot_start:
+            index += 1
+
+        if index == busy_count or busy[index][0] >= slot_end:
+            slots.append(slot_start)
+
+        slot_start += step
+
+    return slots
+
+
+def get_day_slots(
+    day: date,
+    schedule_start: Optional[str],
+    schedule_end: Optional[str],
+    duration: int,
+    spans: Iterable[Tuple[datetime, datetime]],
+    step: int = SLOT_STEP_MINUTES
+) -> List[str]:
+    """Свободные слоты мастера на день в формате HH:MM"""
+    if not schedule_start or not schedule_end:
+        return []
+
+    busy = build_busy_intervals(day, spans)
+    slots = find_free_slots(
+        parse_hhmm(schedule_start),
+        parse_hhmm(schedule_end),
+        busy,
+        duration,
+        step
+    )
+    return [format_hhmm(slot) for slot in slots]
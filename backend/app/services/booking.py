@@ -1,26 +1,41 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func
-from typing import Optional, List
+from sqlalchemy import select, and_, or_, func, exists, cast, DateTime
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import contains_eager
+from typing import Optional, List, Dict
 from datetime import datetime, date, timedelta
 from uuid import UUID
 import secrets
+import uuid
 
-from app.models.booking import Booking, BookingStatus
+from app.config import settings
+from app.database import is_replica_session
+from app.models.booking import Booking, BookingStatus, ACTIVE_BOOKING_STATUSES, BOOKING_OVERLAP_CONSTRAINT
 from app.models.master import Master, MasterSchedule
 from app.models.service import Service
 from app.models.client import Client
 from app.models.block_time import BlockTime
 from app.schemas.booking import BookingCreate, BookingUpdate
-from app.utils.email import EmailService
+from app.services.availability import get_day_slots
+from app.services.booking_stats import BookingStatsService, booking_facts
+from app.services.client import ClientService
+from app.services.outbox import OutboxService
+from app.services.reminders import ReminderService
+from app.utils import availability_cache
+from app.utils.pagination import Page, paginate
+from collections import defaultdict
+from app.utils.exceptions import ConflictException
 
 class BookingService:
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.email_service = EmailService()
+        self.stats = BookingStatsService(db)
+        self.outbox = OutboxService(db)
+        self.reminders = ReminderService(db)
     
     async def create_booking(self, tenant_id: UUID, booking_data: BookingCreate) -> Booking:
-        # Get or create client
-        client = await self._get_or_create_client(
+        # Клиент находится или создается одним INSERT ... ON CONFLICT в транзакции записи
+        client_id = await ClientService(self.db).resolve_client(
             tenant_id,
             booking_data.client_email,
             booking_data.client_phone,
@@ -41,7 +56,7 @@ class BookingService:
             tenant_id=tenant_id,
             master_id=booking_data.master_id,
             service_id=booking_data.service_id,
-            client_id=client.id,
+            client_id=client_id,
             date=booking_data.date,
             end_time=end_time,
             price=service.price,
@@ -51,67 +66,124 @@ class BookingService:
             cancellation_token=secrets.token_urlsafe(32)
         )
         
-        self.db.add(booking)
-        await self.db.commit()
-        await self.db.refresh(booking)
+        await self.add_booking(booking)
+        
+        await availability_cache.invalidate_booking(booking)
         
         return booking
     
-    async def _get_or_create_client(self, tenant_id: UUID, email: str, phone: str, name: str) -> Client:
-        # Check if client exists
-        result = await self.db.execute(
-            select(Client).where(
-                and_(
-                    Client.tenant_id == tenant_id,
-                    or_(Client.email == email, Client.phone == phone)
-                )
-            )
-        )
-        client = result.scalar_one_or_none()
-        
-        if not client:
-            # Parse name
-            name_parts = name.split(' ', 1)
-            first_name = name_parts[0]
-            last_name = name_parts[1] if len(name_parts) > 1 else None
-            
-            # Create new client
-            client = Client(
-                tenant_id=tenant_id,
-                email=email,
-                phone=phone,
-                first_name=first_name,
-                last_name=last_name
-            )
-            self.db.add(client)
-            await self.db.commit()
-            await self.db.refresh(client)
-        
-        return client
+    async def add_booking(self, booking: Booking) -> None:
+        """
+        Сохранить запись. Пересечение с другой активной записью мастера
+        отклоняет сам INSERT через exclusion constraint.
+        Дневной агрегат, письмо-подтверждение и напоминания пишутся в той же транзакции.
+        """
+        # id нужен письму до INSERT
+        booking.id = booking.id or uuid.uuid4()
+        self.db.add(booking)
+        await self.stats.record_booking(booking)
+        self.outbox.enqueue_booking_email("booking_confirmation", booking)
+        # Напоминания ссылаются на запись - сначала INSERT самой записи
+        await self._commit_checking_overlap(flush_only=True)
+        await self.reminders.sync(booking)
+        await self._commit_checking_overlap()
+    
+    async def _commit_checking_overlap(self, flush_only: bool = False) -> None:
+        try:
+            if flush_only:
+                await self.db.flush()
+            else:
+                await self.db.commit()
+        except IntegrityError as e:
+            await self.db.rollback()
+            if BOOKING_OVERLAP_CONSTRAINT in str(e.orig):
+                raise ConflictException("Time slot not available")
+            raise
     
     async def get_bookings(
         self,
+        tenant_id: UUID,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        master_id: Optional[UUID] = None,
+        status: Optional[BookingStatus] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        with_total: bool = False
+    ) -> Page:
+        """Страница записей салона по (date, id); клиент и услуга - тем же запросом"""
+        query = select(Booking).join(Client).join(Service).where(
+            *self._bookings_filters(tenant_id, date_from, date_to, master_id, status)
+        ).options(contains_eager(Booking.client), contains_eager(Booking.service))
+        
+        return await paginate(
+            self.db,
+            query,
+            Booking.date,
+            Booking.id,
+            key=lambda booking: (booking.date, booking.id),
+            cursor=cursor,
+            limit=limit,
+            with_total=with_total
+        )
+    
+    @staticmethod
+    def _bookings_filters(
         tenant_id: UUID,
         date_from: Optional[date] = None,
         date_to: Optional[date] = None,
         master_id: Optional[UUID] = None,
         status: Optional[BookingStatus] = None
-    ) -> List[Booking]:
-        query = select(Booking).join(Client).join(Service).where(Booking.tenant_id == tenant_id)
-        
+    ) -> list:
+        """Фильтры списка записей (общие для страниц и выгрузки)"""
+        filters = [Booking.tenant_id == tenant_id]
         if date_from:
-            query = query.where(Booking.date >= datetime.combine(date_from, datetime.min.time()))
+            filters.append(Booking.date >= datetime.combine(date_from, datetime.min.time()))
         if date_to:
-            query = query.where(Booking.date <= datetime.combine(date_to, datetime.max.time()))
+            filters.append(Booking.date <= datetime.combine(date_to, datetime.max.time()))
         if master_id:
-            query = query.where(Booking.master_id == master_id)
+            filters.append(Booking.master_id == master_id)
         if status:
-            query = query.where(Booking.status == status)
-        
-        query = query.order_by(Booking.date)
-        
-        result = await self.db.execute(query)
-        return result.scalars().all()
+            filters.append(Booking.status == status)
+        return filters
+    
+    def export_bookings_query(
+        self,
+        tenant_id: UUID,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        master_id: Optional[UUID] = None,
+        status: Optional[BookingStatus] = None
+    ):
+        """Плоские колонки записей для выгрузки, без ORM-объектов"""
+        return select(
+            Booking.id,
+            Booking.date,
+            Booking.end_time,
+            Booking.status,
+            Booking.price,
+            Booking.master_id,
+            Master.display_name.label('master_name'),
+            Booking.service_id,
+            Service.name.label('service_name'),
+            Booking.client_id,
+            Client.first_name.label('client_first_name'),
+            Client.last_name.label('client_last_name'),
+            Client.email.label('client_email'),
+            Client.phone.label('client_phone'),
+            Booking.notes,
+            Booking.created_at,
+            Booking.confirmed_at,
+            Booking.completed_at,
+            Booking.cancelled_at,
+            Booking.cancellation_reason
+        ).join(Client, Booking.client_id == Client.id).join(
+            Service, Booking.service_id == Service.id
+        ).join(
+            Master, Booking.master_id == Master.id
+        ).where(
+            *self._bookings_filters(tenant_id, date_from, date_to, master_id, status)
+        ).order_by(Booking.date, Booking.id)
     
     async def get_booking(self, booking_id: UUID) -> Optional[Booking]:
         result = await self.db.execute(
@@ -134,8 +206,11 @@ class BookingService:
         if not booking:
             return None
         
+        before = booking_facts(booking)
         booking.status = BookingStatus.CONFIRMED
         booking.confirmed_at = datetime.utcnow()
+        await self.stats.record_change(before, booking)
+        await self.reminders.sync(booking)
         await self.db.commit()
         
         return booking
@@ -160,13 +235,17 @@ class BookingService:
         if not booking:
             return None
         
+        before = booking_facts(booking)
         booking.status = BookingStatus.CANCELLED
         booking.cancelled_at = datetime.utcnow()
         booking.cancellation_reason = reason
+        await self.stats.record_change(before, booking)
+        await self.reminders.sync(booking)
+        # Send cancellation email
+        self.outbox.enqueue_booking_email("booking_cancellation", booking)
         await self.db.commit()
         
-        # Send cancellation email
-        await self.email_service.send_booking_cancellation(booking.id)
+        await availability_cache.invalidate_booking(booking)
         
         return booking
     
@@ -182,11 +261,16 @@ class BookingService:
         if not booking or booking.status not in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
             return None
         
+        before = booking_facts(booking)
         booking.status = BookingStatus.CANCELLED
         booking.cancelled_at = datetime.utcnow()
         booking.cancellation_reason = reason
+        await self.stats.record_change(before, booking)
+        await self.reminders.sync(booking)
         await self.db.commit()
         
+        await availability_cache.invalidate_booking(booking)
+        
         return booking
     
     async def update_booking(
@@ -201,12 +285,21 @@ class BookingService:
             return None
         
         update_data = booking_data.dict(exclude_unset=True)
+        previous_span = (booking.master_id, booking.date, booking.end_time)
+        before = booking_facts(booking)
         
         for key, value in update_data.items():
             setattr(booking, key, value)
         
         booking.updated_at = datetime.utcnow()
-        await self.db.commit()
+        await self.stats.record_change(before, booking)
+        # Перенос или смена статуса переносят и напоминания
+        await self.reminders.sync(booking)
+        await self._commit_checking_overlap()
+        
+        # Перенос или смена статуса меняют занятость и старого, и нового времени
+        await availability_cache.invalidate_range(*previous_span)
+        await availability_cache.invalidate_booking(booking)
         
         return booking
     
@@ -217,69 +310,51 @@ class BookingService:
         booking_date: datetime,
         service_id: UUID
     ) -> bool:
-        # Get service duration
-        service_result = await self.db.execute(
-            select(Service).where(Service.id == service_id)
+        """
+        Проверить слот одним запросом: пересечение с записями и блокировками
+        через tsrange и попадание в рабочие часы мастера.
+        Окончательную защиту от двойной записи дает exclusion constraint на bookings.
+        """
+        start = cast(booking_date, DateTime)
+        requested = func.tsrange(
+            start,
+            start + func.make_interval(0, 0, 0, 0, 0, Service.duration)
         )
-        service = service_result.scalar_one()
-        end_time = booking_date + timedelta(minutes=service.duration)
         
-        # Check for existing bookings
-        booking_result = await self.db.execute(
-            select(Booking).where(
-                and_(
-                    Booking.master_id == master_id,
-                    Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED]),
-                    or_(
-                        and_(Booking.date <= booking_date, Booking.end_time > booking_date),
-                        and_(Booking.date < end_time, Booking.end_time >= end_time)
-                    )
-                )
+        booking_conflict = exists().where(
+            and_(
+                Booking.master_id == master_id,
+                Booking.status.in_(ACTIVE_BOOKING_STATUSES),
+                func.tsrange(Booking.date, Booking.end_time).op("&&")(requested)
             )
         )
         
-        if booking_result.scalar_one_or_none():
-            return False
-        
-        # Check for block times
-        block_result = await self.db.execute(
-            select(BlockTime).where(
-                and_(
-                    BlockTime.master_id == master_id,
-                    BlockTime.start_time <= booking_date,
-                    BlockTime.end_time > booking_date
-                )
+        block_conflict = exists().where(
+            and_(
+                BlockTime.master_id == master_id,
+                func.tsrange(BlockTime.start_time, BlockTime.end_time).op("&&")(requested)
             )
         )
         
-        if block_result.scalar_one_or_none():
-            return False
-        
-        # Check master schedule
-        day_of_week = booking_date.weekday()
-        schedule_result = await self.db.execute(
-            select(MasterSchedule).where(
-                and_(
-                    MasterSchedule.master_id == master_id,
-                    MasterSchedule.day_of_week == day_of_week,
-                    MasterSchedule.is_working == True
-                )
+        # Время в формате HH:MM сравнивается как строка, так же хранится расписание
+        booking_time = booking_date.strftime("%H:%M")
+        within_schedule = exists().where(
+            and_(
+                MasterSchedule.master_id == master_id,
+                MasterSchedule.day_of_week == booking_date.weekday(),
+                MasterSchedule.is_working == True,
+                MasterSchedule.start_time <= booking_time,
+                MasterSchedule.end_time > booking_time
             )
         )
-        schedule = schedule_result.scalar_one_or_none()
-        
-        if not schedule:
-            return False
         
-        # Check if time is within working hours
-        booking_time = booking_date.time()
-        start_time = datetime.strptime(schedule.start_time, "%H:%M").time()
-        end_time = datetime.strptime(schedule.end_time, "%H:%M").time()
-        
-        if booking_time < start_time or booking_time >= end_time:
-            return False
+        result = await self.db.execute(
+            select(
+                and_(~booking_conflict, ~block_conflict, within_schedule)
+            ).where(Service.id == service_id)
+        )
         
-        return True
+        return bool(result.scalar_one_or_none())
     
     async def get_available_slots(
         self,
@@ -294,6 +369,12 @@ class BookingService:
         )
         service = service_result.scalar_one()
         
+        cached, cache_keys = await availability_cache.lookup_slots(
+            [(master_id, booking_date)], service.duration
+        )
+        if (master_id, booking_date) in cached:
+            return cached[(master_id, booking_date)]
+        
         # Get master schedule for the day
         day_of_week = booking_date.weekday()
         schedule_result = await self.db.execute(
@@ -308,69 +389,184 @@ class BookingService:
         schedule = schedule_result.scalar_one_or_none()
         
         if not schedule:
+            await self._store_cached_slots(cache_keys, {(master_id, booking_date): []})
             return []
         
-        # Get existing bookings for the day
+        # Get existing bookings and block times overlapping the day
         start_of_day = datetime.combine(booking_date, datetime.min.time())
-        end_of_day = datetime.combine(booking_date, datetime.max.time())
+        end_of_day = start_of_day + timedelta(days=1)
         
         bookings_result = await self.db.execute(
-            select(Booking).where(
+            select(Booking.date, Booking.end_time).where(
                 and_(
                     Booking.master_id == master_id,
-                    Booking.date >= start_of_day,
-                    Booking.date <= end_of_day,
+                    Booking.date < end_of_day,
+                    Booking.end_time > start_of_day,
                     Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED])
                 )
-            ).order_by(Booking.date)
+            )
         )
-        bookings = bookings_result.scalars().all()
         
-        # Get block times for the day
         blocks_result = await self.db.execute(
-            select(BlockTime).where(
+            select(BlockTime.start_time, BlockTime.end_time).where(
                 and_(
                     BlockTime.master_id == master_id,
-                    BlockTime.start_time >= start_of_day,
-                    BlockTime.start_time <= end_of_day
+                    BlockTime.start_time < end_of_day,
+                    BlockTime.end_time > start_of_day
+                )
+            )
+        )
+        
+        busy = list(bookings_result.all()) + list(blocks_result.all())
+        
+        slots = get_day_slots(
+            booking_date,
+            schedule.start_time,
+            schedule.end_time,
+            service.duration,
+            busy
+        )
+        
+        await self._store_cached_slots(cache_keys, {(master_id, booking_date): slots})
+        
+        return slots
+    
+    async def get_available_slots_range(
+        self,
+        tenant_id: UUID,
+        service_id: UUID,
+        date_from: date,
+        date_to: date,
+        master_ids: Optional[List[UUID]] = None
+    ) -> Dict[UUID, Dict[date, List[str]]]:
+        """
+        Свободные слоты для нескольких мастеров на диапазон дат.
+        Использует фиксированное число запросов независимо от числа мастеров и дней.
+        """
+        service_result = await self.db.execute(
+            select(Service.duration).where(
+                and_(Service.id == service_id, Service.tenant_id == tenant_id)
+            )
+        )
+        duration = service_result.scalar_one_or_none()
+        
+        if duration is None:
+            return {}
+        
+        masters_query = select(Master.id).where(
+            and_(
+                Master.tenant_id == tenant_id,
+                Master.is_active == True,
+                Master.is_visible == True
+            )
+        )
+        if master_ids:
+            masters_query = masters_query.where(Master.id.in_(master_ids))
+        
+        masters_result = await self.db.execute(masters_query)
+        masters = list(masters_result.scalars().all())
+        
+        if not masters:
+            return {}
+        
+        pairs = []
+        current_day = date_from
+        while current_day <= date_to:
+            pairs.extend((master_id, current_day) for master_id in masters)
+            current_day += timedelta(days=1)
+        
+        cached, cache_keys = await availability_cache.lookup_slots(pairs, duration)
+        if len(cached) == len(pairs):
+            availability = {master_id: {} for master_id in masters}
+            for master_id, day in pairs:
+                availability[master_id][day] = cached[(master_id, day)]
+            return availability
+        
+        window_start = datetime.combine(date_from, datetime.min.time())
+        window_end = datetime.combine(date_to, datetime.min.time()) + timedelta(days=1)
+        
+        schedules_result = await self.db.execute(
+            select(
+                MasterSchedule.master_id,
+                MasterSchedule.day_of_week,
+                MasterSchedule.start_time,
+                MasterSchedule.end_time
+            ).where(
+                and_(
+                    MasterSchedule.master_id.in_(masters),
+                    MasterSchedule.is_working == True
                 )
             )
         )
-        blocks = blocks_result.scalars().all()
-        
-        # Generate available slots
-        available_slots = []
-        
-        start_time = datetime.strptime(schedule.start_time, "%H:%M").time()
-        end_time = datetime.strptime(schedule.end_time, "%H:%M").time()
-        
-        current_slot = datetime.combine(booking_date, start_time)
-        end_datetime = datetime.combine(booking_date, end_time)
-        
-        slot_duration = 30  # minutes
-        
-        while current_slot + timedelta(minutes=service.duration) <= end_datetime:
-            # Check if slot is available
-            is_available = True
-            
-            # Check against existing bookings
-            for booking in bookings:
-                if (current_slot < booking.end_time and 
-                    current_slot + timedelta(minutes=service.duration) > booking.date):
-                    is_available = False
-                    break
-            
-            # Check against block times
-            if is_available:
-                for block in blocks:
-                    if (current_slot < block.end_time and 
-                        current_slot + timedelta(minutes=service.duration) > block.start_time):
-                        is_available = False
-                        break
-            
-            if is_available:
-                available_slots.append(current_slot.strftime("%H:%M"))
-            
-            current_slot += timedelta(minutes=slot_duration)
-        
-        return available_slots
\ No newline at end of file
+        schedules = {
+            (row.master_id, row.day_of_week): (row.start_time, row.end_time)
+            for row in schedules_result.all()
+        }
+        
+        bookings_result = await self.db.execute(
+            select(Booking.master_id, Booking.date, Booking.end_time).where(
+                and_(
+                    Booking.master_id.in_(masters),
+                    Booking.date < window_end,
+                    Booking.end_time > window_start,
+                    Booking.status.in_([BookingStatus.PENDING, BookingStatus.CONFIRMED])
+                )
+            )
+        )
+        
+        blocks_result = await self.db.execute(
+            select(BlockTime.master_id, BlockTime.start_time, BlockTime.end_time).where(
+                and_(
+                    BlockTime.master_id.in_(masters),
+                    BlockTime.start_time < window_end,
+                    BlockTime.end_time > window_start
+                )
+            )
+        )
+        
+        # Раскладываем занятость по (мастер, день), интервал может захватывать несколько дней
+        busy_by_day = defaultdict(list)
+        for master_id, start, end in list(bookings_result.all()) + list(blocks_result.all()):
+            current_day = max(start.date(), date_from)
+            last_day = min((end - timedelta(microseconds=1)).date(), date_to)
+            while current_day <= last_day:
+                busy_by_day[(master_id, current_day)].append((start, end))
+                current_day += timedelta(days=1)
+        
+        availability = {}
+        for master_id in masters:
+            days = {}
+            current_day = date_from
+            while current_day <= date_to:
+                schedule = schedules.get((master_id, current_day.weekday()))
+                if schedule:
+                    days[current_day] = get_day_slots(
+                        current_day,
+                        schedule[0],
+                        schedule[1],
+                        duration,
+                        busy_by_day.get((master_id, current_day), [])
+                    )
+                else:
+                    days[current_day] = []
+                current_day += timedelta(days=1)
+            availability[master_id] = days
+        
+        await self._store_cached_slots(cache_keys, {
+            (master_id, day): slots
+            for master_id, days in availability.items()
+            for day, slots in days.items()
+            if (master_id, day) not in cached
+        })
+        
+        return availability
+    
+    async def _store_cached_slots(self, cache_keys: dict, slots_by_pair: dict) -> None:
+        # Реплика может еще не видеть запись, после которой сброшен кэш -
+        # такие слоты живут недолго
+        ttl = settings.AVAILABILITY_REPLICA_CACHE_TTL if is_replica_session(self.db) else None
+        await availability_cache.store_slots({
+            cache_keys[pair]: slots
+            for pair, slots in slots_by_pair.items()
+            if pair in cache_keys
+        }, ttl)
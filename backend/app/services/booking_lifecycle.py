@@ -0,0 +1,149 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, and_
+from typing import List, NamedTuple, Optional, Set, Tuple
+from datetime import datetime, timedelta
+from uuid import UUID
+import time
+
+from app.config import settings
+from app.models.booking import Booking, BookingStatus
+from app.services.booking_stats import BookingStatsService
+from app.utils import availability_cache
+
+
+class TransitionResult(NamedTuple):
+    """Итог массового перехода: id измененных записей - для уведомлений и пересчетов"""
+    name: str
+    before: BookingStatus
+    after: BookingStatus
+    booking_ids: List[UUID]
+
+
+class BookingLifecycleService:
+    """
+    Плановые переходы статусов записей одним UPDATE ... RETURNING на пачку.
+    Пачка выбирается по частичным/составным индексам статуса и блокируется
+    с SKIP LOCKED: записи, которые сейчас меняет пользователь или другой
+    воркер, пропускаются до следующего запуска. Каждая пачка - отдельная
+    короткая транзакция вместе с поправкой booking_daily_stats и счетчиков клиентов.
+    """
+
+    def __init__(self, db: AsyncSession, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.LIFECYCLE_BATCH_SIZE
+        self.stats = BookingStatsService(db)
+
+    async def _transition(
+        self,
+        name: str,
+        before: BookingStatus,
+        after: BookingStatus,
+        condition,
+        values: dict,
+        deadline: Optional[float] = None
+    ) -> TransitionResult:
+        booking_ids: List[UUID] = []
+        while True:
+            batch = select(Booking.id).where(
+                and_(Booking.status == before, condition)
+            ).limit(self.batch_size).with_for_update(skip_locked=True)
+
+            result = await self.db.execute(
+                update(Booking)
+                .where(
+                    and_(
+                        Booking.id.in_(batch.scalar_subquery()),
+                        Booking.status == before
+                    )
+                )
+                .values(status=after, updated_at=datetime.utcnow(), **values)
+                .returning(
+                    Booking.id,
+                    Booking.tenant_id,
+                    Booking.master_id,
+                    Booking.service_id,
+                    Booking.client_id,
+                    Booking.date,
+                    Booking.end_time,
+                    Booking.price
+                )
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+            if rows:
+                await self.stats.apply_transition(rows, before, after)
+            await self.db.commit()
+
+            if rows:
+                booking_ids.extend(row.id for row in rows)
+                await self._invalidate_availability(rows)
+
+            if len(rows) < self.batch_size or (deadline and time.monotonic() >= deadline):
+                break
+
+        return TransitionResult(name, before, after, booking_ids)
+
+    @staticmethod
+    async def _invalidate_availability(rows) -> None:
+        """Один сброс кэша на мастера и день, а не на каждую запись"""
+        days: Set[Tuple[UUID, datetime]] = set()
+        for row in rows:
+            start = datetime.combine(row.date.date(), datetime.min.time())
+            days.add((row.master_id, start))
+            last = datetime.combine((row.end_time - timedelta(microseconds=1)).date(), datetime.min.time())
+            days.add((row.master_id, last))
+        for master_id, day in days:
+            await availability_cache.invalidate_range(master_id, day)
+
+    async def expire_pending(self, deadline: Optional[float] = None) -> TransitionResult:
+        """Неподтвержденные за BOOKING_PENDING_TTL_HOURS записи отменяются"""
+        now = datetime.utcnow()
+        hours = settings.BOOKING_PENDING_TTL_HOURS
+        return await self._transition(
+            "expire_pending",
+            BookingStatus.PENDING,
+            BookingStatus.CANCELLED,
+            Booking.created_at < now - timedelta(hours=hours),
+            {"cancelled_at": now, "cancellation_reason": f"Not confirmed within {hours} hours"},
+            deadline
+        )
+
+    async def mark_no_shows(self, deadline: Optional[float] = None) -> TransitionResult:
+        """Время визита прошло, а запись так и не подтвердили - неявка"""
+        cutoff = datetime.utcnow() - timedelta(minutes=settings.BOOKING_AUTO_COMPLETE_DELAY_MINUTES)
+        return await self._transition(
+            "mark_no_shows",
+            BookingStatus.PENDING,
+            BookingStatus.NO_SHOW,
+            # date <= end_time: условие по date дает диапазон в ix_bookings_status_date
+            and_(Booking.date < cutoff, Booking.end_time < cutoff),
+            {},
+            deadline
+        )
+
+    async def complete_past(self, deadline: Optional[float] = None) -> TransitionResult:
+        """
+        Подтвержденные записи завершаются после окончания визита. Задержка
+        BOOKING_AUTO_COMPLETE_DELAY_MINUTES оставляет мастеру время отметить неявку.
+        """
+        cutoff = datetime.utcnow() - timedelta(minutes=settings.BOOKING_AUTO_COMPLETE_DELAY_MINUTES)
+        return await self._transition(
+            "complete_past",
+            BookingStatus.CONFIRMED,
+            BookingStatus.COMPLETED,
+            and_(Booking.date < cutoff, Booking.end_time < cutoff),
+            {"completed_at": Booking.end_time},
+            deadline
+        )
+
+    async def run(self, deadline: Optional[float] = None) -> List[TransitionResult]:
+        """
+        Все переходы по очереди. Истечение идет первым: неподтвержденная
+        запись старше суток отменяется, даже если ее время уже прошло.
+        """
+        results = []
+        for transition in (self.expire_pending, self.mark_no_shows, self.complete_past):
+            results.append(await transition(deadline))
+            if deadline and time.monotonic() >= deadline:
+                break
+        return results
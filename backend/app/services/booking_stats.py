@@ -0,0 +1,303 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, and_, func, cast, literal, String, Integer
+from sqlalchemy.dialects.postgresql import insert, BIT, UUID as PG_UUID
+from typing import NamedTuple, Optional, List, Dict, Any
+from datetime import date, datetime, timedelta
+from uuid import UUID
+import math
+
+from app.models.booking import Booking, BookingStatus
+from app.models.booking_stats import BookingDailyStats, CLIENT_SKETCH_BITS
+from app.services.client_stats import ClientStatsService
+from app.utils.rollup import upsert_from_select
+
+STATUS_COUNTERS = {
+    BookingStatus.PENDING: "pending_count",
+    BookingStatus.CONFIRMED: "confirmed_count",
+    BookingStatus.COMPLETED: "completed_count",
+    BookingStatus.CANCELLED: "cancelled_count",
+    BookingStatus.NO_SHOW: "no_show_count",
+}
+
+COUNTER_COLUMNS = ["total_count", *STATUS_COUNTERS.values()]
+
+STATS_KEY_COLUMNS = ["tenant_id", "master_id", "service_id", "day"]
+
+
+class BookingFacts(NamedTuple):
+    """Поля записи, от которых зависит ее вклад в booking_daily_stats"""
+    tenant_id: UUID
+    master_id: UUID
+    service_id: UUID
+    client_id: UUID
+    day: date
+    status: BookingStatus
+    price: float
+
+
+def booking_facts(booking: Booking) -> BookingFacts:
+    return BookingFacts(
+        booking.tenant_id,
+        booking.master_id,
+        booking.service_id,
+        booking.client_id,
+        booking.date.date(),
+        booking.status or BookingStatus.PENDING,
+        booking.price or 0
+    )
+
+
+def client_sketch_bit(client_id):
+    """
+    Битовая карта с одним установленным битом: позиция - первые 12 бит md5(client_id).
+    Вычисляется в SQL, поэтому инкрементальные обновления и пересчет совпадают.
+    """
+    position = cast(
+        cast(literal("x") + func.substr(func.md5(cast(client_id, String)), 1, 3), BIT(12)),
+        Integer
+    )
+    return cast(literal("1"), BIT(CLIENT_SKETCH_BITS)).op(">>", return_type=BIT(CLIENT_SKETCH_BITS))(position)
+
+
+def estimate_distinct(set_bits: Optional[int]) -> int:
+    """Оценка числа уникальных клиентов по числу установленных бит (linear counting)"""
+    if not set_bits:
+        return 0
+    zero_bits = CLIENT_SKETCH_BITS - set_bits
+    if zero_bits <= 0:
+        return round(CLIENT_SKETCH_BITS * math.log(CLIENT_SKETCH_BITS))
+    return round(CLIENT_SKETCH_BITS * math.log(CLIENT_SKETCH_BITS / zero_bits))
+
+
+def unique_clients_column():
+    """Число установленных бит в объединенной карте клиентов (для estimate_distinct)"""
+    return func.bit_count(func.bit_or(BookingDailyStats.client_sketch))
+
+
+class BookingStatsService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.clients = ClientStatsService(db)
+
+    async def apply(self, facts: BookingFacts, sign: int = 1) -> None:
+        """
+        Добавить (sign=1) или убрать (sign=-1) вклад записи в дневной агрегат.
+        Выполняется в транзакции изменения записи, без коммита.
+        Карта клиентов только пополняется - лишние биты убирает пересчет.
+        """
+        values = {
+            "tenant_id": facts.tenant_id,
+            "master_id": facts.master_id,
+            "service_id": facts.service_id,
+            "day": facts.day,
+            "total_count": sign,
+            "revenue": sign * facts.price if facts.status == BookingStatus.COMPLETED else 0,
+            "client_sketch": (
+                client_sketch_bit(literal(facts.client_id, PG_UUID(as_uuid=True)))
+                if sign > 0 else cast(literal("0"), BIT(CLIENT_SKETCH_BITS))
+            ),
+            "updated_at": datetime.utcnow(),
+        }
+        for status, column in STATUS_COUNTERS.items():
+            values[column] = sign if facts.status == status else 0
+
+        stmt = insert(BookingDailyStats).values(**values)
+        update_values = {
+            column: getattr(BookingDailyStats, column) + getattr(stmt.excluded, column)
+            for column in COUNTER_COLUMNS + ["revenue"]
+        }
+        update_values["client_sketch"] = BookingDailyStats.client_sketch.op("|")(stmt.excluded.client_sketch)
+        update_values["updated_at"] = stmt.excluded.updated_at
+
+        await self.db.execute(
+            stmt.on_conflict_do_update(index_elements=STATS_KEY_COLUMNS, set_=update_values)
+        )
+
+    async def record_booking(self, booking: Booking) -> None:
+        """Учесть новую запись (и в счетчиках клиента)"""
+        facts = booking_facts(booking)
+        await self.apply(facts)
+        await self.clients.record_booking(facts, booking)
+
+    async def record_change(self, before: BookingFacts, booking: Booking) -> None:
+        """Учесть смену статуса, переноса или цены записи"""
+        after = booking_facts(booking)
+        if before == after:
+            return
+        await self.apply(before, -1)
+        await self.apply(after, 1)
+        await self.clients.record_change(before, after, booking)
+
+    async def apply_transition(self, rows, before: BookingStatus, after: BookingStatus) -> None:
+        """
+        Учесть массовую смену статуса одним запросом. rows - строки с
+        tenant_id, master_id, service_id, client_id, date, price (например,
+        RETURNING массового UPDATE). Состав клиентов за день не меняется.
+        """
+        grouped: Dict[tuple, List[float]] = {}
+        for row in rows:
+            key = (row.tenant_id, row.master_id, row.service_id, row.date.date())
+            counts = grouped.setdefault(key, [0, 0.0])
+            counts[0] += 1
+            counts[1] += row.price or 0
+        if not grouped or before == after:
+            return
+
+        now = datetime.utcnow()
+        values = []
+        for (tenant_id, master_id, service_id, day), (count, price) in grouped.items():
+            item = {
+                "tenant_id": tenant_id,
+                "master_id": master_id,
+                "service_id": service_id,
+                "day": day,
+                "total_count": 0,
+                "revenue": (
+                    price if after == BookingStatus.COMPLETED
+                    else -price if before == BookingStatus.COMPLETED else 0
+                ),
+                "client_sketch": cast(literal("0"), BIT(CLIENT_SKETCH_BITS)),
+                "updated_at": now,
+            }
+            for status, column in STATUS_COUNTERS.items():
+                item[column] = count if status == after else -count if status == before else 0
+            values.append(item)
+
+        # Ключи сгруппированы, поэтому ON CONFLICT не встретит одну строку дважды
+        stmt = insert(BookingDailyStats).values(values)
+        update_values = {
+            column: getattr(BookingDailyStats, column) + getattr(stmt.excluded, column)
+            for column in COUNTER_COLUMNS + ["revenue"]
+        }
+        update_values["updated_at"] = stmt.excluded.updated_at
+
+        await self.db.execute(
+            stmt.on_conflict_do_update(index_elements=STATS_KEY_COLUMNS, set_=update_values)
+        )
+        await self.clients.apply_transition(rows, before, after)
+
+    async def reconcile(self, date_from: date, date_to: date) -> int:
+        """
+        Пересчитать агрегаты за период по таблице bookings, по одному дню на
+        транзакцию: блокировки строк агрегата держатся недолго и записи в
+        другие дни не ждут. Ключи, которые параллельный инкремент вставил
+        после DELETE, перезаписываются пересчетом (ON CONFLICT DO UPDATE).
+        """
+        rows = 0
+        day = date_from
+        while day <= date_to:
+            rows += await self._reconcile_day(day)
+            await self.db.commit()
+            day += timedelta(days=1)
+        return rows
+
+    async def _reconcile_day(self, day: date) -> int:
+        start = datetime.combine(day, datetime.min.time())
+        booking_day = func.date(Booking.date)
+        query = select(
+            Booking.tenant_id,
+            Booking.master_id,
+            Booking.service_id,
+            booking_day,
+            func.count(Booking.id),
+            *[
+                func.count(Booking.id).filter(Booking.status == status)
+                for status in STATUS_COUNTERS
+            ],
+            func.coalesce(func.sum(Booking.price).filter(Booking.status == BookingStatus.COMPLETED), 0),
+            func.bit_or(client_sketch_bit(Booking.client_id)),
+            literal(datetime.utcnow())
+        ).where(
+            and_(
+                Booking.date >= start,
+                Booking.date < start + timedelta(days=1)
+            )
+        ).group_by(Booking.tenant_id, Booking.master_id, Booking.service_id, booking_day)
+
+        await self.db.execute(
+            delete(BookingDailyStats).where(BookingDailyStats.day == day)
+        )
+        result = await self.db.execute(
+            upsert_from_select(
+                BookingDailyStats,
+                STATS_KEY_COLUMNS + COUNTER_COLUMNS + ["revenue", "client_sketch", "updated_at"],
+                STATS_KEY_COLUMNS,
+                query
+            )
+        )
+        return result.rowcount
+
+    async def get_revenue_by_day(
+        self,
+        date_from: date,
+        date_to: date,
+        tenant_id: Optional[UUID] = None,
+        master_id: Optional[UUID] = None
+    ) -> List[Dict[str, Any]]:
+        """Завершенные записи и выручка по дням (только дни с завершенными записями)"""
+        query = select(
+            BookingDailyStats.day,
+            func.sum(BookingDailyStats.completed_count).label('bookings_count'),
+            func.sum(BookingDailyStats.revenue).label('revenue')
+        ).where(
+            and_(
+                BookingDailyStats.day >= date_from,
+                BookingDailyStats.day <= date_to
+            )
+        )
+
+        if tenant_id:
+            query = query.where(BookingDailyStats.tenant_id == tenant_id)
+        if master_id:
+            query = query.where(BookingDailyStats.master_id == master_id)
+
+        query = query.group_by(BookingDailyStats.day).having(
+            func.sum(BookingDailyStats.completed_count) > 0
+        ).order_by(BookingDailyStats.day)
+
+        result = await self.db.execute(query)
+
+        return [
+            {
+                "day": row.day,
+                "bookings_count": row.bookings_count or 0,
+                "revenue": float(row.revenue or 0)
+            }
+            for row in result.all()
+        ]
+
+
+def master_summary_columns(today: Optional[date] = None) -> list:
+    """Агрегирующие колонки кабинета мастера; строки BookingDailyStats отбирает вызывающий"""
+    today = today or datetime.utcnow().date()
+    week_start = today - timedelta(days=7)
+    month_start = today - timedelta(days=30)
+    up_to_today = BookingDailyStats.day <= today
+
+    return [
+        func.coalesce(func.sum(BookingDailyStats.total_count), 0).label('total_bookings'),
+        func.coalesce(func.sum(BookingDailyStats.completed_count), 0).label('completed_bookings'),
+        func.coalesce(func.sum(BookingDailyStats.cancelled_count), 0).label('cancelled_bookings'),
+        func.coalesce(
+            func.sum(BookingDailyStats.total_count).filter(
+                and_(BookingDailyStats.day >= week_start, up_to_today)
+            ), 0
+        ).label('week_bookings'),
+        func.coalesce(
+            func.sum(BookingDailyStats.revenue).filter(
+                and_(BookingDailyStats.day >= month_start, up_to_today)
+            ), 0
+        ).label('month_revenue'),
+        unique_clients_column().label('client_bits')
+    ]
+
+
+def master_summary_from_row(row) -> Dict[str, Any]:
+    return {
+        "total_bookings": row.total_bookings,
+        "completed_bookings": row.completed_bookings,
+        "cancelled_bookings": row.cancelled_bookings,
+        "week_bookings": row.week_bookings,
+        "month_revenue": float(row.month_revenue),
+        "total_clients": estimate_distinct(row.client_bits),
+    }
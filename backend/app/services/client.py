@@ -1,12 +1,41 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func
-from typing import Optional, List
+from sqlalchemy import select, and_, or_, func, case
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from typing import Optional, List, Tuple
 from datetime import datetime
 from uuid import UUID
+import re
+import uuid
 
-from app.models.client import Client
-from app.models.booking import Booking, BookingStatus
+from app.models.client import Client, CLIENT_EMAIL_INDEX
+from app.models.booking import Booking
 from app.schemas.client import ClientCreate, ClientUpdate
+from app.utils.pagination import Page, paginate
+from app.utils.exceptions import ConflictException
+
+# Подсказки в поиске клиентов
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+# Меньше цифр в запросе - это не поиск по телефону ("Анна 2")
+MIN_PHONE_DIGITS = 3
+
+
+def _normalize_search(term: str) -> Tuple[str, str]:
+    """Текст в нижнем регистре (как search_text) и только цифры (как phone_digits)"""
+    return " ".join(term.lower().split()), re.sub(r"[^0-9]", "", term)
+
+
+def _search_filter(term: str):
+    """Подстрока в имени/email или в цифрах телефона - оба условия по триграммным индексам"""
+    text_term, digits = _normalize_search(term)
+    if not text_term:
+        return None
+    conditions = [Client.search_text.contains(text_term, autoescape=True)]
+    if len(digits) >= MIN_PHONE_DIGITS:
+        conditions.append(Client.phone_digits.contains(digits, autoescape=True))
+    return or_(*conditions)
+
 
 class ClientService:
     def __init__(self, db: AsyncSession):
@@ -19,41 +48,172 @@ class ClientService:
         )
         
         self.db.add(client)
-        await self.db.commit()
+        await self._commit_checking_email()
         await self.db.refresh(client)
         
         return client
     
+    async def _commit_checking_email(self) -> None:
+        try:
+            await self.db.commit()
+        except IntegrityError as e:
+            await self.db.rollback()
+            if CLIENT_EMAIL_INDEX in str(e.orig):
+                raise ConflictException("Client with this email already exists")
+            raise
+    
+    async def resolve_client(
+        self,
+        tenant_id: UUID,
+        email: str,
+        phone: Optional[str],
+        name: str
+    ) -> UUID:
+        """
+        id клиента салона по email (без учета регистра), новый клиент
+        создается тем же запросом. Параллельные записи одного клиента не
+        создают дублей - их разводит уникальный индекс (tenant_id, lower(email)).
+        У найденного клиента заполняются только пустые телефон и фамилия.
+        Выполняется в транзакции записи, без коммита.
+        """
+        name_parts = name.split(maxsplit=1)
+        first_name = name_parts[0] if name_parts else email.split("@")[0]
+        last_name = name_parts[1] if len(name_parts) > 1 else None
+        now = datetime.utcnow()
+        
+        stmt = insert(Client).values(
+            id=uuid.uuid4(),
+            tenant_id=tenant_id,
+            email=email.strip(),
+            phone=phone or "",
+            first_name=first_name,
+            last_name=last_name,
+            preferences={},
+            total_visits=0,
+            total_spent=0.0,
+            is_vip=False,
+            is_blacklisted=False,
+            created_at=now,
+            updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Client.tenant_id, func.lower(Client.email)],
+            set_={
+                "phone": func.coalesce(func.nullif(Client.phone, ""), stmt.excluded.phone),
+                "last_name": func.coalesce(func.nullif(Client.last_name, ""), stmt.excluded.last_name),
+            }
+        ).returning(Client.id)
+        
+        result = await self.db.execute(stmt)
+        return result.scalar_one()
+    
     async def get_clients(
         self,
         tenant_id: UUID,
         search: Optional[str] = None,
-        is_vip: Optional[bool] = None
-    ) -> List[Client]:
-        query = select(Client).where(
-            and_(
-                Client.tenant_id == tenant_id,
-                Client.is_blacklisted == False
-            )
+        is_vip: Optional[bool] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        with_total: bool = False
+    ) -> Page:
+        """Страница клиентов салона, новые первыми (created_at, id)"""
+        query = select(Client).where(*self._clients_filters(tenant_id, search, is_vip))
+        
+        return await paginate(
+            self.db,
+            query,
+            Client.created_at,
+            Client.id,
+            key=lambda client: (client.created_at, client.id),
+            cursor=cursor,
+            limit=limit,
+            descending=True,
+            with_total=with_total
         )
+    
+    @staticmethod
+    def _clients_filters(
+        tenant_id: UUID,
+        search: Optional[str] = None,
+        is_vip: Optional[bool] = None
+    ) -> list:
+        """Фильтры списка клиентов (общие для страниц и выгрузки)"""
+        filters = [
+            Client.tenant_id == tenant_id,
+            Client.is_blacklisted == False
+        ]
         
         if search:
-            search_term = f"%{search}%"
-            query = query.where(
-                or_(
-                    Client.first_name.ilike(search_term),
-                    Client.last_name.ilike(search_term),
-                    Client.email.ilike(search_term),
-                    Client.phone.ilike(search_term)
-                )
-            )
+            search_filter = _search_filter(search)
+            if search_filter is not None:
+                filters.append(search_filter)
         
         if is_vip is not None:
-            query = query.where(Client.is_vip == is_vip)
+            filters.append(Client.is_vip == is_vip)
+        
+        return filters
+    
+    async def search_clients(self, tenant_id: UUID, term: str, limit: int = SEARCH_DEFAULT_LIMIT) -> List[Client]:
+        """
+        Поиск для подсказок: совпадения с началом имени, фамилии, email или
+        телефона выше, затем по похожести. Отбор идет по триграммным индексам.
+        """
+        text_term, digits = _normalize_search(term)
+        search_filter = _search_filter(term)
+        if search_filter is None:
+            return []
+        
+        prefix_matches = [
+            Client.search_text.startswith(text_term, autoescape=True),
+            # Начало любого слова: "иван" находит "Петр Иванов"
+            Client.search_text.contains(" " + text_term, autoescape=True)
+        ]
+        if len(digits) >= MIN_PHONE_DIGITS:
+            prefix_matches.append(Client.phone_digits.startswith(digits, autoescape=True))
         
-        result = await self.db.execute(query)
+        result = await self.db.execute(
+            select(Client)
+            .where(
+                and_(
+                    Client.tenant_id == tenant_id,
+                    Client.is_blacklisted == False,
+                    search_filter
+                )
+            )
+            .order_by(
+                case((or_(*prefix_matches), 0), else_=1),
+                func.word_similarity(text_term, Client.search_text).desc(),
+                Client.last_visit.desc().nullslast(),
+                Client.id
+            )
+            .limit(min(max(limit, 1), SEARCH_MAX_LIMIT))
+        )
         return result.scalars().all()
     
+    def export_clients_query(
+        self,
+        tenant_id: UUID,
+        search: Optional[str] = None,
+        is_vip: Optional[bool] = None
+    ):
+        """Плоские колонки клиентов для выгрузки, без ORM-объектов"""
+        return select(
+            Client.id,
+            Client.first_name,
+            Client.last_name,
+            Client.email,
+            Client.phone,
+            Client.birth_date,
+            Client.total_visits,
+            Client.total_spent,
+            Client.last_visit,
+            Client.is_vip,
+            Client.notes,
+            Client.created_at
+        ).where(
+            *self._clients_filters(tenant_id, search, is_vip)
+        ).order_by(Client.created_at, Client.id)
+    
     async def get_client(self, client_id: UUID) -> Optional[Client]:
         result = await self.db.execute(
             select(Client).where(Client.id == client_id)
@@ -76,30 +236,34 @@ class ClientService:
             setattr(client, key, value)
         
         client.updated_at = datetime.utcnow()
-        await self.db.commit()
+        await self._commit_checking_email()
         
         return client
     
-    async def get_client_history(self, client_id: UUID) -> List[dict]:
-        result = await self.db.execute(
-            select(Booking)
-            .where(Booking.client_id == client_id)
-            .order_by(Booking.date.desc())
+    async def get_client_history(
+        self,
+        client_id: UUID,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None,
+        with_total: bool = False
+    ) -> Page:
+        """
+        Страница истории записей клиента, последние первыми (date, id).
+        Только чтение: счетчики клиента ведет ClientStatsService.
+        """
+        page = await paginate(
+            self.db,
+            select(Booking).where(Booking.client_id == client_id),
+            Booking.date,
+            Booking.id,
+            key=lambda booking: (booking.date, booking.id),
+            cursor=cursor,
+            limit=limit,
+            descending=True,
+            with_total=with_total
         )
-        bookings = result.scalars().all()
-        
-        # Update client statistics
-        completed_bookings = [b for b in bookings if b.status == BookingStatus.COMPLETED]
         
-        if completed_bookings:
-            client = await self.get_client(client_id)
-            if client:
-                client.total_visits = len(completed_bookings)
-                client.total_spent = sum(b.price for b in completed_bookings)
-                client.last_visit = max(b.date for b in completed_bookings)
-                await self.db.commit()
-        
-        return [
+        return page._replace(items=[
             {
                 "id": str(b.id),
                 "date": b.date.isoformat(),
@@ -108,8 +272,8 @@ class ClientService:
                 "price": b.price,
                 "status": b.status.value
             }
-            for b in bookings
-        ]
+            for b in page.items
+        ])
     
     async def add_note(self, client_id: UUID, note: str, user_id: UUID) -> None:
         client = await self.get_client(client_id)
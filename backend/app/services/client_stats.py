@@ -0,0 +1,303 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, and_, or_, func, tuple_, bindparam, literal
+from sqlalchemy.dialects.postgresql import insert
+from typing import Dict, Optional, Sequence
+from datetime import datetime
+from uuid import UUID
+
+from app.models.booking import Booking, BookingStatus
+from app.models.client import Client
+from app.models.client_stats import MasterClientStats
+from app.utils.rollup import upsert_from_select
+
+CLIENT_STATUS_COUNTERS = {
+    BookingStatus.COMPLETED: "completed_bookings",
+    BookingStatus.CANCELLED: "cancelled_bookings",
+    BookingStatus.NO_SHOW: "no_show_bookings",
+}
+
+MASTER_CLIENT_COUNTERS = ["total_bookings", *CLIENT_STATUS_COUNTERS.values()]
+
+MASTER_CLIENT_KEY_COLUMNS = ["master_id", "client_id"]
+
+CLIENT_STATS_RECONCILE_BATCH = 1000
+
+COMPLETED = BookingStatus.COMPLETED
+
+
+def _last_visit(client_id, master_id=None, exclude: Sequence[UUID] = ()):
+    """Дата последней завершенной записи клиента (у мастера), без записей exclude"""
+    conditions = [Booking.client_id == client_id, Booking.status == COMPLETED]
+    if master_id is not None:
+        conditions.append(Booking.master_id == master_id)
+    if exclude:
+        conditions.append(Booking.id.notin_(exclude))
+    return select(func.max(Booking.date)).where(and_(*conditions)).scalar_subquery()
+
+
+class ClientStatsService:
+    """
+    Счетчики клиента (clients.total_visits/total_spent/last_visit) и
+    master_client_stats меняются в транзакции изменения записи, поэтому
+    история и списки клиентов только читают готовые значения.
+    Вызывается из BookingStatsService - все места смены статуса уже учтены.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def apply(self, facts, sign: int, booking_id: UUID, visit: Optional[datetime] = None,
+                    count_booking: bool = True) -> None:
+        """
+        Добавить (sign=1) или убрать (sign=-1) вклад записи. visit - время
+        записи для last_visit. Убираемая запись еще не сброшена в БД
+        (autoflush выключен), поэтому last_visit пересчитывается без нее.
+        """
+        completed = facts.status == COMPLETED
+        deltas = {column: 0 for column in MASTER_CLIENT_COUNTERS}
+        if count_booking:
+            deltas["total_bookings"] = sign
+        if facts.status in CLIENT_STATUS_COUNTERS:
+            deltas[CLIENT_STATUS_COUNTERS[facts.status]] = sign
+        if not any(deltas.values()):
+            return
+        spent = sign * facts.price if completed else 0
+        now = datetime.utcnow()
+
+        if sign > 0:
+            stmt = insert(MasterClientStats).values(
+                master_id=facts.master_id,
+                client_id=facts.client_id,
+                tenant_id=facts.tenant_id,
+                total_spent=spent,
+                last_visit=visit if completed else None,
+                updated_at=now,
+                **deltas
+            )
+            update_values = {
+                column: getattr(MasterClientStats, column) + getattr(stmt.excluded, column)
+                for column in MASTER_CLIENT_COUNTERS + ["total_spent"]
+            }
+            update_values["last_visit"] = func.greatest(MasterClientStats.last_visit, stmt.excluded.last_visit)
+            update_values["updated_at"] = stmt.excluded.updated_at
+            await self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[MasterClientStats.master_id, MasterClientStats.client_id],
+                    set_=update_values
+                )
+            )
+        else:
+            values = {
+                column: getattr(MasterClientStats, column) + delta
+                for column, delta in deltas.items() if delta
+            }
+            if completed:
+                values["total_spent"] = MasterClientStats.total_spent + spent
+                values["last_visit"] = _last_visit(facts.client_id, facts.master_id, [booking_id])
+            values["updated_at"] = now
+            await self.db.execute(
+                update(MasterClientStats)
+                .where(
+                    and_(
+                        MasterClientStats.master_id == facts.master_id,
+                        MasterClientStats.client_id == facts.client_id
+                    )
+                )
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+        if completed:
+            await self.db.execute(
+                update(Client)
+                .where(Client.id == facts.client_id)
+                .values(
+                    total_visits=func.coalesce(Client.total_visits, 0) + sign,
+                    total_spent=func.coalesce(Client.total_spent, 0) + spent,
+                    last_visit=(
+                        func.greatest(Client.last_visit, visit) if sign > 0
+                        else _last_visit(facts.client_id, exclude=[booking_id])
+                    )
+                )
+                .execution_options(synchronize_session=False)
+            )
+
+    async def record_booking(self, facts, booking: Booking) -> None:
+        """Учесть новую запись"""
+        await self.apply(facts, 1, booking.id, booking.date)
+
+    async def record_change(self, before, after, booking: Booking) -> None:
+        """Учесть смену статуса, клиента/мастера или цены записи"""
+        moved = (before.master_id, before.client_id) != (after.master_id, after.client_id)
+        await self.apply(before, -1, booking.id, count_booking=moved)
+        await self.apply(after, 1, booking.id, booking.date, count_booking=moved)
+
+    async def apply_transition(self, rows, before: BookingStatus, after: BookingStatus) -> None:
+        """
+        Массовая смена статуса: rows - строки RETURNING с tenant_id, master_id,
+        client_id, date, price. Записи в БД уже изменены, поэтому last_visit
+        при выходе из COMPLETED пересчитывается без исключений.
+        """
+        if before == after:
+            return
+        pairs: Dict[tuple, list] = {}
+        for row in rows:
+            counts = pairs.setdefault((row.master_id, row.client_id, row.tenant_id), [0, 0.0, None])
+            counts[0] += 1
+            counts[1] += row.price or 0
+            counts[2] = max(counts[2], row.date) if counts[2] else row.date
+        if not pairs:
+            return
+
+        sign = 1 if after == COMPLETED else -1 if before == COMPLETED else 0
+        now = datetime.utcnow()
+        values = []
+        for (master_id, client_id, tenant_id), (count, price, visit) in pairs.items():
+            item = {
+                "master_id": master_id,
+                "client_id": client_id,
+                "tenant_id": tenant_id,
+                "total_bookings": 0,
+                "total_spent": sign * price,
+                "last_visit": visit if sign > 0 else None,
+                "updated_at": now,
+            }
+            for status, column in CLIENT_STATUS_COUNTERS.items():
+                item[column] = count if status == after else -count if status == before else 0
+            values.append(item)
+
+        # Пары сгруппированы, поэтому ON CONFLICT не встретит одну строку дважды
+        stmt = insert(MasterClientStats).values(values)
+        update_values = {
+            column: getattr(MasterClientStats, column) + getattr(stmt.excluded, column)
+            for column in MASTER_CLIENT_COUNTERS + ["total_spent"]
+        }
+        update_values["last_visit"] = func.greatest(MasterClientStats.last_visit, stmt.excluded.last_visit)
+        update_values["updated_at"] = stmt.excluded.updated_at
+        await self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[MasterClientStats.master_id, MasterClientStats.client_id],
+                set_=update_values
+            )
+        )
+        if not sign:
+            return
+
+        if sign < 0:
+            await self.db.execute(
+                update(MasterClientStats)
+                .where(tuple_(MasterClientStats.master_id, MasterClientStats.client_id).in_(
+                    [(master_id, client_id) for master_id, client_id, _ in pairs]
+                ))
+                .values(last_visit=_last_visit(MasterClientStats.client_id, MasterClientStats.master_id))
+                .execution_options(synchronize_session=False)
+            )
+
+        clients: Dict[UUID, list] = {}
+        for (_, client_id, _), (count, price, visit) in pairs.items():
+            totals = clients.setdefault(client_id, [0, 0.0, None])
+            totals[0] += count
+            totals[1] += price
+            totals[2] = max(totals[2], visit) if totals[2] else visit
+
+        # executemany одного UPDATE по таблице (не ORM bulk update)
+        clients_table = Client.__table__
+        await self.db.execute(
+            update(clients_table)
+            .where(clients_table.c.id == bindparam("b_client_id"))
+            .values(
+                total_visits=func.coalesce(clients_table.c.total_visits, 0) + bindparam("b_visits"),
+                total_spent=func.coalesce(clients_table.c.total_spent, 0) + bindparam("b_spent"),
+                last_visit=(
+                    func.greatest(clients_table.c.last_visit, bindparam("b_visit", type_=clients_table.c.last_visit.type))
+                    if sign > 0 else _last_visit(clients_table.c.id)
+                )
+            ),
+            [
+                {"b_client_id": client_id, "b_visits": sign * count, "b_spent": sign * price, "b_visit": visit}
+                for client_id, (count, price, visit) in clients.items()
+            ]
+        )
+
+    async def reconcile(self, batch_size: int = CLIENT_STATS_RECONCILE_BATCH) -> int:
+        """
+        Пересчитать счетчики по таблице bookings пачками клиентов (keyset по id),
+        каждая пачка - отдельная транзакция. Возвращает число клиентов, у которых
+        счетчики разошлись с записями.
+        """
+        fixed = 0
+        last_id = None
+        while True:
+            query = select(Client.id).order_by(Client.id).limit(batch_size)
+            if last_id:
+                query = query.where(Client.id > last_id)
+            client_ids = (await self.db.execute(query)).scalars().all()
+            if not client_ids:
+                break
+            last_id = client_ids[-1]
+
+            completed = Booking.status == COMPLETED
+            actual = select(
+                Client.id.label("id"),
+                func.count(Booking.id).filter(completed).label("visits"),
+                func.coalesce(func.sum(Booking.price).filter(completed), 0).label("spent"),
+                func.max(Booking.date).filter(completed).label("last_visit")
+            ).select_from(Client).outerjoin(Booking, Booking.client_id == Client.id).where(
+                Client.id.in_(client_ids)
+            ).group_by(Client.id).subquery()
+
+            # Пишутся только разошедшиеся строки
+            result = await self.db.execute(
+                update(Client)
+                .where(
+                    and_(
+                        Client.id == actual.c.id,
+                        or_(
+                            func.coalesce(Client.total_visits, 0) != actual.c.visits,
+                            func.coalesce(Client.total_spent, 0) != actual.c.spent,
+                            Client.last_visit.is_distinct_from(actual.c.last_visit)
+                        )
+                    )
+                )
+                .values(
+                    total_visits=actual.c.visits,
+                    total_spent=actual.c.spent,
+                    last_visit=actual.c.last_visit
+                )
+                .execution_options(synchronize_session=False)
+            )
+            fixed += result.rowcount
+
+            await self.db.execute(
+                delete(MasterClientStats).where(MasterClientStats.client_id.in_(client_ids))
+            )
+            # Пару, которую record_booking создал после DELETE, перезаписывает пересчет
+            await self.db.execute(
+                upsert_from_select(
+                    MasterClientStats,
+                    ["tenant_id", "master_id", "client_id", *MASTER_CLIENT_COUNTERS,
+                     "total_spent", "last_visit", "updated_at"],
+                    MASTER_CLIENT_KEY_COLUMNS,
+                    select(
+                        Booking.tenant_id,
+                        Booking.master_id,
+                        Booking.client_id,
+                        func.count(Booking.id),
+                        *[
+                            func.count(Booking.id).filter(Booking.status == status)
+                            for status in CLIENT_STATUS_COUNTERS
+                        ],
+                        func.coalesce(func.sum(Booking.price).filter(completed), 0),
+                        func.max(Booking.date).filter(completed),
+                        literal(datetime.utcnow())
+                    ).where(Booking.client_id.in_(client_ids)).group_by(
+                        Booking.tenant_id, Booking.master_id, Booking.client_id
+                    )
+                )
+            )
+            await self.db.commit()
+
+            if len(client_ids) < batch_size:
+                break
+
+        return fixed
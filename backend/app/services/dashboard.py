@@ -1,14 +1,16 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, extract, text
+from sqlalchemy import select, func, and_, extract, text, distinct
 from typing import Optional, List, Dict, Any
 from datetime import datetime, date, timedelta
 from uuid import UUID
 
 from app.models.booking import Booking, BookingStatus
+from app.models.booking_stats import BookingDailyStats
 from app.models.client import Client
 from app.models.master import Master
 from app.models.service import Service
 from app.models.user import UserRole
+from app.services.booking_stats import BookingStatsService
 
 class DashboardService:
     def __init__(self, db: AsyncSession):
@@ -30,8 +32,17 @@ class DashboardService:
         if not date_from:
             date_from = date_to - timedelta(days=30)
         
-        # Base query
-        query = select(Booking).where(
+        # Все счетчики одним агрегирующим запросом
+        query = select(
+            func.count(Booking.id).label('total_bookings'),
+            func.count(Booking.id).filter(Booking.status == BookingStatus.CONFIRMED).label('confirmed_bookings'),
+            func.count(Booking.id).filter(Booking.status == BookingStatus.COMPLETED).label('completed_bookings'),
+            func.count(Booking.id).filter(Booking.status == BookingStatus.CANCELLED).label('cancelled_bookings'),
+            func.coalesce(
+                func.sum(Booking.price).filter(Booking.status == BookingStatus.COMPLETED), 0
+            ).label('total_revenue'),
+            func.count(distinct(Booking.client_id)).label('unique_clients')
+        ).where(
             and_(
                 Booking.tenant_id == tenant_id,
                 Booking.date >= datetime.combine(date_from, datetime.min.time()),
@@ -42,25 +53,21 @@ class DashboardService:
         # Filter by master if user is a master
         if user_role == UserRole.MASTER and user_id:
             master_result = await self.db.execute(
-                select(Master).where(Master.user_id == user_id)
+                select(Master.id).where(Master.user_id == user_id)
             )
-            master = master_result.scalar_one_or_none()
-            if master:
-                query = query.where(Booking.master_id == master.id)
+            master_id = master_result.scalar_one_or_none()
+            if master_id:
+                query = query.where(Booking.master_id == master_id)
         
         result = await self.db.execute(query)
-        bookings = result.scalars().all()
+        row = result.one()
         
-        # Calculate statistics
-        total_bookings = len(bookings)
-        confirmed_bookings = len([b for b in bookings if b.status == BookingStatus.CONFIRMED])
-        completed_bookings = len([b for b in bookings if b.status == BookingStatus.COMPLETED])
-        cancelled_bookings = len([b for b in bookings if b.status == BookingStatus.CANCELLED])
-        
-        total_revenue = sum(b.price for b in bookings if b.status == BookingStatus.COMPLETED)
-        
-        # Get unique clients
-        unique_clients = len(set(b.client_id for b in bookings))
+        total_bookings = row.total_bookings
+        confirmed_bookings = row.confirmed_bookings
+        completed_bookings = row.completed_bookings
+        cancelled_bookings = row.cancelled_bookings
+        total_revenue = float(row.total_revenue)
+        unique_clients = row.unique_clients
         
         return {
             "total_bookings": total_bookings,
@@ -89,7 +96,35 @@ class DashboardService:
         start_of_day = datetime.combine(today, datetime.min.time())
         end_of_day = datetime.combine(today, datetime.max.time())
         
-        query = select(Booking).join(Client).join(Service).where(
+        now = datetime.utcnow()
+        
+        # Записи дня и итоговые счетчики одним запросом: агрегаты считаются
+        # оконными функциями по всему дню, ORM-объекты не создаются
+        query = select(
+            Booking.id,
+            Booking.date,
+            Booking.end_time,
+            Booking.client_id,
+            Booking.service_id,
+            Booking.master_id,
+            Booking.status,
+            Booking.price,
+            Client.first_name,
+            Client.last_name,
+            Service.name.label('service_name'),
+            func.count(Booking.id).over().label('total_count'),
+            func.count(Booking.id).filter(Booking.date > now).over().label('upcoming_count'),
+            func.count(Booking.id).filter(
+                Booking.status == BookingStatus.COMPLETED
+            ).over().label('completed_count'),
+            func.coalesce(
+                func.sum(Booking.price).filter(
+                    Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.COMPLETED])
+                ).over(), 0
+            ).label('expected_revenue')
+        ).join(Client, Booking.client_id == Client.id).join(
+            Service, Booking.service_id == Service.id
+        ).where(
             and_(
                 Booking.tenant_id == tenant_id,
                 Booking.date >= start_of_day,
@@ -100,23 +135,24 @@ class DashboardService:
         # Filter by master if user is a master
         if user_role == UserRole.MASTER and user_id:
             master_result = await self.db.execute(
-                select(Master).where(Master.user_id == user_id)
+                select(Master.id).where(Master.user_id == user_id)
             )
-            master = master_result.scalar_one_or_none()
-            if master:
-                query = query.where(Booking.master_id == master.id)
+            master_id = master_result.scalar_one_or_none()
+            if master_id:
+                query = query.where(Booking.master_id == master_id)
         
         query = query.order_by(Booking.date)
         
         result = await self.db.execute(query)
-        bookings = result.scalars().all()
+        rows = result.all()
+        summary = rows[0] if rows else None
         
         return {
             "date": today.isoformat(),
-            "total_bookings": len(bookings),
-            "upcoming": len([b for b in bookings if b.date > datetime.utcnow()]),
-            "completed": len([b for b in bookings if b.status == BookingStatus.COMPLETED]),
-            "expected_revenue": sum(b.price for b in bookings if b.status in [BookingStatus.CONFIRMED, BookingStatus.COMPLETED]),
+            "total_bookings": summary.total_count if summary else 0,
+            "upcoming": summary.upcoming_count if summary else 0,
+            "completed": summary.completed_count if summary else 0,
+            "expected_revenue": float(summary.expected_revenue) if summary else 0,
             "bookings": [
                 {
                     "id": str(b.id),
@@ -124,15 +160,15 @@ class DashboardService:
                     "end_time": b.end_time.isoformat(),
                     "time": b.date.strftime("%H:%M"),
                     "client_id": str(b.client_id),
-                    "client_name": f"{b.client.first_name} {b.client.last_name}".strip() or "Unknown Client",
+                    "client_name": f"{b.first_name} {b.last_name}".strip() or "Unknown Client",
                     "service_id": str(b.service_id),
-                    "service_name": b.service.name or "Unknown Service",
+                    "service_name": b.service_name or "Unknown Service",
                     "master_id": str(b.master_id),
                     "status": b.status.value,
                     "price": b.price,
                     "duration": int((b.end_time - b.date).total_seconds() / 60)
                 }
-                for b in bookings
+                for b in rows
             ]
         }
     
@@ -158,51 +194,44 @@ class DashboardService:
             else:  # year
                 date_from = date_to - timedelta(days=365 * 5)
         
-        # Простая реализация - возвращаем данные за последние 30 дней
+        # Дневные итоги из агрегатов, затем суммирование по периодам
+        daily = await BookingStatsService(self.db).get_revenue_by_day(
+            date_from, date_to, tenant_id=tenant_id
+        )
+        
         revenue_data = []
         current_date = date_from
+        index = 0
         
         while current_date <= date_to:
-            # Получаем записи за день
-            start_of_day = datetime.combine(current_date, datetime.min.time())
-            end_of_day = datetime.combine(current_date, datetime.max.time())
-            
-            result = await self.db.execute(
-                select(
-                    func.count(Booking.id).label('bookings_count'),
-                    func.sum(Booking.price).label('revenue')
-                )
-                .where(
-                    and_(
-                        Booking.tenant_id == tenant_id,
-                        Booking.status == BookingStatus.COMPLETED,
-                        Booking.date >= start_of_day,
-                        Booking.date <= end_of_day
-                    )
-                )
-            )
-            
-            row = result.one()
-            
-            revenue_data.append({
-                "period": current_date.isoformat(),
-                "bookings_count": row.bookings_count or 0,
-                "revenue": float(row.revenue) if row.revenue else 0
-            })
-            
             # Increment based on period
             if period == "day":
-                current_date += timedelta(days=1)
+                next_date = current_date + timedelta(days=1)
             elif period == "week":
-                current_date += timedelta(weeks=1)
+                next_date = current_date + timedelta(weeks=1)
             elif period == "month":
                 # Move to next month
                 if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
+                    next_date = current_date.replace(year=current_date.year + 1, month=1)
                 else:
-                    current_date = current_date.replace(month=current_date.month + 1)
+                    next_date = current_date.replace(month=current_date.month + 1)
             else:  # year
-                current_date = current_date.replace(year=current_date.year + 1)
+                next_date = current_date.replace(year=current_date.year + 1)
+            
+            bookings_count = 0
+            revenue = 0.0
+            while index < len(daily) and daily[index]["day"] < next_date:
+                bookings_count += daily[index]["bookings_count"]
+                revenue += daily[index]["revenue"]
+                index += 1
+            
+            revenue_data.append({
+                "period": current_date.isoformat(),
+                "bookings_count": bookings_count,
+                "revenue": revenue
+            })
+            
+            current_date = next_date
         
         return revenue_data
     
@@ -223,21 +252,22 @@ class DashboardService:
             select(
                 Master.id,
                 Master.display_name,
-                func.count(Booking.id).label('bookings_count'),
-                func.sum(Booking.price).label('revenue'),
+                func.sum(BookingDailyStats.completed_count).label('bookings_count'),
+                func.sum(BookingDailyStats.revenue).label('revenue'),
                 Master.rating
             )
-            .join(Booking, Master.id == Booking.master_id, isouter=True)
+            .join(BookingDailyStats, Master.id == BookingDailyStats.master_id)
             .where(
                 and_(
                     Master.tenant_id == tenant_id,
-                    Booking.status == BookingStatus.COMPLETED,
-                    Booking.date >= datetime.combine(date_from, datetime.min.time()),
-                    Booking.date <= datetime.combine(date_to, datetime.max.time())
+                    BookingDailyStats.tenant_id == tenant_id,
+                    BookingDailyStats.day >= date_from,
+                    BookingDailyStats.day <= date_to
                 )
             )
             .group_by(Master.id, Master.display_name, Master.rating)
-            .order_by(func.sum(Booking.price).desc().nullslast())
+            .having(func.sum(BookingDailyStats.completed_count) > 0)
+            .order_by(func.sum(BookingDailyStats.revenue).desc().nullslast())
         )
         
         rows = result.all()
@@ -265,18 +295,19 @@ class DashboardService:
                 Service.id,
                 Service.name,
                 Service.price,
-                func.count(Booking.id).label('bookings_count'),
-                func.sum(Booking.price).label('revenue')
+                func.sum(BookingDailyStats.completed_count).label('bookings_count'),
+                func.sum(BookingDailyStats.revenue).label('revenue')
             )
-            .join(Booking, Service.id == Booking.service_id, isouter=True)
+            .join(BookingDailyStats, Service.id == BookingDailyStats.service_id)
             .where(
                 and_(
                     Service.tenant_id == tenant_id,
-                    Booking.status == BookingStatus.COMPLETED
+                    BookingDailyStats.tenant_id == tenant_id
                 )
             )
             .group_by(Service.id, Service.name, Service.price)
-            .order_by(func.count(Booking.id).desc())
+            .having(func.sum(BookingDailyStats.completed_count) > 0)
+            .order_by(func.sum(BookingDailyStats.completed_count).desc())
             .limit(limit)
         )
         
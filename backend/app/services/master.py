@@ -1,17 +1,22 @@
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, delete, text
+from sqlalchemy import select, and_, delete
 from typing import Optional, List
 from datetime import date, datetime
 from uuid import UUID
 import secrets
-from app.utils.email import EmailService
+from app.utils import availability_cache
+from app.utils.principal_cache import bump_principal
+from app.utils.tenant_resolver import get_tenant_by_id
 from app.models.master import Master, MasterSchedule, MasterService
 from app.models.block_time import BlockTime
 from app.models.user import User, UserRole
 from app.schemas.master import MasterCreate, MasterUpdate
+from app.services.outbox import OutboxService
 from passlib.context import CryptContext
 
-from app.models.tenant import Tenant
+logger = logging.getLogger(__name__)
+
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -47,7 +52,7 @@ class MasterService:
                 self.db.add(user)
                 await self.db.flush()
                 
-                print(f"✅ Created user for master with temp password: {temp_password}")
+                logger.info("Created user for master %s", master_data['user_email'])
             
             user_id = user.id
         else:
@@ -91,36 +96,26 @@ class MasterService:
                 )
                 self.db.add(schedule)
         
+        # 🚀 ИСПРАВЛЕНО: Отправляем приглашение мастеру (письмо уйдет вместе с коммитом)
+        if 'user_email' in master_data and temp_password:
+            # Получаем информацию о тенанте для названия заведения
+            tenant = await get_tenant_by_id(tenant_id, self.db)
+            barbershop_name = tenant.name if tenant else "Barbershop"
+            
+            OutboxService(self.db).enqueue(
+                "master_welcome",
+                {
+                    "to_email": master_data['user_email'],
+                    "master_name": user.first_name or master_data['user_email'],
+                    "barbershop_name": barbershop_name,
+                    "temp_password": temp_password
+                },
+                tenant_id=tenant_id
+            )
+        
         await self.db.commit()
         await self.db.refresh(master)
-        
-        # 🚀 ИСПРАВЛЕНО: Отправляем приглашение мастеру
-        if temp_password and 'user_email' in master_data:
-            try:
-                # Получаем информацию о тенанте для названия заведения
-                tenant_result = await self.db.execute(
-                    select(Tenant).where(Tenant.id == tenant_id)
-                )
-                tenant = tenant_result.scalar_one_or_none()
-                barbershop_name = tenant.name if tenant else "Barbershop"
-                
-                # Отправляем email
-                email_service = EmailService()
-                success = await email_service.send_master_welcome_email(
-                    to_email=master_data['user_email'],
-                    master_name=user.first_name or master_data['user_email'],
-                    barbershop_name=barbershop_name,
-                    temp_password=temp_password
-                )
-                
-                if success:
-                    print(f"✅ Welcome email sent to {master_data['user_email']}")
-                else:
-                    print(f"⚠️ Failed to send welcome email to {master_data['user_email']}")
-                    
-            except Exception as e:
-                print(f"❌ Error sending welcome email: {e}")
-                # Не фейлим создание мастера из-за ошибки email
+        await bump_principal(master.user_id)
         
         return master
 
@@ -162,6 +157,7 @@ class MasterService:
         
         master.updated_at = datetime.utcnow()
         await self.db.commit()
+        await bump_principal(master.user_id)
         
         return master
     
@@ -172,6 +168,7 @@ class MasterService:
             master.is_active = False
             master.is_visible = False
             await self.db.commit()
+            await bump_principal(master.user_id)
     
     async def get_schedule(
         self,
@@ -236,6 +233,7 @@ class MasterService:
                 self.db.add(schedule)
             
             await self.db.commit()
+            await availability_cache.invalidate_master(master_id)
             return True
             
         except Exception as e:
@@ -266,6 +264,8 @@ class MasterService:
             await self.db.commit()
             await self.db.refresh(block_time)
             
+            await availability_cache.invalidate_range(master_id, start_time, end_time)
+            
             return {
                 "id": str(block_time.id),
                 "start_time": block_time.start_time.isoformat(),
@@ -299,28 +299,22 @@ class MasterService:
         ]
     
     async def get_master_clients(self, master_id: UUID) -> List[dict]:
-        """Получить клиентов мастера"""
-        from app.models.booking import Booking, BookingStatus
+        """Получить клиентов мастера (счетчики из master_client_stats)"""
         from app.models.client import Client
+        from app.models.client_stats import MasterClientStats
         
-        # Получаем уникальных клиентов мастера с статистикой
-        query = """
-        SELECT 
-            c.*,
-            COUNT(b.id) as total_bookings,
-            COUNT(CASE WHEN b.status = 'completed' THEN 1 END) as completed_bookings,
-            COUNT(CASE WHEN b.status = 'cancelled' THEN 1 END) as cancelled_bookings,
-            COALESCE(SUM(CASE WHEN b.status = 'completed' THEN b.price ELSE 0 END), 0) as total_spent,
-            MAX(CASE WHEN b.status = 'completed' THEN b.date END) as last_booking_date
-        FROM clients c
-        JOIN bookings b ON c.id = b.client_id
-        WHERE b.master_id = :master_id
-        GROUP BY c.id
-        ORDER BY total_bookings DESC
-        """
-        
-        result = await self.db.execute(text(query), {"master_id": master_id})
-        clients = result.fetchall()
+        result = await self.db.execute(
+            select(Client, MasterClientStats)
+            .join(MasterClientStats, MasterClientStats.client_id == Client.id)
+            .where(
+                and_(
+                    MasterClientStats.master_id == master_id,
+                    # Пара с 0 записей остается после переноса записи до reconcile
+                    MasterClientStats.total_bookings > 0
+                )
+            )
+            .order_by(MasterClientStats.total_bookings.desc(), Client.id)
+        )
         
         return [
             {
@@ -329,14 +323,14 @@ class MasterService:
                 "last_name": client.last_name,
                 "email": client.email,
                 "phone": client.phone,
-                "total_bookings": client.total_bookings,
-                "completed_bookings": client.completed_bookings,
-                "cancelled_bookings": client.cancelled_bookings,
-                "total_spent": float(client.total_spent),
-                "last_booking_date": client.last_booking_date.isoformat() if client.last_booking_date else None,
+                "total_bookings": stats.total_bookings,
+                "completed_bookings": stats.completed_bookings,
+                "cancelled_bookings": stats.cancelled_bookings,
+                "total_spent": float(stats.total_spent),
+                "last_booking_date": stats.last_visit.isoformat() if stats.last_visit else None,
                 "created_at": client.created_at.isoformat()
             }
-            for client in clients
+            for client, stats in result.all()
         ]
     
     async def update_master_services(self, master_id: UUID, service_ids: List[UUID]) -> None:
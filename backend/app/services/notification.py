@@ -1,7 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import datetime
+from typing import Dict, Iterable, Optional
 from uuid import UUID
 
 from app.models.notification import Notification, NotificationType, NotificationTemplate
@@ -11,7 +11,47 @@ from app.models.tenant import Tenant
 from app.models.master import Master
 from app.models.service import Service
 from app.utils.email import EmailService
-from app.celery_app import celery_app
+
+# Размер IN-списка одного запроса данных для писем
+DETAILS_CHUNK_SIZE = 1000
+
+
+class BookingDetails:
+    """Данные записи для писем; пачка напоминаний может содержать тысячи таких объектов"""
+    __slots__ = (
+        'booking_id', 'booking_datetime', 'booking_date', 'booking_time',
+        'client_email', 'client_name', 'barbershop_name', 'barbershop_address',
+        'barbershop_phone', 'master_name', 'service_name', 'price',
+        'confirmation_link', 'cancellation_link',
+    )
+    
+    def __init__(self, **values):
+        for field in self.__slots__:
+            setattr(self, field, values[field])
+    
+    @classmethod
+    def from_row(cls, row) -> "BookingDetails":
+        base_url = f"https://{row.tenant_subdomain}.jazyl.tech/booking"
+        return cls(
+            booking_id=str(row.id),
+            booking_datetime=row.date,
+            booking_date=row.date.strftime('%Y-%m-%d'),
+            booking_time=row.date.strftime('%H:%M'),
+            client_email=row.client_email,
+            client_name=f"{row.client_first_name} {row.client_last_name or ''}".strip(),
+            barbershop_name=row.tenant_name,
+            barbershop_address=row.tenant_address,
+            barbershop_phone=row.tenant_phone,
+            master_name=row.master_name,
+            service_name=row.service_name,
+            price=row.price,
+            confirmation_link=f"{base_url}/confirm/{row.id}?token={row.confirmation_token}",
+            cancellation_link=f"{base_url}/cancel/{row.id}?token={row.cancellation_token}"
+        )
+    
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
 
 class NotificationService:
     def __init__(self, db: AsyncSession):
@@ -20,7 +60,7 @@ class NotificationService:
     
     async def send_booking_confirmation(self, booking_id: UUID) -> None:
         # Get booking details
-        booking = await self._get_booking_with_details(booking_id)
+        booking = await self.get_booking_details(booking_id)
         if not booking:
             return
         
@@ -41,39 +81,46 @@ class NotificationService:
         )
         
         # Create notification record
-        notification = Notification(
+        self.db.add(self.confirmation_record(booking))
+        await self.db.commit()
+    
+    @staticmethod
+    def confirmation_record(booking: dict) -> Notification:
+        """Запись об отправленном подтверждении (booking - из get_booking_details)"""
+        return Notification(
             user_id=None,  # For client, might not have user account
             type=NotificationType.BOOKING_CONFIRMATION,
             title="Booking Confirmation",
             content=f"Your booking for {booking['service_name']} on {booking['booking_date']} at {booking['booking_time']} has been created.",
             is_sent=True,
             sent_at=datetime.utcnow(),
-            meta_data={"booking_id": str(booking_id)}
+            meta_data={"booking_id": booking['booking_id']}
         )
-        
-        self.db.add(notification)
-        await self.db.commit()
     
     async def send_booking_reminder(self, booking_id: UUID, hours_before: int = 24) -> None:
-        booking = await self._get_booking_with_details(booking_id)
+        booking = await self.get_booking_details(booking_id)
         if not booking:
             return
         
         # Send email
-        await self.email_service.send_booking_reminder(
-            to_email=booking['client_email'],
-            client_name=booking['client_name'],
-            barbershop_name=booking['barbershop_name'],
-            master_name=booking['master_name'],
-            service_name=booking['service_name'],
-            booking_date=booking['booking_date'],
-            booking_time=booking['booking_time'],
-            hours_before=hours_before,
-            cancellation_link=booking['cancellation_link']
-        )
+        await self.email_service.send_booking_reminder(**self._reminder_kwargs(booking, hours_before))
+    
+    @staticmethod
+    def _reminder_kwargs(booking: dict, hours_before: int) -> dict:
+        return {
+            'to_email': booking['client_email'],
+            'client_name': booking['client_name'],
+            'barbershop_name': booking['barbershop_name'],
+            'master_name': booking['master_name'],
+            'service_name': booking['service_name'],
+            'booking_date': booking['booking_date'],
+            'booking_time': booking['booking_time'],
+            'hours_before': hours_before,
+            'cancellation_link': booking['cancellation_link']
+        }
     
     async def send_booking_cancellation(self, booking_id: UUID) -> None:
-        booking = await self._get_booking_with_details(booking_id)
+        booking = await self.get_booking_details(booking_id)
         if not booking:
             return
         
@@ -87,62 +134,47 @@ class NotificationService:
             booking_time=booking['booking_time']
         )
     
-    async def schedule_reminder(self, booking_id: UUID) -> None:
-        booking = await self._get_booking_with_details(booking_id)
-        if not booking:
-            return
-        
-        # Schedule reminder 24 hours before
-        remind_at = booking['booking_datetime'] - timedelta(hours=24)
-        if remind_at > datetime.utcnow():
-            celery_app.send_task(
-                'app.tasks.send_reminder',
-                args=[str(booking_id), 24],
-                eta=remind_at
-            )
-        
-        # Schedule reminder 2 hours before
-        remind_at = booking['booking_datetime'] - timedelta(hours=2)
-        if remind_at > datetime.utcnow():
-            celery_app.send_task(
-                'app.tasks.send_reminder',
-                args=[str(booking_id), 2],
-                eta=remind_at
-            )
+    async def get_booking_details(self, booking_id: UUID) -> Optional[dict]:
+        details = await self.get_booking_details_bulk([booking_id])
+        booking = details.get(booking_id)
+        return booking.as_dict() if booking else None
     
-    async def _get_booking_with_details(self, booking_id: UUID) -> Optional[dict]:
-        # Get booking with all related data
-        result = await self.db.execute(
-            select(Booking)
-            .where(Booking.id == booking_id)
-        )
-        booking = result.scalar_one_or_none()
-        
-        if not booking:
-            return None
-        
-        # Get related data
-        client = await self.db.get(Client, booking.client_id)
-        tenant = await self.db.get(Tenant, booking.tenant_id)
-        master = await self.db.get(Master, booking.master_id)
-        service = await self.db.get(Service, booking.service_id)
+    async def get_booking_details_bulk(self, booking_ids: Iterable[UUID]) -> Dict[UUID, BookingDetails]:
+        """
+        Данные для писем по списку записей: один запрос с join на пачку id
+        вместо пяти запросов на каждую запись. Записи без клиента, салона,
+        мастера или услуги в результат не попадают.
+        """
+        booking_ids = list(dict.fromkeys(booking_ids))
+        details = {}
         
-        if not all([client, tenant, master, service]):
-            return None
+        for start in range(0, len(booking_ids), DETAILS_CHUNK_SIZE):
+            chunk = booking_ids[start:start + DETAILS_CHUNK_SIZE]
+            result = await self.db.execute(
+                select(
+                    Booking.id,
+                    Booking.date,
+                    Booking.price,
+                    Booking.confirmation_token,
+                    Booking.cancellation_token,
+                    Client.email.label('client_email'),
+                    Client.first_name.label('client_first_name'),
+                    Client.last_name.label('client_last_name'),
+                    Tenant.name.label('tenant_name'),
+                    Tenant.address.label('tenant_address'),
+                    Tenant.phone.label('tenant_phone'),
+                    Tenant.subdomain.label('tenant_subdomain'),
+                    Master.display_name.label('master_name'),
+                    Service.name.label('service_name')
+                )
+                .join(Client, Client.id == Booking.client_id)
+                .join(Tenant, Tenant.id == Booking.tenant_id)
+                .join(Master, Master.id == Booking.master_id)
+                .join(Service, Service.id == Booking.service_id)
+                .where(Booking.id.in_(chunk))
+            )
+            for row in result.all():
+                details[row.id] = BookingDetails.from_row(row)
         
-        return {
-            'booking_id': str(booking.id),
-            'booking_datetime': booking.date,
-            'booking_date': booking.date.strftime('%Y-%m-%d'),
-            'booking_time': booking.date.strftime('%H:%M'),
-            'client_email': client.email,
-            'client_name': f"{client.first_name} {client.last_name or ''}".strip(),
-            'barbershop_name': tenant.name,
-            'barbershop_address': tenant.address,
-            'barbershop_phone': tenant.phone,
-            'master_name': master.display_name,
-            'service_name': service.name,
-            'price': booking.price,
-            'confirmation_link': f"https://{tenant.subdomain}.jazyl.tech/booking/confirm/{booking.id}?token={booking.confirmation_token}",
-            'cancellation_link': f"https://{tenant.subdomain}.jazyl.tech/booking/cancel/{booking.id}?token={booking.cancellation_token}"
-        }
+        return details
+
@@ -0,0 +1,243 @@
+import logging
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, and_
+from typing import Dict, Optional, List, Tuple
+from datetime import datetime, timedelta
+from uuid import UUID
+import asyncio
+
+from app.config import settings
+from app.models.booking import Booking
+from app.models.notification_outbox import NotificationOutbox, OutboxStatus, DISPATCHABLE_OUTBOX_STATUSES
+from app.services.notification import NotificationService, BookingDetails
+from app.utils.email import EmailService
+
+logger = logging.getLogger(__name__)
+
+# Тип письма -> метод EmailService
+EMAIL_METHODS = {
+    "verification_email": "send_verification_email",
+    "password_reset": "send_password_reset",
+    "master_welcome": "send_master_welcome_email",
+    "booking_verification_code": "send_booking_verification_email",
+    "booking_confirmation": "send_booking_confirmation",
+    "booking_reminder": "send_booking_reminder",
+    "booking_cancellation": "send_booking_cancellation",
+}
+
+# Письма о записи собираются при отправке из актуальных данных записи,
+# в payload хранится только booking_id (и доп. параметры, например hours_before)
+BOOKING_EMAIL_KINDS = {"booking_confirmation", "booking_reminder", "booking_cancellation"}
+
+# Пароли, токены и коды не хранятся в таблице после отправки
+SENSITIVE_EMAIL_KINDS = {"verification_email", "password_reset", "master_welcome", "booking_verification_code"}
+
+
+class UndeliverableError(Exception):
+    """Письмо невозможно собрать (например, запись удалена) - повтор не поможет"""
+    pass
+
+
+class OutboxService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        tenant_id: Optional[UUID] = None,
+        available_at: Optional[datetime] = None
+    ) -> NotificationOutbox:
+        """Добавить письмо в текущую транзакцию (коммитит вызывающий)"""
+        if kind not in EMAIL_METHODS:
+            raise ValueError(f"Unknown notification kind: {kind}")
+
+        item = NotificationOutbox(
+            tenant_id=tenant_id,
+            kind=kind,
+            payload=payload,
+            status=OutboxStatus.PENDING,
+            attempts=0,
+            available_at=available_at or datetime.utcnow()
+        )
+        self.db.add(item)
+        return item
+
+    def enqueue_booking_email(self, kind: str, booking: Booking, **extra) -> NotificationOutbox:
+        return self.enqueue(
+            kind,
+            {"booking_id": str(booking.id), **extra},
+            tenant_id=booking.tenant_id
+        )
+
+    async def claim_batch(self, limit: int) -> List[Tuple[UUID, str, dict, int]]:
+        """
+        Забрать до limit готовых к отправке писем. Строки, заблокированные
+        другим диспетчером, пропускаются (SKIP LOCKED); забранные получают
+        аренду OUTBOX_LEASE, после которой их заберет другой диспетчер,
+        если этот упал.
+        """
+        now = datetime.utcnow()
+        due = select(NotificationOutbox.id).where(
+            and_(
+                NotificationOutbox.status.in_(DISPATCHABLE_OUTBOX_STATUSES),
+                NotificationOutbox.available_at <= now
+            )
+        ).order_by(NotificationOutbox.available_at).limit(limit).with_for_update(skip_locked=True)
+
+        result = await self.db.execute(
+            update(NotificationOutbox)
+            .where(NotificationOutbox.id.in_(due.scalar_subquery()))
+            .values(
+                status=OutboxStatus.SENDING,
+                attempts=NotificationOutbox.attempts + 1,
+                available_at=now + timedelta(seconds=settings.OUTBOX_LEASE)
+            )
+            .returning(
+                NotificationOutbox.id,
+                NotificationOutbox.kind,
+                NotificationOutbox.payload,
+                NotificationOutbox.attempts
+            )
+            .execution_options(synchronize_session=False)
+        )
+        claimed = [tuple(row) for row in result.all()]
+        await self.db.commit()
+        return claimed
+
+    @staticmethod
+    def _prepare(kind: str, payload: dict, bookings: Dict[UUID, BookingDetails]) -> dict:
+        """Аргументы метода EmailService для письма"""
+        if kind not in BOOKING_EMAIL_KINDS:
+            return payload
+
+        booking = bookings.get(UUID(payload["booking_id"]))
+        if not booking:
+            raise UndeliverableError(f"Booking {payload['booking_id']} not found")
+
+        extra = {key: value for key, value in payload.items() if key != "booking_id"}
+        return {**booking.as_dict(), "to_email": booking.client_email, **extra}
+
+    async def dispatch_batch(self, limit: int) -> Tuple[int, int]:
+        """
+        Отправить одну пачку: письма уходят параллельно (ограничение -
+        размер пула SMTP), результаты записываются одной транзакцией.
+        Возвращает (забрано, отправлено).
+        """
+        claimed = await self.claim_batch(limit)
+        if not claimed:
+            return 0, 0
+
+        # Данные всех записей пачки - одним запросом
+        booking_ids = [
+            UUID(payload["booking_id"]) for _, kind, payload, _ in claimed if kind in BOOKING_EMAIL_KINDS
+        ]
+        bookings = await NotificationService(self.db).get_booking_details_bulk(booking_ids) if booking_ids else {}
+
+        prepared = []
+        for item_id, kind, payload, attempts in claimed:
+            try:
+                prepared.append((item_id, kind, attempts, self._prepare(kind, payload, bookings), None))
+            except Exception as e:
+                prepared.append((item_id, kind, attempts, None, e))
+
+        email_service = EmailService(raise_errors=True)
+
+        async def deliver(kind: str, kwargs: Optional[dict], error: Optional[Exception]) -> None:
+            if error:
+                raise error
+            await getattr(email_service, EMAIL_METHODS[kind])(**kwargs)
+
+        # Напоминания уходят одной пачкой: шаблон рендерится за один проход
+        reminders = [
+            index for index, (_, kind, _, _, error) in enumerate(prepared)
+            if kind == "booking_reminder" and error is None
+        ]
+
+        async def deliver_reminders() -> list:
+            if not reminders:
+                return []
+            try:
+                return await email_service.send_booking_reminders([prepared[index][3] for index in reminders])
+            except Exception as e:
+                return [e] * len(reminders)
+
+        single_results, reminder_results = await asyncio.gather(
+            asyncio.gather(
+                *[
+                    deliver(kind, kwargs, error)
+                    for index, (_, kind, _, kwargs, error) in enumerate(prepared)
+                    if index not in reminders
+                ],
+                return_exceptions=True
+            ),
+            deliver_reminders()
+        )
+        single_results = iter(single_results)
+        reminder_results = dict(zip(reminders, reminder_results))
+        results = [
+            reminder_results[index] if index in reminder_results else next(single_results)
+            for index in range(len(prepared))
+        ]
+
+        now = datetime.utcnow()
+        sent_ids, sensitive_ids = [], []
+        for (item_id, kind, attempts, kwargs, _), result in zip(prepared, results):
+            if not isinstance(result, Exception):
+                sent_ids.append(item_id)
+                if kind in SENSITIVE_EMAIL_KINDS:
+                    sensitive_ids.append(item_id)
+                if kind == "booking_confirmation":
+                    self.db.add(NotificationService.confirmation_record(kwargs))
+                continue
+
+            values = {"last_error": f"{type(result).__name__}: {result}"[:1000]}
+            if isinstance(result, UndeliverableError) or attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+                values["status"] = OutboxStatus.DEAD
+                # DEAD не удаляется purge_sent: пароли, токены и коды в нем не храним,
+                # для разбора остаются kind и last_error
+                if kind in SENSITIVE_EMAIL_KINDS:
+                    values["payload"] = {}
+                logger.error("Notification %s (%s) moved to dead letter: %s", item_id, kind, result)
+            else:
+                values["status"] = OutboxStatus.PENDING
+                values["available_at"] = now + retry_delay(attempts)
+            await self.db.execute(
+                update(NotificationOutbox).where(NotificationOutbox.id == item_id).values(**values)
+            )
+
+        if sent_ids:
+            await self.db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(sent_ids))
+                .values(status=OutboxStatus.SENT, sent_at=now, last_error=None)
+            )
+        if sensitive_ids:
+            await self.db.execute(
+                update(NotificationOutbox)
+                .where(NotificationOutbox.id.in_(sensitive_ids))
+                .values(payload={})
+            )
+        await self.db.commit()
+
+        return len(claimed), len(sent_ids)
+
+    async def purge_sent(self, older_than: datetime) -> int:
+        """Удалить отправленные письма старше older_than (DEAD остаются для разбора)"""
+        result = await self.db.execute(
+            delete(NotificationOutbox).where(
+                and_(
+                    NotificationOutbox.status == OutboxStatus.SENT,
+                    NotificationOutbox.sent_at < older_than
+                )
+            )
+        )
+        await self.db.commit()
+        return result.rowcount
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Экспоненциальная пауза перед повтором: base, 2*base, 4*base, ... не больше max"""
+    seconds = settings.OUTBOX_RETRY_DELAY * 2 ** max(attempts - 1, 0)
+    return timedelta(seconds=min(seconds, settings.OUTBOX_RETRY_MAX_DELAY))
@@ -7,6 +7,7 @@ from datetime import datetime
 from app.models.permission_request import PermissionRequest, PermissionRequestStatus, PermissionRequestType
 from app.models.master import Master
 from app.models.user import User
+from app.utils.principal_cache import bump_principal
 
 class PermissionRequestService:
     def __init__(self, db: AsyncSession):
@@ -111,6 +112,8 @@ class PermissionRequestService:
                 master.updated_at = datetime.utcnow()
         
         await self.db.commit()
+        if master:
+            await bump_principal(master.user_id)
         return True
     
     async def reject_request(
@@ -0,0 +1,115 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, and_, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from typing import Tuple
+from datetime import datetime, timedelta
+
+from app.models.booking import Booking, BookingStatus
+from app.models.reminder import ReminderSchedule
+from app.services.outbox import OutboxService
+
+# За сколько часов до записи напоминать
+REMINDER_HOURS_BEFORE = (24, 2)
+
+
+class ReminderService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def sync(self, booking: Booking) -> None:
+        """
+        Привести напоминания записи в соответствие с ее статусом и временем.
+        Выполняется в транзакции изменения записи, без коммита.
+        """
+        now = datetime.utcnow()
+        due = {}
+        if booking.status == BookingStatus.CONFIRMED:
+            due = {
+                hours: booking.date - timedelta(hours=hours)
+                for hours in REMINDER_HOURS_BEFORE
+                if booking.date - timedelta(hours=hours) > now
+            }
+
+        # Неотправленные напоминания, которые больше не нужны
+        stale = delete(ReminderSchedule).where(
+            and_(
+                ReminderSchedule.booking_id == booking.id,
+                ReminderSchedule.sent_at.is_(None)
+            )
+        )
+        if due:
+            stale = stale.where(ReminderSchedule.hours_before.notin_(list(due)))
+        await self.db.execute(stale)
+
+        if not due:
+            return
+
+        stmt = insert(ReminderSchedule).values([
+            {"booking_id": booking.id, "hours_before": hours, "due_at": due_at, "created_at": now}
+            for hours, due_at in due.items()
+        ])
+        # Перенос записи планирует напоминание заново; то же время - уже отправленное не повторяется
+        await self.db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["booking_id", "hours_before"],
+                set_={"due_at": stmt.excluded.due_at, "sent_at": None},
+                where=ReminderSchedule.due_at != stmt.excluded.due_at
+            )
+        )
+
+    async def dispatch_due(self, limit: int) -> Tuple[int, int]:
+        """
+        Передать до limit наступивших напоминаний в notification_outbox и
+        поставить метку sent_at - в одной транзакции, поэтому каждое
+        напоминание попадает в outbox ровно один раз. Параллельные вызовы
+        пропускают чужие строки (SKIP LOCKED). Возвращает (забрано, поставлено).
+        """
+        now = datetime.utcnow()
+        result = await self.db.execute(
+            select(
+                ReminderSchedule.booking_id,
+                ReminderSchedule.hours_before,
+                Booking.tenant_id,
+                Booking.status,
+                Booking.date
+            )
+            .join(Booking, Booking.id == ReminderSchedule.booking_id)
+            .where(
+                and_(
+                    ReminderSchedule.sent_at.is_(None),
+                    ReminderSchedule.due_at <= now
+                )
+            )
+            .order_by(ReminderSchedule.due_at)
+            .limit(limit)
+            .with_for_update(of=ReminderSchedule, skip_locked=True)
+        )
+        rows = result.all()
+        if not rows:
+            return 0, 0
+
+        outbox = OutboxService(self.db)
+        queued = 0
+        for row in rows:
+            # Запись отменили или она уже прошла - напоминание просто закрывается
+            if row.status != BookingStatus.CONFIRMED or row.date <= now:
+                continue
+            outbox.enqueue(
+                "booking_reminder",
+                {"booking_id": str(row.booking_id), "hours_before": row.hours_before},
+                tenant_id=row.tenant_id
+            )
+            queued += 1
+
+        await self.db.execute(
+            update(ReminderSchedule)
+            .where(
+                tuple_(ReminderSchedule.booking_id, ReminderSchedule.hours_before).in_(
+                    [(row.booking_id, row.hours_before) for row in rows]
+                )
+            )
+            .values(sent_at=now)
+        )
+        await self.db.commit()
+
+        return len(rows), queued
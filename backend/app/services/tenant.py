@@ -5,6 +5,7 @@ from uuid import UUID
 
 from app.models.tenant import Tenant
 from app.schemas.tenant import TenantCreate, TenantUpdate
+from app.utils import tenant_resolver
 
 class TenantService:
     def __init__(self, db: AsyncSession):
@@ -15,6 +16,9 @@ class TenantService:
         self.db.add(tenant)
         await self.db.commit()
         await self.db.refresh(tenant)
+        
+        # Поддомен мог быть закэширован как несуществующий
+        await tenant_resolver.invalidate_tenant(tenant.id, tenant.subdomain)
         return tenant
     
     async def get_tenant(self, tenant_id: UUID) -> Optional[Tenant]:
@@ -41,6 +45,8 @@ class TenantService:
         )
         await self.db.commit()
         
+        await tenant_resolver.invalidate_tenant(tenant_id, update_data.get("subdomain"))
+        
         return await self.get_tenant(tenant_id)
     
     async def delete_tenant(self, tenant_id: UUID) -> None:
@@ -49,4 +55,6 @@ class TenantService:
             .where(Tenant.id == tenant_id)
             .values(is_active=False)
         )
-        await self.db.commit()
\ No newline at end of file
+        await self.db.commit()
+        
+        await tenant_resolver.invalidate_tenant(tenant_id)
\ No newline at end of file
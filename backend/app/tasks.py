@@ -1,39 +1,66 @@
+import logging
 from celery import shared_task
 from datetime import datetime, timedelta
-from sqlalchemy import select, and_
 from app.database import AsyncSessionLocal
-from app.models.booking import Booking, BookingStatus
-from app.services.notification import NotificationService
-import asyncio
+from app.services.booking_lifecycle import BookingLifecycleService
+from app.services.booking_stats import BookingStatsService
+from app.services.client_stats import ClientStatsService
+from app.services.outbox import OutboxService
+from app.services.reminders import ReminderService
+from app.config import settings
+from app.worker import worker_runtime
+import time
+
+logger = logging.getLogger(__name__)
 
 
 # ─────────────── Helper ─────────────── #
 def run_async(coro):
     """
-    Запускает async функцию внутри новой event loop,
-    чтобы избежать ошибки 'attached to a different loop'.
+    Выполняет корутину в долгоживущем цикле событий процесса воркера
+    (app.worker): соединения с БД, Redis и SMTP переиспользуются между задачами.
+    """
+    return worker_runtime.run(coro)
+
+
+# ─────────────── Dispatch notification outbox ─────────────── #
+@shared_task(bind=True)
+def dispatch_notification_outbox(self):
+    return run_async(_dispatch_notification_outbox())
+
+
+async def _dispatch_notification_outbox():
+    """
+    Отправляет пачки из notification_outbox, пока очередь не опустеет или не
+    выйдет время запуска. Параллельные запуски не мешают друг другу (SKIP LOCKED).
     """
-    try:
-        # Try to get the current loop
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # If loop is running, create a new one
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            try:
-                return loop.run_until_complete(coro)
-            finally:
-                loop.close()
-        else:
-            return loop.run_until_complete(coro)
-    except RuntimeError:
-        # No event loop exists, create a new one
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(coro)
-        finally:
-            loop.close()
+    deadline = time.monotonic() + settings.OUTBOX_DISPATCH_BUDGET
+    claimed_total = sent_total = 0
+    async with AsyncSessionLocal() as db:
+        service = OutboxService(db)
+        while time.monotonic() < deadline:
+            claimed, sent = await service.dispatch_batch(settings.OUTBOX_BATCH_SIZE)
+            claimed_total += claimed
+            sent_total += sent
+            if claimed < settings.OUTBOX_BATCH_SIZE:
+                break
+
+    if claimed_total:
+        logger.info("Dispatched notifications: %s sent, %s failed", sent_total, claimed_total - sent_total)
+    return sent_total
+
+
+@shared_task(bind=True)
+def purge_notification_outbox(self):
+    return run_async(_purge_notification_outbox())
+
+
+async def _purge_notification_outbox():
+    async with AsyncSessionLocal() as db:
+        older_than = datetime.utcnow() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+        deleted = await OutboxService(db).purge_sent(older_than)
+        logger.info("Purged %s sent notifications", deleted)
+        return deleted
 
 
 # ─────────────── Check and send reminders ─────────────── #
@@ -43,48 +70,24 @@ def check_and_send_reminders(self):
 
 
 async def _check_and_send_reminders():
-    # Create a fresh async session within the new event loop
+    """
+    Передает наступившие напоминания из reminder_schedule в notification_outbox
+    пачками, пока они есть. Работа пропорциональна числу наступивших
+    напоминаний, а не размеру таблицы записей.
+    """
     async with AsyncSessionLocal() as db:
-        now = datetime.utcnow()
-        service = NotificationService(db)
-
-        # 24h reminders
-        reminder_time_24h = now + timedelta(hours=24)
-        result_24h = await db.execute(
-            select(Booking).where(
-                and_(
-                    Booking.status == BookingStatus.CONFIRMED,
-                    Booking.date >= reminder_time_24h,
-                    Booking.date < reminder_time_24h + timedelta(minutes=5)
-                )
-            )
-        )
-        bookings_24h = result_24h.scalars().all()
-        
-        for booking in bookings_24h:
-            try:
-                await service.send_booking_reminder(booking.id, 24)
-            except Exception as e:
-                print(f"Failed to send 24h reminder for booking {booking.id}: {e}")
-
-        # 2h reminders
-        reminder_time_2h = now + timedelta(hours=2)
-        result_2h = await db.execute(
-            select(Booking).where(
-                and_(
-                    Booking.status == BookingStatus.CONFIRMED,
-                    Booking.date >= reminder_time_2h,
-                    Booking.date < reminder_time_2h + timedelta(minutes=5)
-                )
-            )
-        )
-        bookings_2h = result_2h.scalars().all()
-        
-        for booking in bookings_2h:
-            try:
-                await service.send_booking_reminder(booking.id, 2)
-            except Exception as e:
-                print(f"Failed to send 2h reminder for booking {booking.id}: {e}")
+        service = ReminderService(db)
+        claimed_total = queued_total = 0
+        while True:
+            claimed, queued = await service.dispatch_due(settings.REMINDER_BATCH_SIZE)
+            claimed_total += claimed
+            queued_total += queued
+            if claimed < settings.REMINDER_BATCH_SIZE:
+                break
+
+    if claimed_total:
+        logger.info("Queued %s reminders (%s skipped)", queued_total, claimed_total - queued_total)
+    return queued_total
 
 
 # ─────────────── Send single reminder ─────────────── #
@@ -94,12 +97,9 @@ def send_reminder(self, booking_id: str, hours_before: int):
 
 
 async def _send_reminder(booking_id: str, hours_before: int):
-    async with AsyncSessionLocal() as db:
-        service = NotificationService(db)
-        try:
-            await service.send_booking_reminder(booking_id, hours_before)
-        except Exception as e:
-            print(f"Failed to send {hours_before}h reminder for booking {booking_id}: {e}")
+    # Задачи с ETA, поставленные до перехода на reminder_schedule: напоминание
+    # для подтвержденной записи уже запланировано там, повторно не отправляем
+    logger.info("Skipping legacy %sh reminder task for booking %s", hours_before, booking_id)
 
 
 # ─────────────── Cleanup old bookings ─────────────── #
@@ -109,54 +109,88 @@ def cleanup_old_bookings(self):
 
 
 async def _cleanup_old_bookings():
+    """Только отмена неподтвержденных записей (остальные переходы - в process_booking_lifecycle)"""
     async with AsyncSessionLocal() as db:
-        cutoff_time = datetime.utcnow() - timedelta(hours=24)
-        result = await db.execute(
-            select(Booking).where(
-                and_(
-                    Booking.status == BookingStatus.PENDING,
-                    Booking.created_at < cutoff_time
-                )
-            )
-        )
-        bookings = result.scalars().all()
-        
-        updated_count = 0
-        for booking in bookings:
-            try:
-                booking.status = BookingStatus.CANCELLED
-                booking.cancellation_reason = "Not confirmed within 24 hours"
-                updated_count += 1
-            except Exception as e:
-                print(f"Failed to cancel booking {booking.id}: {e}")
-        
-        if updated_count > 0:
-            await db.commit()
-            print(f"Cancelled {updated_count} old bookings")
-
-
-# Alternative approach using asyncio.run (Python 3.7+)
-def run_async_alternative(coro):
+        result = await BookingLifecycleService(db).expire_pending()
+        if result.booking_ids:
+            logger.info("Cancelled %s old bookings", len(result.booking_ids))
+        return len(result.booking_ids)
+
+
+# ─────────────── Booking lifecycle ─────────────── #
+@shared_task(bind=True)
+def process_booking_lifecycle(self):
+    return run_async(_process_booking_lifecycle())
+
+
+async def _process_booking_lifecycle():
     """
-    Alternative helper using asyncio.run (cleaner but requires Python 3.7+)
+    Плановые переходы статусов: отмена неподтвержденных, неявки, завершение
+    прошедших. Массовые UPDATE пачками по LIFECYCLE_BATCH_SIZE, не дольше
+    LIFECYCLE_RUN_BUDGET секунд - остаток обработает следующий запуск.
     """
-    return asyncio.run(coro)
+    deadline = time.monotonic() + settings.LIFECYCLE_RUN_BUDGET
+    async with AsyncSessionLocal() as db:
+        results = await BookingLifecycleService(db).run(deadline)
+
+    changed = {}
+    for result in results:
+        changed[result.name] = len(result.booking_ids)
+        if result.booking_ids:
+            logger.info("Booking lifecycle %s: %s bookings %s -> %s", result.name,
+                        len(result.booking_ids), result.before.value, result.after.value)
+    return changed
+
+
+# ─────────────── Reconcile booking daily stats ─────────────── #
+# Окно пересчета: прошедшие дни, где чаще всего меняются статусы, и будущие записи
+STATS_RECONCILE_DAYS_BACK = 35
+STATS_RECONCILE_DAYS_AHEAD = 90
+
+
+@shared_task(bind=True)
+def reconcile_booking_daily_stats(self, days_back: int = STATS_RECONCILE_DAYS_BACK,
+                                  days_ahead: int = STATS_RECONCILE_DAYS_AHEAD):
+    return run_async(_reconcile_booking_daily_stats(days_back, days_ahead))
+
+
+async def _reconcile_booking_daily_stats(days_back: int, days_ahead: int):
+    async with AsyncSessionLocal() as db:
+        today = datetime.utcnow().date()
+        rows = await BookingStatsService(db).reconcile(
+            today - timedelta(days=days_back),
+            today + timedelta(days=days_ahead)
+        )
+        logger.info("Reconciled booking daily stats: %s rows", rows)
+        return rows
+
+
+# ─────────────── Reconcile client stats ─────────────── #
+@shared_task(bind=True)
+def reconcile_client_stats(self):
+    return run_async(_reconcile_client_stats())
+
+
+async def _reconcile_client_stats():
+    """Сверка счетчиков клиентов и master_client_stats с таблицей bookings"""
+    async with AsyncSessionLocal() as db:
+        fixed = await ClientStatsService(db).reconcile()
+        logger.info("Reconciled client stats: %s clients corrected", fixed)
+        return fixed
 
 
 # ─────────────── Alternative task implementations ─────────────── #
+# Оставлены ради уже поставленных в очередь задач со старыми именами
 @shared_task(bind=True, name="check_and_send_reminders_v2")
 def check_and_send_reminders_v2(self):
-    """Alternative implementation using asyncio.run"""
-    return asyncio.run(_check_and_send_reminders())
+    return run_async(_check_and_send_reminders())
 
 
 @shared_task(bind=True, name="send_reminder_v2")
 def send_reminder_v2(self, booking_id: str, hours_before: int):
-    """Alternative implementation using asyncio.run"""
-    return asyncio.run(_send_reminder(booking_id, hours_before))
+    return run_async(_send_reminder(booking_id, hours_before))
 
 
 @shared_task(bind=True, name="cleanup_old_bookings_v2")
 def cleanup_old_bookings_v2(self):
-    """Alternative implementation using asyncio.run"""
-    return asyncio.run(_cleanup_old_bookings())
\ No newline at end of file
+    return run_async(_cleanup_old_bookings())
@@ -0,0 +1,146 @@
+import json
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from prometheus_client import Counter
+
+from app.config import settings
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Кэш свободных слотов по ключу (мастер, дата, длительность услуги).
+# Инвалидация - через версии: запись/блокировка увеличивает версию дня,
+# изменение расписания - версию мастера. Старые ключи истекают по TTL.
+KEY_PREFIX = "availability"
+
+# Если блокировка длиннее, дешевле сбросить весь кэш мастера
+MAX_INVALIDATED_DAYS = 31
+
+# Версии дней живут заметно дольше кэша слотов, поэтому после их истечения
+# под старой версией уже не может остаться закэшированных данных
+DAY_VERSION_TTL = 7 * 86400
+
+availability_cache_hits = Counter(
+    "availability_cache_hits_total",
+    "Availability slot cache hits"
+)
+availability_cache_misses = Counter(
+    "availability_cache_misses_total",
+    "Availability slot cache misses"
+)
+availability_cache_invalidations = Counter(
+    "availability_cache_invalidations_total",
+    "Availability slot cache invalidations",
+    ["scope"]
+)
+
+
+def _master_version_key(master_id: UUID) -> str:
+    return f"{KEY_PREFIX}:v:{master_id}"
+
+
+def _day_version_key(master_id: UUID, day: date) -> str:
+    return f"{KEY_PREFIX}:v:{master_id}:{day.isoformat()}"
+
+
+def _slots_key(master_id: UUID, day: date, duration: int, master_version, day_version) -> str:
+    return (
+        f"{KEY_PREFIX}:slots:{master_id}:{master_version or 0}:"
+        f"{day.isoformat()}:{day_version or 0}:{duration}"
+    )
+
+
+async def lookup_slots(
+    pairs: Iterable[Tuple[UUID, date]],
+    duration: int
+) -> Tuple[Dict[Tuple[UUID, date], List[str]], Dict[Tuple[UUID, date], str]]:
+    """
+    Получить закэшированные слоты для набора (мастер, день).
+    Возвращает найденные слоты и ключи, под которыми нужно сохранить
+    пересчитанные значения. Версии читаются до пересчета, поэтому
+    параллельная инвалидация не даст сохранить устаревшие данные под новой версией.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return {}, {}
+
+    version_keys = []
+    for master_id, day in pairs:
+        version_keys.append(_master_version_key(master_id))
+        version_keys.append(_day_version_key(master_id, day))
+
+    try:
+        versions = await redis_client.mget(version_keys)
+        keys = {
+            pair: _slots_key(pair[0], pair[1], duration, versions[2 * i], versions[2 * i + 1])
+            for i, pair in enumerate(pairs)
+        }
+        cached = await redis_client.mget(list(keys.values()))
+    except Exception as e:
+        logger.warning("Availability cache lookup failed: %s", e)
+        availability_cache_misses.inc(len(pairs))
+        return {}, {}
+
+    found = {}
+    for pair, value in zip(keys, cached):
+        if value is not None:
+            found[pair] = json.loads(value)
+
+    availability_cache_hits.inc(len(found))
+    availability_cache_misses.inc(len(pairs) - len(found))
+
+    return found, keys
+
+
+async def store_slots(entries: Dict[str, List[str]], ttl: Optional[int] = None) -> None:
+    """Сохранить пересчитанные слоты по ключам из lookup_slots"""
+    if not entries:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key, slots in entries.items():
+            pipe.setex(key, ttl or settings.AVAILABILITY_CACHE_TTL, json.dumps(slots))
+        await pipe.execute()
+    except Exception as e:
+        logger.warning("Availability cache store failed: %s", e)
+
+
+async def invalidate_master(master_id: UUID) -> None:
+    """Сбросить весь кэш мастера (например, после изменения расписания)"""
+    try:
+        await redis_client.incr(_master_version_key(master_id))
+        availability_cache_invalidations.labels(scope="master").inc()
+    except Exception as e:
+        logger.warning("Availability cache invalidation failed for master %s: %s", master_id, e)
+
+
+async def invalidate_range(master_id: UUID, start: datetime, end: Optional[datetime] = None) -> None:
+    """Сбросить кэш мастера для всех дней, которые затрагивает интервал"""
+    first_day = start.date()
+    last_day = (end - timedelta(microseconds=1)).date() if end and end > start else first_day
+
+    if (last_day - first_day).days >= MAX_INVALIDATED_DAYS:
+        await invalidate_master(master_id)
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        current_day = first_day
+        while current_day <= last_day:
+            version_key = _day_version_key(master_id, current_day)
+            pipe.incr(version_key)
+            pipe.expire(version_key, DAY_VERSION_TTL)
+            current_day += timedelta(days=1)
+        await pipe.execute()
+        availability_cache_invalidations.labels(scope="day").inc()
+    except Exception as e:
+        logger.warning("Availability cache invalidation failed for master %s: %s", master_id, e)
+
+
+async def invalidate_booking(booking) -> None:
+    """Сбросить кэш для дней, которые занимает запись"""
+    await invalidate_range(booking.master_id, booking.date, booking.end_time)
@@ -0,0 +1,44 @@
+from jinja2 import Environment, FileSystemLoader, Template
+from typing import Iterable, List
+import os
+
+from app.config import settings
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), '..', 'templates', 'emails')
+
+
+class TemplateRegistry:
+    """
+    Общее на процесс окружение Jinja2 для писем. Шаблоны компилируются один раз
+    (включая base.html, от которого они наследуются) и берутся из кэша окружения;
+    проверка изменений файлов на диске - только в DEBUG.
+    """
+
+    def __init__(self, template_dir: str = TEMPLATE_DIR, auto_reload: bool = settings.DEBUG):
+        self.env = Environment(
+            loader=FileSystemLoader(template_dir),
+            auto_reload=auto_reload,
+            # Без вытеснения: шаблонов мало, все должны оставаться скомпилированными
+            cache_size=-1
+        )
+
+    def precompile(self) -> int:
+        """Скомпилировать все шаблоны заранее (при старте процесса)"""
+        names = self.env.list_templates(extensions=["html"])
+        for name in names:
+            self.env.get_template(name)
+        return len(names)
+
+    def get(self, name: str) -> Template:
+        return self.env.get_template(name)
+
+    def render(self, name: str, **context) -> str:
+        return self.env.get_template(name).render(**context)
+
+    def render_many(self, name: str, contexts: Iterable[dict]) -> List[str]:
+        """Один шаблон для многих получателей: шаблон ищется один раз на пачку"""
+        template = self.env.get_template(name)
+        return [template.render(**context) for context in contexts]
+
+
+email_templates = TemplateRegistry()
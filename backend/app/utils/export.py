@@ -0,0 +1,95 @@
+import csv
+import enum
+import io
+import json
+import re
+from datetime import date, datetime
+from typing import AsyncIterator, List, Sequence
+from uuid import UUID
+
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Выгрузки читают результат серверным курсором пачками по EXPORT_BATCH_SIZE
+# строк и сразу отдают их клиенту - память не зависит от размера салона.
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Ячейки, которые Excel/LibreOffice приняли бы за формулу (телефоны и числа не трогаем)
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+PLAIN_NUMBER = re.compile(r"^[+-]?[\d\s().-]+$")
+
+
+def _plain(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _csv_value(value):
+    value = _plain(value)
+    if value is None:
+        return ""
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES) and not PLAIN_NUMBER.match(value):
+        return "'" + value
+    return value
+
+
+async def stream_partitions(db: AsyncSession, query, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[Sequence]:
+    """Строки запроса пачками через серверный курсор (AsyncSession.stream + yield_per)"""
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions():
+        yield partition
+
+
+async def csv_chunks(columns: List[str], partitions: AsyncIterator[Sequence]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM - чтобы Excel открыл UTF-8 (кириллицу) без мастера импорта
+    buffer.write("\ufeff")
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate(0)
+        for row in rows:
+            writer.writerow([_csv_value(value) for value in row])
+        yield buffer.getvalue()
+
+
+async def ndjson_chunks(columns: List[str], partitions: AsyncIterator[Sequence]) -> AsyncIterator[str]:
+    async for rows in partitions:
+        yield "".join(
+            json.dumps(
+                {column: _plain(value) for column, value in zip(columns, row)},
+                ensure_ascii=False,
+                default=str
+            ) + "\n"
+            for row in rows
+        )
+
+
+def export_response(db: AsyncSession, query, export_format: str, filename: str) -> StreamingResponse:
+    """
+    Потоковый ответ с результатом запроса. Названия колонок - метки
+    selected_columns. Сессия должна жить до конца отдачи ответа
+    (зависимости с yield закрываются после отправки тела).
+    """
+    columns = list(query.selected_columns.keys())
+    partitions = stream_partitions(db, query)
+    chunks = csv_chunks(columns, partitions) if export_format == "csv" else ndjson_chunks(columns, partitions)
+
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
@@ -1,41 +1,182 @@
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter
+
 from app.config import settings
 
-def setup_logging():
-    """Setup logging configuration"""
-    
-    # Create logger
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
-    
+# Логгер access-лога (LoggingMiddleware), к нему применяется выборка
+ACCESS_LOGGER = "app.access"
+
+log_records_dropped = Counter(
+    "log_records_dropped_total",
+    "Log records dropped because the logging queue was full"
+)
+
+# Стандартные атрибуты LogRecord - все остальное пришло через extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись: время, уровень, логгер, сообщение и поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Кладет запись в очередь и сразу возвращается; форматирование и запись
+    выполняет QueueListener в своем потоке. При переполненной очереди запись
+    отбрасывается (счетчик log_records_dropped_total), цикл событий не ждет.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В другой поток уходит копия с готовым текстом: args могут измениться
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+class AccessLogSampler(logging.Filter):
+    """
+    Выборка access-лога по префиксу пути: "/health=0.01" оставляет 1% записей.
+    Ошибки (5xx и уровень WARNING и выше) пишутся всегда. Доля выборки
+    сохраняется в записи (sample_rate), чтобы при подсчете ее можно было учесть.
+    """
+
+    def __init__(self, default_rate: float = 1.0, rules: str = ""):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rules: List[Tuple[str, float]] = []
+        for rule in rules.split(","):
+            prefix, _, rate = rule.strip().partition("=")
+            if prefix and rate:
+                self.rules.append((prefix, float(rate)))
+        # Самый длинный префикс - первым
+        self.rules.sort(key=lambda rule: len(rule[0]), reverse=True)
+
+    def rate_for(self, path: str) -> float:
+        for prefix, rate in self.rules:
+            if path.startswith(prefix):
+                return rate
+        return self.default_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or getattr(record, "status", 0) >= 500:
+            return True
+        rate = self.rate_for(getattr(record, "path", ""))
+        if rate >= 1:
+            return True
+        if rate <= 0 or random.random() >= rate:
+            return False
+        record.sample_rate = rate
+        return True
+
+
+def _handlers() -> List[logging.Handler]:
+    if settings.LOG_JSON:
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG if settings.DEBUG else logging.INFO)
-    
-    # File handler
-    file_handler = RotatingFileHandler(
-        "/app/logs/jazyl.log",
-        maxBytes=10485760,  # 10MB
-        backupCount=5
-    )
-    file_handler.setLevel(logging.INFO)
-    
-    # Formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
     console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
-    
-    # Add handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    
+    handlers: List[logging.Handler] = [console_handler]
+
+    # File handler
+    if settings.LOG_FILE:
+        try:
+            os.makedirs(os.path.dirname(settings.LOG_FILE), exist_ok=True)
+            file_handler = RotatingFileHandler(
+                settings.LOG_FILE,
+                maxBytes=10485760,  # 10MB
+                backupCount=5
+            )
+        except OSError as e:
+            print(f"Log file {settings.LOG_FILE} is not writable, logging to stdout only: {e}", file=sys.stderr)
+        else:
+            file_handler.setLevel(logging.INFO)
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+
+    return handlers
+
+
+def setup_logging():
+    """
+    Setup logging configuration: корневой логгер только ставит записи в
+    очередь, вывод в stdout и файл идет из потока QueueListener.
+    """
+    global _listener
+
+    level = settings.LOG_LEVEL.upper() or ("DEBUG" if settings.DEBUG else "INFO")
+
+    # Create logger
+    logger = logging.getLogger()
+    logger.setLevel(level)
+
+    if _listener is None:
+        log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        _listener = QueueListener(log_queue, *_handlers(), respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+        logger.addHandler(NonBlockingQueueHandler(log_queue))
+
+    access_logger = logging.getLogger(ACCESS_LOGGER)
+    if not any(isinstance(f, AccessLogSampler) for f in access_logger.filters):
+        access_logger.addFilter(
+            AccessLogSampler(settings.LOG_ACCESS_SAMPLE_RATE, settings.LOG_ACCESS_SAMPLING)
+        )
+
     # Set third-party loggers
     logging.getLogger("uvicorn").setLevel(logging.WARNING)
     logging.getLogger("sqlalchemy").setLevel(logging.WARNING)
-    
-    return logger
\ No newline at end of file
+
+    return logger
+
+
+def shutdown_logging() -> None:
+    """Дописать оставшиеся в очереди записи и остановить поток"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
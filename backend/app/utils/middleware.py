@@ -1,52 +1,83 @@
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import time
 import uuid
 import logging
 from typing import Optional
 
+from app.utils.logger import ACCESS_LOGGER
+from app.utils.tenant_resolver import parse_tenant_host
+
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger(ACCESS_LOGGER)
+
+# LoggingMiddleware и TenantMiddleware - чистые ASGI: без BaseHTTPMiddleware нет
+# лишней задачи и потока памяти на каждый ответ, StreamingResponse отдается как есть.
+# Данные запроса кладутся в scope["state"] - это request.state в роутах.
+
+
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
         request_id = str(uuid.uuid4())
-        start_time = time.time()
-        
-        # Log request
-        logger.info(f"Request {request_id}: {request.method} {request.url.path}")
-        
-        response = await call_next(request)
-        
-        # Log response
-        process_time = time.time() - start_time
-        logger.info(f"Response {request_id}: {response.status_code} in {process_time:.3f}s")
-        
-        return response
+        scope.setdefault("state", {})["request_id"] = request_id
+        start_time = time.perf_counter()
+        status_code = 500
 
-class TenantMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Получаем хост и извлекаем субдомен
-        host = request.headers.get("host", "")
-        
-        if ".jazyl.tech" in host:
-            subdomain = host.split(".jazyl.tech")[0]
-            
-            # Удаляем admin. префикс если есть
-            if subdomain.startswith("admin."):
-                subdomain = subdomain[6:]  # убираем "admin."
-                # Добавляем заголовок чтобы показать что это admin-доступ
-                request.headers.__dict__["_list"].append(
-                    (b"x-admin-access", b"true")
-                )
-            
-            # Добавляем subdomain в заголовки для дальнейшего использования
-            if subdomain and subdomain not in ["www", "jazyl"]:
-                request.headers.__dict__["_list"].append(
-                    (b"x-tenant-subdomain", subdomain.encode())
+        async def send_with_request_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            # Одна строка access-лога на запрос (время - до конца отдачи тела);
+            # выборку по путям делает AccessLogSampler
+            if access_logger.isEnabledFor(logging.INFO):
+                duration_ms = (time.perf_counter() - start_time) * 1000
+                access_logger.info(
+                    "%s %s %s %.1fms", scope["method"], scope["path"], status_code, duration_ms,
+                    extra={
+                        "request_id": request_id,
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round(duration_ms, 1),
+                    }
                 )
-        
-        return await call_next(request)
+
+
+class TenantMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+
+        # Субдомен салона и admin-доступ по host (request.state.tenant_subdomain / admin_access)
+        subdomain, admin_access = parse_tenant_host(Headers(scope=scope).get("host", ""))
+        state["tenant_subdomain"] = subdomain
+        state["admin_access"] = admin_access
+
+        # Сам тенант ищется лениво (get_request_tenant) - только там, где он нужен,
+        # а не на каждом /health, /metrics и запросе владельца с токеном
+        await self.app(scope, receive, send)
 
 class URLFixMiddleware(BaseHTTPMiddleware):
     """Middleware для исправления проблем с trailing slash"""
@@ -0,0 +1,146 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Keyset-пагинация: страница продолжается после последней пары (ключ сортировки, id)
+# из курсора, поэтому стоимость запроса не зависит от номера страницы.
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Переходный период: запрос без cursor и limit получает весь список, как до
+# пагинации (фронтенд пока не ходит по X-Next-Cursor и молча терял бы строки).
+# Постраничная выдача включается явным limit или cursor.
+
+# Общее число строк считается не дальше этого предела (count по индексу тоже не бесплатен)
+TOTAL_COUNT_CAP = 10000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    next_cursor: Optional[str]
+    total: Optional[int] = None
+    total_exact: bool = True
+
+
+def encode_cursor(value: datetime, row_id: UUID) -> str:
+    raw = json.dumps([value.isoformat(), str(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        value, row_id = json.loads(raw)
+        return datetime.fromisoformat(value), UUID(row_id)
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {token}")
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    return min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+
+async def count_capped(db: AsyncSession, query) -> Tuple[int, bool]:
+    """Число строк запроса, но не больше TOTAL_COUNT_CAP. Возвращает (число, точное ли)"""
+    capped = query.order_by(None).limit(TOTAL_COUNT_CAP + 1).subquery()
+    total = (await db.execute(select(func.count()).select_from(capped))).scalar()
+    if total > TOTAL_COUNT_CAP:
+        return TOTAL_COUNT_CAP, False
+    return total, True
+
+
+async def paginate(
+    db: AsyncSession,
+    query,
+    sort_column,
+    id_column,
+    key: Callable[[Any], Tuple[datetime, UUID]],
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    descending: bool = False,
+    with_total: bool = False,
+    scalars: bool = True
+) -> Page:
+    """
+    Одна страница запроса, упорядоченного по (sort_column, id_column).
+    key достает из строки результата пару для курсора следующей страницы.
+    Без cursor и limit возвращается весь список (next_cursor = None).
+    """
+    unbounded = limit is None and not cursor
+    limit = clamp_limit(limit)
+
+    total, total_exact = None, True
+    if with_total:
+        total, total_exact = await count_capped(db, query)
+
+    if cursor:
+        after = decode_cursor(cursor)
+        position = tuple_(sort_column, id_column)
+        query = query.where(position < after if descending else position > after)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column, id_column)
+
+    if unbounded:
+        result = await db.execute(query)
+        rows = result.scalars().all() if scalars else result.all()
+        return Page(rows, None, total, total_exact)
+
+    # Лишняя строка показывает, есть ли следующая страница
+    result = await db.execute(query.limit(limit + 1))
+    rows = result.scalars().all() if scalars else result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*key(rows[-1]))
+
+    return Page(rows, next_cursor, total, total_exact)
+
+
+def page_params(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    with_total: bool = False
+) -> dict:
+    """
+    Query-параметры пагинации для эндпоинтов (Depends). Без cursor и limit -
+    весь список; с cursor без limit - страница DEFAULT_PAGE_SIZE.
+    """
+    if limit is not None and (limit < 1 or limit > MAX_PAGE_SIZE):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        )
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"cursor": cursor, "limit": limit, "with_total": with_total}
+
+
+def set_page_headers(response: Response, request: Request, page: Page) -> None:
+    """
+    Метаданные страницы - в заголовках, тело ответа остается списком:
+    X-Next-Cursor, Link rel="next", X-Total-Count (при with_total=true).
+    """
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+        next_url = request.url.include_query_params(cursor=page.next_cursor)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    if page.total is not None:
+        response.headers["X-Total-Count"] = str(page.total)
+        response.headers["X-Total-Count-Exact"] = "true" if page.total_exact else "false"
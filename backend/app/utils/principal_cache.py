@@ -0,0 +1,227 @@
+import json
+import logging
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Iterable, Optional
+from uuid import UUID
+
+from prometheus_client import Counter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.master import Master
+from app.models.user import User, UserRole
+from app.utils.local_cache import TTLCache
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Кэш аутентифицированного пользователя: поля User, профиль мастера и его права.
+# Ключ данных содержит версию пользователя - любое изменение увеличивает версию,
+# и все процессы сразу перестают видеть старую запись (и в Redis, и локально).
+KEY_PREFIX = "principal"
+
+# Версия живет заметно дольше данных, поэтому после ее истечения
+# под сброшенной версией уже ничего не закэшировано
+VERSION_TTL = 86400
+
+# Пароль и токены в кэш не попадают
+USER_FIELDS = (
+    "id", "tenant_id", "email", "phone", "first_name", "last_name", "role",
+    "is_active", "is_verified", "last_login", "created_at", "updated_at",
+)
+
+MASTER_PERMISSION_FIELDS = (
+    "can_edit_profile", "can_edit_schedule", "can_edit_services",
+    "can_manage_bookings", "can_view_analytics", "can_upload_photos",
+)
+
+principal_cache_lookups = Counter(
+    "principal_cache_lookups_total",
+    "Principal cache lookups by the layer that answered",
+    ["source"]
+)
+
+
+@dataclass(frozen=True)
+class MasterAccess:
+    """Профиль мастера в объеме, нужном для проверок доступа"""
+    id: UUID
+    tenant_id: UUID
+    display_name: Optional[str]
+    is_active: bool
+    can_edit_profile: bool
+    can_edit_schedule: bool
+    can_edit_services: bool
+    can_manage_bookings: bool
+    can_view_analytics: bool
+    can_upload_photos: bool
+
+    @classmethod
+    def from_model(cls, master: Master) -> "MasterAccess":
+        return cls(
+            id=master.id,
+            tenant_id=master.tenant_id,
+            display_name=master.display_name,
+            is_active=bool(master.is_active),
+            **{field: bool(getattr(master, field)) for field in MASTER_PERMISSION_FIELDS}
+        )
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_data: dict
+    master: Optional[MasterAccess]
+    version: str
+
+    @property
+    def user_id(self) -> UUID:
+        return self.user_data["id"]
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self.user_data["is_active"])
+
+    def to_user(self) -> User:
+        """
+        Отдельный (не привязанный к сессии) объект User на каждый запрос.
+        Для изменений пользователя его нужно загрузить из сессии заново.
+        """
+        return User(**self.user_data)
+
+    def to_json(self) -> str:
+        user = {
+            key: _encode(value) for key, value in self.user_data.items()
+        }
+        master = None
+        if self.master:
+            master = asdict(self.master)
+            master["id"] = str(self.master.id)
+            master["tenant_id"] = str(self.master.tenant_id)
+        return json.dumps({"user": user, "master": master})
+
+    @classmethod
+    def from_json(cls, raw: str, version: str) -> "Principal":
+        data = json.loads(raw)
+        user = data["user"]
+        user["id"] = UUID(user["id"])
+        user["tenant_id"] = UUID(user["tenant_id"]) if user["tenant_id"] else None
+        user["role"] = UserRole(user["role"]) if user["role"] else None
+        for key in ("last_login", "created_at", "updated_at"):
+            user[key] = datetime.fromisoformat(user[key]) if user[key] else None
+
+        master = data["master"]
+        if master:
+            master["id"] = UUID(master["id"])
+            master["tenant_id"] = UUID(master["tenant_id"])
+            master = MasterAccess(**master)
+
+        return cls(user_data=user, master=master, version=version)
+
+
+def _encode(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UserRole):
+        return value.value
+    return value
+
+
+_local_cache = TTLCache(settings.PRINCIPAL_LOCAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL)
+
+
+def _version_key(user_id: UUID) -> str:
+    return f"{KEY_PREFIX}:v:{user_id}"
+
+
+def _data_key(user_id: UUID, version: str) -> str:
+    return f"{KEY_PREFIX}:{user_id}:{version}"
+
+
+async def _load(db: AsyncSession, user_id: UUID, version: Optional[str]) -> Optional[Principal]:
+    result = await db.execute(
+        select(User, Master)
+        .outerjoin(Master, Master.user_id == User.id)
+        .where(User.id == user_id)
+    )
+    row = result.first()
+    principal_cache_lookups.labels(source="db").inc()
+
+    if not row:
+        return None
+
+    user, master = row
+    return Principal(
+        user_data={field: getattr(user, field) for field in USER_FIELDS},
+        master=MasterAccess.from_model(master) if master else None,
+        version=version or "0"
+    )
+
+
+async def get_principal(user_id: UUID, db: AsyncSession) -> Optional[Principal]:
+    """
+    Пользователь с профилем мастера. Версия читается до загрузки из БД:
+    если пользователя изменят параллельно, результат ляжет под старую версию
+    и читаться уже не будет.
+    """
+    try:
+        version = await redis_client.get(_version_key(user_id)) or "0"
+    except Exception as e:
+        # Без Redis нельзя проверить актуальность - только БД
+        logger.warning("Principal cache lookup failed for %s: %s", user_id, e)
+        return await _load(db, user_id, None)
+
+    principal = _local_cache.get(user_id)
+    if principal and principal.version == version:
+        principal_cache_lookups.labels(source="local").inc()
+        return principal
+
+    try:
+        raw = await redis_client.get(_data_key(user_id, version))
+    except Exception as e:
+        logger.warning("Principal cache lookup failed for %s: %s", user_id, e)
+        raw = None
+
+    if raw:
+        principal = Principal.from_json(raw, version)
+        _local_cache.set(user_id, principal)
+        principal_cache_lookups.labels(source="redis").inc()
+        return principal
+
+    principal = await _load(db, user_id, version)
+    if principal:
+        _local_cache.set(user_id, principal)
+        try:
+            await redis_client.setex(
+                _data_key(user_id, version), settings.PRINCIPAL_CACHE_TTL, principal.to_json()
+            )
+        except Exception as e:
+            logger.warning("Principal cache store failed for %s: %s", user_id, e)
+
+    return principal
+
+
+async def bump_principals(user_ids: Iterable[UUID]) -> None:
+    """Сделать устаревшими закэшированные данные пользователей (вызывать после коммита)"""
+    user_ids = [user_id for user_id in set(user_ids) if user_id]
+    if not user_ids:
+        return
+
+    for user_id in user_ids:
+        _local_cache.pop(user_id)
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.incr(_version_key(user_id))
+            pipe.expire(_version_key(user_id), VERSION_TTL)
+        await pipe.execute()
+    except Exception as e:
+        logger.warning("Principal cache invalidation failed for %s: %s", user_ids, e)
+
+
+async def bump_principal(user_id: UUID) -> None:
+    await bump_principals([user_id])
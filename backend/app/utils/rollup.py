@@ -0,0 +1,19 @@
+from typing import List
+
+from sqlalchemy.dialects.postgresql import insert
+
+
+def upsert_from_select(model, columns: List[str], key_columns: List[str], query):
+    """
+    INSERT ... SELECT пересчитанных агрегатов. Если строку с тем же ключом
+    успел вставить параллельный инкремент, она перезаписывается пересчетом
+    (обычный INSERT упал бы с unique violation).
+    """
+    stmt = insert(model).from_select(columns, query)
+    return stmt.on_conflict_do_update(
+        index_elements=key_columns,
+        set_={
+            column: getattr(stmt.excluded, column)
+            for column in columns if column not in key_columns
+        }
+    )
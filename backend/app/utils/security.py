@@ -1,8 +1,9 @@
+import logging
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from typing import Optional, List, Union
 from uuid import UUID
 from app.models.master import Master
@@ -10,20 +11,14 @@ from app.config import settings
 from app.database import get_db
 from app.models.user import User, UserRole
 from app.models.tenant import Tenant
+from app.utils.tenant_resolver import get_request_tenant
+from app.utils.principal_cache import Principal, get_principal, bump_principal
+
+logger = logging.getLogger(__name__)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    """Получить текущего пользователя по токену"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    
+def _user_id_from_token(token: str, credentials_exception: HTTPException) -> UUID:
     try:
         payload = jwt.decode(
             token,
@@ -33,32 +28,50 @@ async def get_current_user(
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
-    except JWTError as e:
-        print(f"JWT Error: {e}")
+        return UUID(user_id)
+    except (JWTError, ValueError) as e:
+        logger.debug("JWT Error: %s", e)
         raise credentials_exception
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> Principal:
+    """Пользователь по токену вместе с профилем мастера - из кэша, без запросов к БД"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    user_id = _user_id_from_token(token, credentials_exception)
     
     try:
-        result = await db.execute(
-            select(User).where(User.id == UUID(user_id))
-        )
-        user = result.scalar_one_or_none()
-        
-        if user is None:
-            print(f"User not found for ID: {user_id}")
-            raise credentials_exception
-            
-        if not user.is_active:
-            print(f"User is not active: {user_id}")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User account is disabled"
-            )
-        
-        return user
-        
+        principal = await get_principal(user_id, db)
     except Exception as e:
-        print(f"Database error in get_current_user: {e}")
+        logger.error("Database error in get_current_user: %s", e)
         raise credentials_exception
+    
+    if principal is None:
+        logger.debug("User not found for ID: %s", user_id)
+        raise credentials_exception
+    
+    if not principal.is_active:
+        logger.debug("User is not active: %s", user_id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User account is disabled"
+        )
+    
+    return principal
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Получить текущего пользователя по токену"""
+    principal = await get_current_principal(token, db)
+    return principal.to_user()
 
 def require_role(roles: Union[UserRole, List[UserRole]]):
     """Проверка роли пользователя - исправленная версия"""
@@ -78,19 +91,20 @@ def require_role(roles: Union[UserRole, List[UserRole]]):
     
     return role_checker
 
-async def get_current_master(
+async def get_current_master_principal(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_db)
-) -> User:
-    """Получить текущего пользователя и проверить что он мастер - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
+) -> Principal:
+    """Текущий мастер с профилем и правами доступа"""
     try:
         # Сначала получаем пользователя
-        user = await get_current_user(token, db)
-        print(f"✅ User authenticated: {user.email}, role: {user.role.value}")
+        principal = await get_current_principal(token, db)
+        user = principal.to_user()
+        logger.debug("User authenticated: %s, role: %s", user.email, user.role.value)
         
         # Проверяем роль
         if user.role != UserRole.MASTER:
-            print(f"❌ User {user.email} has role {user.role.value}, but MASTER required")
+            logger.debug("User %s has role %s, but MASTER required", user.email, user.role.value)
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Access restricted to masters only"
@@ -98,7 +112,7 @@ async def get_current_master(
         
         # Проверяем наличие tenant_id (более мягко)
         if not user.tenant_id:
-            print(f"⚠️ Master {user.email} has no tenant_id - trying to fix...")
+            logger.warning("Master %s has no tenant_id - trying to fix...", user.email)
             
             # Пытаемся найти тенант для пользователя через базу данных
             # Это может произойти при миграции данных или неполной регистрации
@@ -108,33 +122,41 @@ async def get_current_master(
             tenant = result.scalar_one_or_none()
             
             if tenant:
-                user.tenant_id = tenant.id
+                await db.execute(
+                    update(User).where(User.id == user.id).values(tenant_id=tenant.id)
+                )
                 await db.commit()
-                await db.refresh(user)
-                print(f"✅ Assigned tenant {tenant.id} to master {user.email}")
+                await bump_principal(user.id)
+                principal = await get_principal(user.id, db)
+                logger.debug("Assigned tenant %s to master %s", tenant.id, user.email)
             else:
-                print(f"❌ No tenant found to assign to master {user.email}")
+                logger.error("No tenant found to assign to master %s", user.email)
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="No tenant available. Contact administrator."
                 )
         
-        print(f"✅ Master authenticated successfully: {user.email}, tenant: {user.tenant_id}")
-        return user
+        logger.debug("Master authenticated successfully: %s, tenant: %s", user.email, principal.user_data['tenant_id'])
+        return principal
         
     except HTTPException:
         # Пропускаем HTTP исключения дальше
         raise
-    except Exception as e:
-        print(f"❌ Error in get_current_master: {e}")
-        # Логируем подробности для отладки
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Error in get_current_master")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Authentication service error"
         )
 
+async def get_current_master(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Получить текущего пользователя и проверить что он мастер - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
+    principal = await get_current_master_principal(token, db)
+    return principal.to_user()
+
 async def get_current_user_from_token(
     token: str,
     db: AsyncSession
@@ -146,27 +168,13 @@ async def get_current_user_from_token(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(
-            token,
-            settings.JWT_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    result = await db.execute(
-        select(User).where(User.id == UUID(user_id))
-    )
-    user = result.scalar_one_or_none()
+    user_id = _user_id_from_token(token, credentials_exception)
+    principal = await get_principal(user_id, db)
     
-    if user is None or not user.is_active:
+    if principal is None or not principal.is_active:
         raise credentials_exception
     
-    return user
+    return principal.to_user()
 
 async def get_current_tenant(
     request: Request,
@@ -174,46 +182,10 @@ async def get_current_tenant(
 ) -> UUID:
     """Получить текущий тенант из запроса - ИСПРАВЛЕННАЯ ВЕРСИЯ"""
     
-    # Метод 1: Получить tenant_id из заголовка X-Tenant-ID
-    tenant_id_str = request.headers.get("X-Tenant-ID")
-    if tenant_id_str:
-        try:
-            tenant_id = UUID(tenant_id_str)
-            # Проверяем что тенант существует
-            result = await db.execute(
-                select(Tenant).where(Tenant.id == tenant_id)
-            )
-            tenant = result.scalar_one_or_none()
-            if tenant and tenant.is_active:
-                return tenant_id
-        except (ValueError, Exception) as e:
-            print(f"Invalid tenant ID in header: {tenant_id_str}, error: {e}")
-    
-    # Метод 2: Получить subdomain из заголовка X-Tenant-Subdomain
-    subdomain = request.headers.get("X-Tenant-Subdomain")
-    
-    if not subdomain:
-        # Метод 3: Извлечь из host
-        host = request.headers.get("host", "")
-        if ".jazyl.tech" in host:
-            subdomain = host.split(".jazyl.tech")[0]
-            # Удаляем admin. префикс если есть
-            if subdomain.startswith("admin."):
-                subdomain = subdomain[6:]  # убираем "admin."
-    
-    if subdomain:
-        try:
-            result = await db.execute(
-                select(Tenant).where(Tenant.subdomain == subdomain)
-            )
-            tenant = result.scalar_one_or_none()
-            
-            if tenant and tenant.is_active:
-                return tenant.id
-            else:
-                print(f"Tenant not found or inactive for subdomain: {subdomain}")
-        except Exception as e:
-            print(f"Error finding tenant by subdomain {subdomain}: {e}")
+    # X-Tenant-ID, X-Tenant-Subdomain или поддомен из host - через общий кэш
+    tenant = await get_request_tenant(request, db)
+    if tenant:
+        return tenant.id
     
     # Если ничего не найдено
     raise HTTPException(
@@ -245,28 +217,23 @@ async def verify_master_belongs_to_tenant(
 
 async def get_master_with_permissions_check(
     permission_required: str,
-    current_user: User = Depends(get_current_master),
-    db: AsyncSession = Depends(get_db)
+    principal: Principal,
+    db: AsyncSession
 ) -> tuple[User, Master]:
     """
     Получить мастера и проверить конкретное разрешение
     Возвращает кортеж (User, Master)
     """
     
-    # Получаем профиль мастера
-    result = await db.execute(
-        select(Master).where(Master.user_id == current_user.id)
-    )
-    master_profile = result.scalar_one_or_none()
-    
-    if not master_profile:
+    # Права берутся из кэша, профиль загружается только при успешной проверке
+    if not principal.master:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Master profile not found"
         )
     
     # Проверяем конкретное разрешение
-    if not getattr(master_profile, permission_required, False):
+    if not getattr(principal.master, permission_required, False):
         permission_names = {
             'can_edit_profile': 'Profile editing',
             'can_edit_schedule': 'Schedule editing', 
@@ -282,16 +249,23 @@ async def get_master_with_permissions_check(
             detail=f"{permission_name} permission required. Contact your manager."
         )
     
-    return current_user, master_profile
+    master_profile = await db.get(Master, principal.master.id)
+    if not master_profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Master profile not found"
+        )
+    
+    return principal.to_user(), master_profile
 
 # Вспомогательные функции для проверки разрешений
 def require_master_permission(permission: str):
     """Декоратор для проверки конкретного разрешения мастера"""
     async def permission_checker(
-        current_user: User = Depends(get_current_master),
+        principal: Principal = Depends(get_current_master_principal),
         db: AsyncSession = Depends(get_db)
     ) -> tuple[User, 'Master']:
-        return await get_master_with_permissions_check(permission, current_user, db)
+        return await get_master_with_permissions_check(permission, principal, db)
     
     return permission_checker
 
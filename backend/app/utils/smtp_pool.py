@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+import weakref
+from email.message import Message
+from typing import List, Optional
+
+import aiosmtplib
+from prometheus_client import Counter
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Пул SMTP-соединений: соединение открывается и авторизуется один раз
+# и переиспользуется для следующих писем. Число одновременных отправок
+# (и открытых соединений) ограничено SMTP_POOL_SIZE.
+
+# Ошибки, после которых соединение считается потерянным и открывается заново
+RECONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+    OSError,
+)
+
+smtp_messages = Counter(
+    "smtp_messages_total",
+    "Messages handed to the SMTP pool by result",
+    ["result"]
+)
+
+smtp_connections = Counter(
+    "smtp_connections_opened_total",
+    "SMTP connections opened by the pool"
+)
+
+
+class _PooledConnection:
+    __slots__ = ("client", "last_used", "sent")
+
+    def __init__(self, client: aiosmtplib.SMTP):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.sent = 0
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str],
+        password: Optional[str],
+        size: int,
+        timeout: float,
+        max_idle: float,
+        max_messages: int,
+        retries: int
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_messages = max_messages
+        self.retries = retries
+
+        self._slots = asyncio.Semaphore(size)
+        # LIFO: чаще используемые соединения остаются "теплыми", лишние простаивают и закрываются
+        self._idle: List[_PooledConnection] = []
+
+    async def _open(self) -> _PooledConnection:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            timeout=self.timeout,
+            # 465 - сразу TLS, остальные порты - STARTTLS
+            use_tls=self.port == 465,
+            start_tls=self.port != 465
+        )
+        await client.connect()
+        smtp_connections.inc()
+        return _PooledConnection(client)
+
+    async def _discard(self, connection: _PooledConnection) -> None:
+        try:
+            if connection.client.is_connected:
+                await connection.client.quit()
+        except Exception:
+            connection.client.close()
+
+    async def _acquire(self) -> _PooledConnection:
+        while self._idle:
+            connection = self._idle.pop()
+            if (
+                connection.client.is_connected
+                and time.monotonic() - connection.last_used < self.max_idle
+                and connection.sent < self.max_messages
+            ):
+                return connection
+            await self._discard(connection)
+        return await self._open()
+
+    def _release(self, connection: _PooledConnection) -> None:
+        connection.last_used = time.monotonic()
+        self._idle.append(connection)
+
+    async def send(self, message: Message) -> None:
+        """
+        Отправить письмо через свободное соединение пула.
+        Если сервер закрыл соединение, письмо повторяется на новом.
+        """
+        async with self._slots:
+            attempt = 0
+            while True:
+                connection = None
+                try:
+                    # Повтор - всегда на новом соединении: остальные свободные могли оборваться так же
+                    connection = await (self._open() if attempt else self._acquire())
+                    await connection.client.send_message(message)
+                except RECONNECT_ERRORS as e:
+                    if connection:
+                        connection.client.close()
+                    if attempt >= self.retries:
+                        smtp_messages.labels(result="failed").inc()
+                        raise
+                    attempt += 1
+                    logger.warning("SMTP connection lost, reconnecting (attempt %s): %s", attempt, e)
+                    continue
+                except Exception:
+                    # Ошибка письма (адрес, данные) - соединение в неизвестном состоянии
+                    if connection:
+                        await self._discard(connection)
+                    smtp_messages.labels(result="failed").inc()
+                    raise
+
+                connection.sent += 1
+                self._release(connection)
+                smtp_messages.labels(result="sent").inc()
+                return
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            await self._discard(connection)
+
+
+# asyncio-объекты привязаны к циклу событий: у API один цикл,
+# а задачи Celery могут запускаться в разных
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SMTPPool]" = weakref.WeakKeyDictionary()
+
+
+def get_smtp_pool() -> SMTPPool:
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = SMTPPool(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            username=settings.SMTP_USERNAME,
+            password=settings.SMTP_PASSWORD,
+            size=settings.SMTP_POOL_SIZE,
+            timeout=settings.SMTP_TIMEOUT,
+            max_idle=settings.SMTP_POOL_MAX_IDLE,
+            max_messages=settings.SMTP_POOL_MAX_MESSAGES,
+            retries=settings.SMTP_SEND_RETRIES
+        )
+        _pools[loop] = pool
+    return pool
+
+
+async def close_smtp_pool() -> None:
+    """Закрыть соединения пула текущего цикла событий"""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool:
+        await pool.close()
@@ -0,0 +1,305 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, asdict, fields
+from typing import Optional, Tuple
+from uuid import UUID
+
+from fastapi import Request
+from prometheus_client import Counter
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.tenant import Tenant
+from app.utils.local_cache import TTLCache
+from app.utils.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# Двухуровневый кэш тенантов: локальный TTL/LRU в каждом процессе и Redis.
+# Изменение тенанта удаляет ключи Redis и рассылает его id через pub/sub,
+# чтобы остальные процессы сбросили локальные копии.
+KEY_PREFIX = "tenant"
+INVALIDATION_CHANNEL = f"{KEY_PREFIX}:invalidate"
+
+TENANT_HOST_SUFFIX = f".{settings.DOMAIN}"
+
+# Пауза перед переподпиской, если соединение с Redis потеряно
+RESUBSCRIBE_DELAY = 5
+
+tenant_cache_lookups = Counter(
+    "tenant_cache_lookups_total",
+    "Tenant resolver lookups by the layer that answered",
+    ["source"]
+)
+
+
+@dataclass(frozen=True)
+class TenantInfo:
+    """Снимок полей тенанта, достаточный для публичных страниц и проверок доступа"""
+    id: UUID
+    subdomain: str
+    name: str
+    email: str
+    phone: Optional[str]
+    address: Optional[str]
+    logo_url: Optional[str]
+    primary_color: Optional[str]
+    secondary_color: Optional[str]
+    working_hours: Optional[dict]
+    booking_settings: Optional[dict]
+    notification_settings: Optional[dict]
+    is_active: bool
+    is_verified: bool
+
+    @classmethod
+    def from_model(cls, tenant: Tenant) -> "TenantInfo":
+        return cls(**{field.name: getattr(tenant, field.name) for field in fields(cls)})
+
+    @classmethod
+    def from_json(cls, raw: str) -> "TenantInfo":
+        data = json.loads(raw)
+        data["id"] = UUID(data["id"])
+        return cls(**data)
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["id"] = str(self.id)
+        return json.dumps(data)
+
+
+_local_cache = TTLCache(settings.TENANT_LOCAL_CACHE_SIZE, settings.TENANT_LOCAL_CACHE_TTL)
+
+# Промахи (несуществующий поддомен или id) тоже кэшируются, ненадолго:
+# иначе любой неизвестный поддомен означал бы запрос в БД на каждый HTTP-запрос
+_missing_cache = TTLCache(settings.TENANT_LOCAL_CACHE_SIZE, settings.TENANT_NEGATIVE_CACHE_TTL)
+MISSING_MARKER = "-"
+
+_UNRESOLVED = object()
+
+
+def _id_key(tenant_id: UUID) -> str:
+    return f"{KEY_PREFIX}:id:{tenant_id}"
+
+
+def _subdomain_key(subdomain: str) -> str:
+    return f"{KEY_PREFIX}:subdomain:{subdomain}"
+
+
+def _remember(tenant: TenantInfo) -> None:
+    _local_cache.set(("id", tenant.id), tenant)
+    _local_cache.set(("subdomain", tenant.subdomain), tenant)
+
+
+def _forget(tenant_id: UUID) -> None:
+    _local_cache.discard_where(lambda tenant: tenant.id == tenant_id)
+
+
+async def _load(db: Optional[AsyncSession], condition) -> Optional[TenantInfo]:
+    if db is None:
+        async with AsyncSessionLocal() as session:
+            return await _load(session, condition)
+
+    result = await db.execute(select(Tenant).where(condition))
+    tenant = result.scalar_one_or_none()
+    tenant_cache_lookups.labels(source="db").inc()
+
+    return TenantInfo.from_model(tenant) if tenant else None
+
+
+async def _store(tenant: TenantInfo) -> None:
+    _remember(tenant)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.setex(_id_key(tenant.id), settings.TENANT_CACHE_TTL, tenant.to_json())
+        pipe.setex(_subdomain_key(tenant.subdomain), settings.TENANT_CACHE_TTL, str(tenant.id))
+        await pipe.execute()
+    except Exception as e:
+        logger.warning("Tenant cache store failed for %s: %s", tenant.id, e)
+
+
+async def _store_missing(local_key: tuple, redis_key: str) -> None:
+    _missing_cache.set(local_key, True)
+    try:
+        await redis_client.setex(redis_key, settings.TENANT_NEGATIVE_CACHE_TTL, MISSING_MARKER)
+    except Exception as e:
+        logger.warning("Tenant cache store failed for %s: %s", redis_key, e)
+
+
+async def get_tenant_by_id(tenant_id: UUID, db: Optional[AsyncSession] = None) -> Optional[TenantInfo]:
+    """Тенант по id (в том числе неактивный). db нужна только при промахе кэша"""
+    tenant = _local_cache.get(("id", tenant_id))
+    if tenant:
+        tenant_cache_lookups.labels(source="local").inc()
+        return tenant
+    if _missing_cache.get(("id", tenant_id)):
+        tenant_cache_lookups.labels(source="local_missing").inc()
+        return None
+
+    try:
+        raw = await redis_client.get(_id_key(tenant_id))
+    except Exception as e:
+        logger.warning("Tenant cache lookup failed for %s: %s", tenant_id, e)
+        raw = None
+
+    if raw == MISSING_MARKER:
+        _missing_cache.set(("id", tenant_id), True)
+        tenant_cache_lookups.labels(source="redis_missing").inc()
+        return None
+    if raw:
+        tenant = TenantInfo.from_json(raw)
+        _remember(tenant)
+        tenant_cache_lookups.labels(source="redis").inc()
+        return tenant
+
+    tenant = await _load(db, Tenant.id == tenant_id)
+    if tenant:
+        await _store(tenant)
+    else:
+        await _store_missing(("id", tenant_id), _id_key(tenant_id))
+    return tenant
+
+
+async def get_tenant_by_subdomain(subdomain: str, db: Optional[AsyncSession] = None) -> Optional[TenantInfo]:
+    """Тенант по поддомену (в том числе неактивный). db нужна только при промахе кэша"""
+    tenant = _local_cache.get(("subdomain", subdomain))
+    if tenant:
+        tenant_cache_lookups.labels(source="local").inc()
+        return tenant
+    if _missing_cache.get(("subdomain", subdomain)):
+        tenant_cache_lookups.labels(source="local_missing").inc()
+        return None
+
+    try:
+        tenant_id = await redis_client.get(_subdomain_key(subdomain))
+    except Exception as e:
+        logger.warning("Tenant cache lookup failed for subdomain %s: %s", subdomain, e)
+        tenant_id = None
+
+    if tenant_id == MISSING_MARKER:
+        _missing_cache.set(("subdomain", subdomain), True)
+        tenant_cache_lookups.labels(source="redis_missing").inc()
+        return None
+    if tenant_id:
+        tenant = await get_tenant_by_id(UUID(tenant_id), db)
+        # После смены поддомена старое сопоставление указывает на чужое имя
+        if tenant and tenant.subdomain == subdomain:
+            return tenant
+
+    tenant = await _load(db, Tenant.subdomain == subdomain)
+    if tenant:
+        await _store(tenant)
+    else:
+        await _store_missing(("subdomain", subdomain), _subdomain_key(subdomain))
+    return tenant
+
+
+async def invalidate_tenant(tenant_id: UUID, subdomain: Optional[str] = None) -> None:
+    """
+    Сбросить тенанта во всех процессах (вызывать после коммита изменений).
+    subdomain - новый поддомен (создание, переименование): сбрасывается его промах.
+    """
+    _forget(tenant_id)
+    _missing_cache.pop(("id", tenant_id))
+    if subdomain:
+        _missing_cache.pop(("subdomain", subdomain))
+    try:
+        keys = [_id_key(tenant_id)]
+        if subdomain:
+            keys.append(_subdomain_key(subdomain))
+        raw = await redis_client.get(_id_key(tenant_id))
+        if raw and raw != MISSING_MARKER:
+            keys.append(_subdomain_key(TenantInfo.from_json(raw).subdomain))
+        await redis_client.delete(*keys)
+        await redis_client.publish(INVALIDATION_CHANNEL, str(tenant_id))
+    except Exception as e:
+        logger.warning("Tenant cache invalidation failed for %s: %s", tenant_id, e)
+
+
+async def listen_for_invalidations() -> None:
+    """Фоновая задача процесса: сбрасывает локальный кэш по сообщениям других процессов"""
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    _forget(UUID(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Tenant invalidation subscription failed: %s", e)
+            # Пока подписки нет, сообщения теряются - локальным копиям верить нельзя
+            _local_cache.clear()
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+        finally:
+            await pubsub.aclose()
+
+
+# Служебные поддомены, а не салоны
+NON_TENANT_SUBDOMAINS = ("api", "www", "jazyl")
+
+
+def parse_tenant_host(host: str) -> Tuple[Optional[str], bool]:
+    """(поддомен салона, admin-доступ) для host вида [admin.]<subdomain>.jazyl.tech"""
+    if TENANT_HOST_SUFFIX not in host:
+        return None, False
+
+    subdomain = host.split(TENANT_HOST_SUFFIX)[0]
+    admin_access = subdomain.startswith("admin.")
+    if admin_access:
+        subdomain = subdomain[6:]
+    if subdomain in NON_TENANT_SUBDOMAINS:
+        subdomain = ""
+    return subdomain or None, admin_access
+
+
+def request_subdomain(request: Request) -> Optional[str]:
+    """Поддомен салона: заголовок X-Tenant-Subdomain или host (его разбирает TenantMiddleware)"""
+    subdomain = request.headers.get("X-Tenant-Subdomain")
+    if subdomain:
+        return subdomain
+    subdomain = getattr(request.state, "tenant_subdomain", _UNRESOLVED)
+    if subdomain is _UNRESOLVED:
+        subdomain, _ = parse_tenant_host(request.headers.get("host", ""))
+    return subdomain
+
+
+async def resolve_request_tenant(request: Request, db: Optional[AsyncSession] = None) -> Optional[TenantInfo]:
+    """
+    Активный тенант запроса: по X-Tenant-ID, затем по X-Tenant-Subdomain,
+    затем по поддомену из host.
+    """
+    tenant_id_str = request.headers.get("X-Tenant-ID")
+    if tenant_id_str:
+        try:
+            tenant = await get_tenant_by_id(UUID(tenant_id_str), db)
+            if tenant and tenant.is_active:
+                return tenant
+        except ValueError:
+            logger.debug("Invalid tenant ID in header: %s", tenant_id_str)
+
+    subdomain = request_subdomain(request)
+    if subdomain:
+        tenant = await get_tenant_by_subdomain(subdomain, db)
+        if tenant and tenant.is_active:
+            return tenant
+
+    return None
+
+
+async def get_request_tenant(request: Request, db: Optional[AsyncSession] = None) -> Optional[TenantInfo]:
+    """Тенант запроса: определяется при первом обращении и запоминается в request.state"""
+    tenant = getattr(request.state, "tenant", _UNRESOLVED)
+    if tenant is _UNRESOLVED:
+        tenant = await resolve_request_tenant(request, db)
+        request.state.tenant = tenant
+    return tenant
+
+
+async def get_request_tenant_id(request: Request) -> Optional[UUID]:
+    """id тенанта для публичных запросов (заменяет разбор X-Tenant-ID в роутерах)"""
+    tenant = await get_request_tenant(request)
+    return tenant.id if tenant else None
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.utils.smtp_pool import close_smtp_pool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WorkerRuntime:
+    """
+    Один долгоживущий цикл событий и свой пул соединений с БД на процесс
+    воркера Celery. Цикл крутится в отдельном потоке, задачи передают в него
+    корутины и ждут результат - соединения asyncpg, Redis и SMTP остаются
+    "теплыми" между задачами. При пуле threads несколько задач выполняются
+    в этом цикле одновременно.
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.engine: Optional[AsyncEngine] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        # После fork поток цикла родителя в дочернем процессе не существует
+        return self.loop is not None and self._pid == os.getpid()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.started:
+                return
+
+            self.engine = create_async_engine(
+                settings.DATABASE_URL,
+                echo=settings.DEBUG,
+                pool_size=settings.WORKER_DB_POOL_SIZE,
+                max_overflow=settings.WORKER_DB_MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=3600,
+            )
+            # Все AsyncSessionLocal() в задачах теперь берут соединения из пула воркера
+            AsyncSessionLocal.configure(bind=self.engine)
+
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(
+                target=self._run_loop, name="worker-event-loop", daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+            logger.info("Worker event loop started in process %s", self._pid)
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Awaitable[T]) -> T:
+        """Выполнить корутину в цикле воркера и дождаться результата"""
+        if not self.started:
+            self.start()
+
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result()
+        except BaseException:
+            # Например, SoftTimeLimitExceeded в потоке задачи - корутину тоже останавливаем
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        with self._lock:
+            if not self.started:
+                return
+
+            try:
+                asyncio.run_coroutine_threadsafe(self._close_resources(), self.loop).result(timeout=30)
+            except Exception as e:
+                logger.warning("Worker resources were not closed cleanly: %s", e)
+
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=30)
+            self.loop.close()
+            self.loop = self._thread = self.engine = None
+            logger.info("Worker event loop stopped in process %s", self._pid)
+
+    async def _close_resources(self) -> None:
+        await close_smtp_pool()
+        await self.engine.dispose()
+
+
+worker_runtime = WorkerRuntime()